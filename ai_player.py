@@ -1,35 +1,381 @@
-from board_evaluator import BoardEvaluator
-import copy
+from board_evaluator import BoardEvaluator, KIND_VALUES
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from move import NULL_MOVE
+from piece import EMPTY
+from search_stats import SearchStats, timed_game, timed_evaluator
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import queue
+import threading
+import time
+
+# Depth limit used when only a time or node budget is given
+MAX_DEPTH = 64
+
+# How many nodes to search between clock checks
+CHECK_INTERVAL = 1024
+
+# Move ordering scores: hash move, then captures, then killers, then quiet moves by history
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORE = 1 << 22
+HISTORY_LIMIT = KILLER_SCORE - 1
+
+# Score of a checkmate, from white's point of view. A mate ply plies from the root scores
+# MATE_SCORE - ply, so shorter mates score higher; anything beyond MATE_BOUND is a mate
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000
+
+# Null-move pruning: the null move is searched this many plies shallower (one more from
+# NULL_MOVE_DEEP_DEPTH), at depths from NULL_MOVE_MIN_DEPTH
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_DEEP_DEPTH = 6
+# Late move reductions: quiet moves ordered LMR_MIN_INDEX or later are searched a ply
+# shallower at depths from LMR_MIN_DEPTH, two plies from LMR_DEEP_INDEX on
+LMR_MIN_INDEX = 3
+LMR_DEEP_INDEX = 8
+LMR_MIN_DEPTH = 3
+# Aspiration windows: the root is first searched this far either side of the last depth's value
+ASPIRATION_WINDOW = 50
+ASPIRATION_MIN_DEPTH = 4
+
+
+def mate_moves(value):
+  """Moves to mate of a score from the side to move's point of view (negative when being mated), or None"""
+  if abs(value) < MATE_BOUND:
+    return None
+  moves = (MATE_SCORE - abs(value) + 1) // 2
+  return moves if value > 0 else -moves
+
+
+def _score_to_tt(score, ply):
+  # Mate scores are stored as distance from the position itself, not from the root
+  if score >= MATE_BOUND:
+    return score + ply
+  if score <= -MATE_BOUND:
+    return score - ply
+  return score
+
+
+def _score_from_tt(score, ply):
+  if score >= MATE_BOUND:
+    return score - ply
+  if score <= -MATE_BOUND:
+    return score + ply
+  return score
+
+
+def _mvv_lva(code, squares):
+  """Capture ordering key of a packed move: most valuable victim first, then least valuable attacker"""
+  captured = squares[code & 63]
+  if captured == EMPTY:
+    return 0
+  return KIND_VALUES[captured % 6] * 64 - KIND_VALUES[squares[code >> 6 & 63] % 6] // 16
+
+
+class SearchAborted(Exception):
+  """Raised inside the search when the time or node budget runs out"""
+
 
 class AIPlayer:
-  def __init__(self, depth=3):
+  def __init__(self, depth=3, tt_size_mb=16, movetime=None, max_nodes=None, debug_eval=False, workers=1,
+               quiescence=True, on_iteration=None, book=None, timing=False, pvs=True, null_move=True, lmr=True,
+               aspiration=True, position_cache_size=None):
+    # depth=None searches until the time or node budget runs out
     self.depth = depth
-    self.evaluator = BoardEvaluator()
+    self.movetime = movetime
+    self.max_nodes = max_nodes
+    # Keep searching captures past the depth limit until the position is quiet
+    self.quiescence = quiescence
+    # Selective search, each of which can be turned off to measure it: principal variation
+    # search, null-move pruning, late move reductions and aspiration windows at the root
+    self.pvs = pvs
+    self.null_move = null_move
+    self.lmr = lmr
+    self.aspiration = aspiration
+    self.evaluator = BoardEvaluator(debug=debug_eval)
+    # Positions the searched game keeps legal moves and check status for (None: the game's own size)
+    self.position_cache_size = position_cache_size
+    # Called with a SearchStats snapshot after each finished depth
+    self.on_iteration = on_iteration
+    # Time move generation, legality checks, evaluation and make/unmake (slows the search down)
+    self.timing = timing
+    self.stats = SearchStats()
+    self._stop_event = None
+    self._ponderhit_event = None
+    # An OpeningBook: positions in it are answered without searching
+    self.book = book
+    # Main search nodes and the extra capture nodes searched by quiescence
     self.nodes_evaluated = 0
+    self.quiescence_nodes = 0
+    # Beta cutoffs, and how many of them came from the first move searched
+    self.cutoffs = 0
+    self.first_move_cutoffs = 0
+    # Two killer moves per ply: quiet moves that caused a cutoff at that ply
+    self.killers = [[0, 0] for i in range(MAX_DEPTH + 1)]
+    # History heuristic: how often a quiet move by this piece index to this square caused a cutoff
+    self.history = [[0] * 64 for i in range(12)]
+    self.helper_nodes = 0
+    self.completed_depth = 0
+    self.principal_variation = []
+    # workers > 1 runs Lazy SMP: helper processes search the same position
+    # and share the transposition table through shared memory
+    self.workers = workers
+    self._pool = None
+    self._search_generation = None
+    self._generation = 0
+    # Set in helper processes: the search they belong to
+    self._helper_generation = None
+    # Kept between moves so later searches reuse earlier results
+    self.transposition_table = TranspositionTable(tt_size_mb, shared=workers > 1)
+
+  def get_best_move(self, game, depth=None, movetime=None, wtime=None, btime=None,
+                    winc=0, binc=0, max_nodes=None, stop_event=None, ponderhit_event=None):
+    """
+    Find the best move using iterative deepening Minimax with Alpha-Beta
+    pruning. Searches depth 1, 2, 3, ... until the depth limit is reached
+    or the budget runs out: a fixed movetime, the side to move's clock
+    (wtime/btime plus winc/binc increments), or max_nodes. Times are in
+    seconds. Limits not passed here fall back to the constructor's.
+
+    stop_event (a threading.Event) ends the search from another thread.
+    With ponderhit_event the search ignores the time budget until the
+    event is set, then gets the full budget from that moment on.
 
-  def get_best_move(self, game):
-    """Find the best move using Minimax with Alpha-Beta pruning"""
+    Afterwards ai.stats holds the SearchStats of the search.
+    """
+    self.stats = SearchStats()
+    self._evaluations_start = self.evaluator.evaluations
     self.nodes_evaluated = 0
-    best_move = None
-    alpha = float('-inf')
-    beta = float('inf')
+    self.quiescence_nodes = 0
+    self.cutoffs = 0
+    self.first_move_cutoffs = 0
+    self.helper_nodes = 0
+    self.completed_depth = 0
+    self.principal_variation = []
+    self._new_search()
+
+    max_depth = depth if depth is not None else self.depth
+    if max_depth is None:
+      max_depth = MAX_DEPTH
+    movetime = movetime if movetime is not None else self.movetime
+    max_nodes = max_nodes if max_nodes is not None else self.max_nodes
+
+    # Turn a clock into a time for this move: a share of what is left plus most of the increment
+    clock, increment = (wtime, winc) if game.current_turn == 'white' else (btime, binc)
+    if clock is not None:
+      budget = min(clock / 30 + increment * 0.75, clock * 0.5)
+      movetime = budget if movetime is None else min(movetime, budget)
 
+    self._start_time = time.perf_counter()
+    self._stop_event = stop_event
+    self._ponderhit_event = ponderhit_event
+    self._movetime = movetime
+    self._deadline = self._start_time + movetime if movetime is not None and ponderhit_event is None else None
+    self._max_nodes = max_nodes
+    self._next_check = float('inf')
+    if self.position_cache_size is not None:
+      game.set_cache_size(self.position_cache_size)
+
+    legal_moves = game.get_legal_codes(game.current_turn)
+    if not legal_moves:
+      return None
+
+    if self.book is not None:
+      book_move = self.book.choose(game)
+      if book_move is not None:
+        self.principal_variation = [book_move]
+        self.stats.book_move = True
+        self.stats.best_move = book_move
+        self.stats.principal_variation = [book_move]
+        self.stats.finished = True
+        return book_move
+
+    # Order moves: stored best move, then captures (for better pruning)
+    entry = self.transposition_table.probe(game.zobrist_key)
+    self._order_moves(legal_moves, entry[3] if entry else 0, game.squares)
+
+    helpers = self._start_helpers(game, max_depth) if self.workers > 1 else []
+    evaluator = self.evaluator
+    if self.timing:
+      game = timed_game(game, self.stats.timings)
+      self.evaluator = timed_evaluator(evaluator, self.stats.timings)
+    try:
+      best_code, best_value = self._iterative_deepening(game, legal_moves, max_depth)
+    finally:
+      self.evaluator = evaluator
+      if helpers:
+        self.helper_nodes = self._stop_helpers(helpers)
+
+    # The search works on packed moves; callers get a Move
+    best_move = game.decode_move(best_code)
+    self._update_stats()
+    self.stats.helper_nodes = self.helper_nodes
+    self.stats.best_move = best_move
+    self.stats.value = best_value
+    self.stats.finished = True
+    return best_move
+
+  def iter_search(self, game, **limits):
+    """
+    Runs get_best_move(game, **limits) on a background thread and yields
+    a SearchStats snapshot after every finished depth, then the final
+    stats (finished=True, with best_move). Closing the generator early
+    stops the search.
+    """
+    updates = queue.Queue()
+    stop_event = threading.Event()
+    callback = self.on_iteration
+
+    def report(stats):
+      if callback is not None:
+        callback(stats)
+      updates.put(stats)
+
+    def search():
+      try:
+        self.get_best_move(game, stop_event=stop_event, **limits)
+      finally:
+        updates.put(None)
+
+    self.on_iteration = report
+    thread = threading.Thread(target=search, daemon=True)
+    thread.start()
+    try:
+      while True:
+        stats = updates.get()
+        if stats is None:
+          break
+        yield stats
+      yield self.stats.snapshot()
+    finally:
+      stop_event.set()
+      thread.join()
+      self.on_iteration = callback
+
+  def _update_stats(self):
+    """Copies the search counters into self.stats"""
+    stats = self.stats
+    stats.main_nodes = self.nodes_evaluated
+    stats.quiescence_nodes = self.quiescence_nodes
+    stats.leaf_evaluations = self.evaluator.evaluations - self._evaluations_start
+    stats.cutoffs = self.cutoffs
+    stats.first_move_cutoffs = self.first_move_cutoffs
+    stats.depth = self.completed_depth
+    stats.principal_variation = self.principal_variation
+    stats.elapsed = time.perf_counter() - self._start_time
+
+  def _iterative_deepening(self, game, legal_moves, max_depth, start_depth=1):
+    """Searches ever deeper until max_depth or the budget runs out, returns (best packed move, value)"""
     # Maximizing for white, minimizing for black (not racism)
     is_maximizing = game.current_turn == 'white'
-    best_value = float('-inf') if is_maximizing else float('inf')
 
-    legal_moves = game.get_legal_moves(game.current_turn)
+    best_move = None
+    best_value = None
+    root_ply = len(game.move_history)
+
+    for current_depth in range(start_depth, max_depth + 1):
+      iteration_start = time.perf_counter()
+      iteration_nodes = self.nodes_evaluated + self.quiescence_nodes
+      # The first iteration of the main search always finishes so there is a move to play
+      if current_depth > start_depth or self._helper_generation is not None:
+        self._next_check = self._next_limit_check()
+      try:
+        value, move = self._aspiration_search(game, legal_moves, current_depth, is_maximizing, best_value)
+      except SearchAborted:
+        while len(game.move_history) > root_ply:
+          game.unmake_move()
+        break
+
+      best_value, best_move = value, move
+      self.completed_depth = current_depth
+      self.principal_variation = self._get_principal_variation(game, current_depth)
+      self._update_stats()
+      self.stats.value = value
+      self.stats.best_move = game.decode_move(move)
+      self.stats.iterations.append({
+        'depth': current_depth,
+        'value': value,
+        'nodes': self.nodes_evaluated + self.quiescence_nodes - iteration_nodes,
+        'seconds': time.perf_counter() - iteration_start,
+        'pv': self.principal_variation,
+      })
+      if self.on_iteration is not None:
+        self.on_iteration(self.stats.snapshot())
+
+      # Search the previous iteration's best move first next time
+      legal_moves.remove(best_move)
+      legal_moves.insert(0, best_move)
+
+      if self._budget_spent():
+        break
+
+    return best_move, best_value
 
-    # Order moves: captures first (simple move ordering for better pruning)
-    legal_moves.sort(key=lambda m: m.captured_piece is not None, reverse=True)
+  def _start_helpers(self, game, max_depth):
+    """Starts workers - 1 helper searches of the position in the process pool"""
+    if self._pool is None:
+      self._search_generation = multiprocessing.RawValue('i', 0)
+      self._pool = ProcessPoolExecutor(
+        max_workers=self.workers - 1, initializer=_init_helper,
+        initargs=(self.transposition_table.name, self.transposition_table.size_mb, self._search_generation,
+                  {'quiescence': self.quiescence, 'pvs': self.pvs, 'null_move': self.null_move,
+                   'lmr': self.lmr, 'aspiration': self.aspiration}))
+    self._generation += 1
+    self._search_generation.value = self._generation
+    return [self._pool.submit(_run_helper, game, max_depth, self._generation, helper_id)
+            for helper_id in range(1, self.workers)]
 
-    for move in legal_moves:
-      # Make move on copy
-      game_copy = self._copy_game(game)
-      game_copy.make_move(move)
+  def _stop_helpers(self, helpers):
+    """Tells the helper searches to stop, waits for them and returns their node count"""
+    self._search_generation.value = -1
+    return sum(helper.result() for helper in helpers)
 
-      # Evaluate position
-      value = self._minimax(game_copy, self.depth - 1, alpha, beta, not is_maximizing)
+  def close(self):
+    """Shuts down the helper processes and frees the shared transposition table"""
+    if self._pool is not None:
+      self._search_generation.value = -1
+      self._pool.shutdown()
+      self._pool = None
+    self.transposition_table.close(unlink=True)
+
+  def _aspiration_search(self, game, legal_moves, depth, is_maximizing, guess):
+    """
+    Searches the root in a narrow window around guess, the value of the
+    previous depth, widening it whenever the value falls outside
+    """
+    if not self.aspiration or guess is None or depth < ASPIRATION_MIN_DEPTH or abs(guess) >= MATE_BOUND:
+      return self._search_root(game, legal_moves, depth, is_maximizing)
+
+    delta = ASPIRATION_WINDOW
+    alpha, beta = guess - delta, guess + delta
+    while True:
+      value, move = self._search_root(game, legal_moves, depth, is_maximizing, alpha, beta)
+      if alpha < value < beta:
+        return value, move
+      delta *= 4
+      if value <= alpha:
+        alpha = guess - delta if delta < MATE_SCORE else float('-inf')
+      else:
+        beta = guess + delta if delta < MATE_SCORE else float('inf')
+
+  def _search_root(self, game, legal_moves, depth, is_maximizing, alpha=float('-inf'), beta=float('inf')):
+    """Searches every root move to the given depth, returns (best value, best packed move)"""
+    best_move = None
+    search_alpha, search_beta = alpha, beta
+    best_value = float('-inf') if is_maximizing else float('inf')
+
+    for index, move in enumerate(legal_moves):
+      # Make move, search it and take it back
+      game.make_move(move)
+      if index > 0 and self.pvs:
+        value = self._zero_window_search(game, depth - 1, alpha, beta, is_maximizing, 1)
+        if alpha < value < beta:
+          value = self._minimax(game, depth - 1, alpha, beta, not is_maximizing, 1)
+      else:
+        value = self._minimax(game, depth - 1, alpha, beta, not is_maximizing, 1)
+      game.unmake_move()
 
       # Update best move
       if is_maximizing:
@@ -44,56 +390,353 @@ class AIPlayer:
           best_move = move
         beta = min(beta, value)
 
-    print(f"Nodes evaluated: {self.nodes_evaluated}")
-    print(f"Best move evaluation: {best_value}")
+      # Only possible inside an aspiration window, which is then widened
+      if beta <= alpha:
+        break
 
-    return best_move
+    if best_move is not None:
+      if best_value <= search_alpha:
+        bound = UPPER_BOUND
+      elif best_value >= search_beta:
+        bound = LOWER_BOUND
+      else:
+        bound = EXACT
+      self.transposition_table.store(game.zobrist_key, depth, best_value, bound, best_move)
+
+    return best_value, best_move
+
+  def _zero_window_search(self, game, depth, alpha, beta, is_maximizing, ply):
+    """
+    Searches the move just made with a window of width one at alpha (at
+    beta when minimizing), which only tells whether it beats the best
+    move so far; much cheaper than a full window search.
+    """
+    if is_maximizing:
+      return self._minimax(game, depth, alpha, alpha + 1, False, ply)
+    return self._minimax(game, depth, beta - 1, beta, True, ply)
 
-  def _minimax(self, game, depth, alpha, beta, is_maximizing):
-    """Minimax algorithm with Alpha-Beta pruning"""
+  def _next_limit_check(self):
+    """Node count at which the budget is checked next"""
+    if (self._deadline is not None or self._search_generation is not None or
+        self._stop_event is not None or self._ponderhit_event is not None):
+      next_check = self.nodes_evaluated + self.quiescence_nodes + CHECK_INTERVAL
+    else:
+      next_check = float('inf')
+    if self._max_nodes is not None:
+      next_check = min(next_check, self._max_nodes)
+    return next_check
+
+  def _budget_spent(self):
+    if self._stop_event is not None and self._stop_event.is_set():
+      return True
+    if self._ponderhit_event is not None and self._ponderhit_event.is_set():
+      # The opponent played the expected move: the clock for this move starts now
+      self._ponderhit_event = None
+      if self._movetime is not None:
+        self._deadline = time.perf_counter() + self._movetime
+    if self._max_nodes is not None and self.nodes_evaluated + self.quiescence_nodes >= self._max_nodes:
+      return True
+    if self._helper_generation is not None and self._search_generation.value != self._helper_generation:
+      return True
+    return self._deadline is not None and time.perf_counter() >= self._deadline
+
+  def _check_limits(self):
+    """Called every CHECK_INTERVAL nodes; stops the search once the budget is spent"""
+    if self._budget_spent():
+      raise SearchAborted()
+    self._next_check = self._next_limit_check()
+
+  def _get_principal_variation(self, game, depth):
+    """Follows the stored best moves from the current position"""
+    variation = []
+    for i in range(depth):
+      entry = self.transposition_table.probe(game.zobrist_key)
+      if entry is None or entry[3] == 0:
+        break
+      if entry[3] not in game.get_legal_codes(game.current_turn):
+        break
+      move = game.decode_move(entry[3])
+      variation.append(move)
+      game.make_move(entry[3])
+    for move in variation:
+      game.unmake_move()
+    return variation
+
+  def _minimax(self, game, depth, alpha, beta, is_maximizing, ply):
+    """Minimax algorithm with Alpha-Beta pruning (ply counts moves from the root)"""
     self.nodes_evaluated += 1
+    if self.nodes_evaluated + self.quiescence_nodes >= self._next_check:
+      self._check_limits()
+
+    # Base case: depth 0
+    if depth == 0:
+      if self.quiescence:
+        return self._quiescence(game, alpha, beta, is_maximizing, ply)
+      return self.evaluator.evaluate(game)
 
-    # Base case: depth 0 or game over
-    if depth == 0 or game.is_game_over():
-      return self.evaluator.evaluate(game.board)
+    # Reuse the result of an earlier search of this position if it is deep enough
+    key = game.zobrist_key
+    entry = self.transposition_table.probe(key)
+    tt_move = 0
+    if entry is not None:
+      entry_depth, score, bound, tt_move = entry
+      if entry_depth >= depth:
+        score = _score_from_tt(score, ply)
+        if bound == EXACT:
+          return score
+        if bound == LOWER_BOUND:
+          alpha = max(alpha, score)
+        else:
+          beta = min(beta, score)
+        if beta <= alpha:
+          return score
 
-    legal_moves = game.get_legal_moves(game.current_turn)
+    legal_moves = game.get_legal_codes(game.current_turn)
 
     # Checkmate or stalemate
     if len(legal_moves) == 0:
       if game.is_in_check(game.current_turn):
-        # Checkmate - return extreme value
-        return -100000 if is_maximizing else 100000
+        # Checkmate - the sooner, the more extreme
+        return -(MATE_SCORE - ply) if is_maximizing else MATE_SCORE - ply
       else:
         # Stalemate - return draw value
         return 0
 
-    # Move orderin: captures first
-    legal_moves.sort(key=lambda m: m.captured_piece is not None, reverse=True)
+    in_check = depth >= NULL_MOVE_MIN_DEPTH and (self.null_move or self.lmr) and game.is_in_check(game.current_turn)
 
-    if is_maximizing:
-      max_eval = float('-inf')
-      for move in legal_moves:
-        game_copy = self._copy_game(game)
-        game_copy.make_move(move)
-        eval_score = self._minimax(game_copy, depth - 1, alpha, beta, False)
-        max_eval = max(max_eval, eval_score)
+    # Null move: if passing the turn still fails high, a real move would too (unsafe in check
+    # and in pawn endings, where passing may be the best move; never twice in a row)
+    if (self.null_move and depth >= NULL_MOVE_MIN_DEPTH and not in_check and
+        game.move_history[-1] != NULL_MOVE and game.has_non_pawn_material(game.current_turn)):
+      null_depth = max(depth - 1 - NULL_MOVE_REDUCTION - (depth >= NULL_MOVE_DEEP_DEPTH), 0)
+      if is_maximizing and beta != float('inf'):
+        game.make_null_move()
+        null_value = self._minimax(game, null_depth, beta - 1, beta, False, ply + 1)
+        game.unmake_move()
+        if null_value >= beta:
+          # A mate found after passing is not a proven mate, so only the bound is returned then
+          return null_value if null_value < MATE_BOUND else beta
+      elif not is_maximizing and alpha != float('-inf'):
+        game.make_null_move()
+        null_value = self._minimax(game, null_depth, alpha, alpha + 1, True, ply + 1)
+        game.unmake_move()
+        if null_value <= alpha:
+          return null_value if null_value > -MATE_BOUND else alpha
+
+    # Window actually searched, to tell exact scores from bounds when storing
+    search_alpha, search_beta = alpha, beta
+    best_move = None
+    best_value = float('-inf') if is_maximizing else float('inf')
+
+    # Moves are picked best first, one at a time, so a cutoff saves ordering the rest
+    squares = game.squares
+    for index, move in enumerate(self._pick_moves(legal_moves, tt_move, ply, squares)):
+      capture = squares[move & 63] != EMPTY
+      game.make_move(move)
+      if index == 0:
+        eval_score = self._minimax(game, depth - 1, alpha, beta, not is_maximizing, ply + 1)
+      else:
+        eval_score = None
+        # Late quiet moves rarely matter: search them shallower first, and fully only if they beat the best so far
+        if (self.lmr and index >= LMR_MIN_INDEX and depth >= LMR_MIN_DEPTH and not in_check and
+            not capture and not game.is_in_check(game.current_turn)):
+          reduction = min(1 if index < LMR_DEEP_INDEX else 2, depth - 2)
+          eval_score = self._zero_window_search(game, depth - 1 - reduction, alpha, beta, is_maximizing, ply + 1)
+          if (eval_score > alpha) if is_maximizing else (eval_score < beta):
+            eval_score = None
+        if eval_score is None and self.pvs:
+          eval_score = self._zero_window_search(game, depth - 1, alpha, beta, is_maximizing, ply + 1)
+          if alpha < eval_score < beta:
+            eval_score = None
+        if eval_score is None:
+          eval_score = self._minimax(game, depth - 1, alpha, beta, not is_maximizing, ply + 1)
+      game.unmake_move()
+
+      if is_maximizing:
+        if eval_score > best_value:
+          best_value = eval_score
+          best_move = move
         alpha = max(alpha, eval_score)
-        if beta <= alpha:
-          break # Beta cutoff
-      return max_eval
+      else:
+        if eval_score < best_value:
+          best_value = eval_score
+          best_move = move
+        beta = min(beta, eval_score)
+
+      if beta <= alpha:
+        # Beta cutoff (alpha cutoff when minimizing)
+        self._record_cutoff(move, capture, depth, ply, index, squares)
+        break
+
+    if best_value <= search_alpha:
+      bound = UPPER_BOUND
+    elif best_value >= search_beta:
+      bound = LOWER_BOUND
+    else:
+      bound = EXACT
+    self.transposition_table.store(key, depth, _score_to_tt(best_value, ply), bound, best_move)
+
+    return best_value
+
+  def _quiescence(self, game, alpha, beta, is_maximizing, ply):
+    """
+    Searches captures only until the position is quiet, so leaves are not
+    scored mid-exchange. In check every evasion is searched instead, and
+    having none is mate.
+    """
+    in_check = game.is_in_check(game.current_turn)
+    if in_check:
+      # No standing pat in check: the static score says nothing about whether it can be escaped
+      moves = game.get_legal_codes(game.current_turn)
+      if not moves:
+        return -(MATE_SCORE - ply) if is_maximizing else MATE_SCORE - ply
+      best_value = float('-inf') if is_maximizing else float('inf')
     else:
-      min_eval = float('inf')
-      for move in legal_moves:
-        game_copy = self._copy_game(game)
-        game_copy.make_move(move)
-        eval_score = self._minimax(game_copy, depth - 1, alpha, beta, True)
-        min_eval = min(min_eval, eval_score)
+      # Stand pat: the side to move can usually do at least as well as the static score
+      stand_pat = self.evaluator.evaluate(game)
+      if is_maximizing:
+        if stand_pat >= beta:
+          return stand_pat
+        alpha = max(alpha, stand_pat)
+      else:
+        if stand_pat <= alpha:
+          return stand_pat
+        beta = min(beta, stand_pat)
+      moves = game.get_legal_codes(game.current_turn, captures_only=True)
+      best_value = stand_pat
+
+    squares = game.squares
+    moves.sort(key=lambda code: _mvv_lva(code, squares), reverse=True)
+
+    for move in moves:
+      # Skip captures that lose material once all recaptures are played out (evasions are all tried).
+      # Taking a piece worth at least the capturing one never loses material, so needs no SEE
+      if (not in_check and KIND_VALUES[squares[move & 63] % 6] < KIND_VALUES[squares[move >> 6 & 63] % 6] and
+          game.static_exchange(move) < 0):
+        continue
+
+      self.quiescence_nodes += 1
+      if self.nodes_evaluated + self.quiescence_nodes >= self._next_check:
+        self._check_limits()
+
+      game.make_move(move)
+      eval_score = self._quiescence(game, alpha, beta, not is_maximizing, ply + 1)
+      game.unmake_move()
+
+      if is_maximizing:
+        best_value = max(best_value, eval_score)
+        alpha = max(alpha, eval_score)
+      else:
+        best_value = min(best_value, eval_score)
         beta = min(beta, eval_score)
-        if beta <= alpha:
-          break # Alpha cutoff
-      return min_eval
+      if beta <= alpha:
+        break
+
+    return best_value
+
+  def _pick_moves(self, moves, tt_move, ply, squares):
+    """
+    Yields packed moves in staged order: hash move, captures by MVV-LVA,
+    the two killers of this ply, then quiet moves by history score. Each
+    move is selected only when the search asks for the next one.
+    """
+    killers = self.killers[ply]
+    history = self.history
+    scores = []
+    for code in moves:
+      if code == tt_move:
+        score = HASH_MOVE_SCORE
+      elif squares[code & 63] != EMPTY:
+        score = CAPTURE_SCORE + _mvv_lva(code, squares)
+      elif code == killers[0]:
+        score = KILLER_SCORE + 1
+      elif code == killers[1]:
+        score = KILLER_SCORE
+      else:
+        score = history[squares[code >> 6 & 63]][code & 63]
+      scores.append(score)
+
+    count = len(moves)
+    for i in range(count):
+      # Selection step: bring the best remaining move to position i
+      best = i
+      for j in range(i + 1, count):
+        if scores[j] > scores[best]:
+          best = j
+      if best != i:
+        scores[i], scores[best] = scores[best], scores[i]
+        moves[i], moves[best] = moves[best], moves[i]
+      yield moves[i]
+
+  def _record_cutoff(self, code, capture, depth, ply, index, squares):
+    """Updates the cutoff counters, killers and history after a cutoff (with the move taken back)"""
+    self.cutoffs += 1
+    if index == 0:
+      self.first_move_cutoffs += 1
+    if capture:
+      return
+
+    killers = self.killers[ply]
+    if killers[0] != code:
+      killers[1] = killers[0]
+      killers[0] = code
+
+    table = self.history[squares[code >> 6 & 63]]
+    square = code & 63
+    table[square] = min(table[square] + depth * depth, HISTORY_LIMIT)
+
+  def _new_search(self):
+    """Clears the killers and ages the history scores before a new search"""
+    for killers in self.killers:
+      killers[0] = killers[1] = 0
+    for table in self.history:
+      for square in range(64):
+        table[square] //= 2
+
+  def first_move_cutoff_rate(self):
+    """Share of beta cutoffs caused by the first move searched, a measure of move ordering"""
+    return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+  def _order_moves(self, moves, tt_move, squares):
+    """Sorts packed moves in place: the stored best move first, then captures by MVV-LVA"""
+    moves.sort(key=lambda code: (tt_move != 0 and code == tt_move, squares[code & 63] != EMPTY,
+                                 _mvv_lva(code, squares)), reverse=True)
+
+
+# The AIPlayer of a helper process, attached to the shared transposition table
+_helper = None
+
+
+def _init_helper(table_name, table_size_mb, search_generation, options):
+  """Process pool initializer for Lazy SMP helpers; options are the main player's search switches"""
+  global _helper
+  _helper = AIPlayer(depth=None, tt_size_mb=0, **options)
+  _helper.transposition_table = TranspositionTable(table_size_mb, shared_name=table_name)
+  _helper._search_generation = search_generation
+
+
+def _run_helper(game, max_depth, generation, helper_id):
+  """
+  Searches the position until the main search finishes, filling the
+  shared table. Odd helpers start one depth deeper and every helper
+  rotates the root moves, so they explore different parts of the tree.
+  """
+  player = _helper
+  player.stats = SearchStats()
+  player._start_time = time.perf_counter()
+  player._evaluations_start = player.evaluator.evaluations
+  player.nodes_evaluated = 0
+  player._helper_generation = generation
+  player._deadline = None
+  player._max_nodes = None
+
+  legal_moves = game.get_legal_codes(game.current_turn)
+  entry = player.transposition_table.probe(game.zobrist_key)
+  player._order_moves(legal_moves, entry[3] if entry else 0, game.squares)
+  shift = helper_id % len(legal_moves)
+  legal_moves = legal_moves[shift:] + legal_moves[:shift]
 
-  def _copy_game(self, game):
-    """Creates a deep copy of the game state."""
-    return copy.deepcopy(game)
\ No newline at end of file
+  player.quiescence_nodes = 0
+  player._new_search()
+  player._iterative_deepening(game, legal_moves, max_depth, start_depth=1 + helper_id % 2)
+  return player.nodes_evaluated + player.quiescence_nodes
@@ -0,0 +1,295 @@
+"""
+Batch analysis of many positions.
+
+Positions are read one line at a time from a file or stdin, as FEN, EPD
+or JSON lines ({"fen": ..., "id": ...}), and searched in a pool of worker
+processes that each keep one AIPlayer. Every result is written as one
+JSON line with the best move, score, depth and nodes.
+
+Only a bounded number of positions are read ahead of the results being
+written, so memory stays flat however large the input is. With
+--checkpoint the number of input records whose results are written is
+saved as the run goes, and a later run with the same options carries on
+from there.
+
+  python analyze.py positions.epd --depth 4 --output results.jsonl --checkpoint run.ckpt
+  zcat dump.jsonl.gz | python analyze.py --movetime 0.5 --unordered > results.jsonl
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from ai_player import AIPlayer, mate_moves
+from bitboard import BACKENDS
+from move import Move
+
+# Jobs read ahead of the results written, per worker
+QUEUE_DEPTH = 4
+# Seconds between checkpoint writes
+CHECKPOINT_INTERVAL = 5.0
+
+
+def _notation(move):
+  return Move.pos_to_chess_notation(move.start_pos) + Move.pos_to_chess_notation(move.end_pos)
+
+
+def epd_operations(text):
+  """EPD operations ('bm e4; id "pos 1";') to a dict of opcode to operand text"""
+  operations = {}
+  for operation in text.split(';'):
+    parts = operation.strip().split(None, 1)
+    if parts:
+      operations[parts[0]] = parts[1].strip().strip('"') if len(parts) > 1 else ''
+  return operations
+
+
+def parse_record(line):
+  """
+  One input line to a record dict with 'fen' and, if given, 'id'.
+  Returns None for blank and comment lines. JSON records keep all their
+  fields, which are copied into the result.
+  """
+  line = line.strip()
+  if not line or line.startswith('#'):
+    return None
+  if line.startswith('{'):
+    record = json.loads(line)
+    if 'fen' not in record:
+      raise ValueError("JSON record without a fen field")
+    return record
+
+  fields = line.split()
+  if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+    return {'fen': ' '.join(fields[:6])}
+  # EPD: four position fields followed by operations
+  record = {'fen': ' '.join(fields[:4]) + ' 0 1'}
+  operations = epd_operations(line.split(None, 4)[4]) if len(fields) > 4 else {}
+  if 'id' in operations:
+    record['id'] = operations['id']
+  return record
+
+
+def read_records(stream, start=0):
+  """(index, record) for each position in the stream, skipping the first start records"""
+  index = 0
+  for line in stream:
+    try:
+      record = parse_record(line)
+    except ValueError as error:
+      # Reported in the output like a bad FEN, so the record numbering stays the same
+      record = {'fen': line.strip(), 'error': str(error)}
+    if record is None:
+      continue
+    if index >= start:
+      yield index, record
+    index += 1
+
+
+# The AIPlayer of a worker process, reused for every position it analyzes
+_ai = None
+
+
+def _init_worker(options):
+  global _ai
+  # Ctrl-C is handled by the main process, which stops the pool; a worker interrupted
+  # mid-task would break it
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  _ai = AIPlayer(**options)
+
+
+def analyze_position(index, record, backend):
+  """Searches one record in a worker process and returns its result dict"""
+  result = dict(record, index=index)
+  if 'error' in record:
+    return result
+  try:
+    game = BACKENDS[backend].from_fen(record['fen'])
+  except ValueError as error:
+    result['error'] = str(error)
+    return result
+
+  # Each position is searched from an empty table, so results do not depend on
+  # which worker got which positions
+  _ai.transposition_table.clear()
+  start = time.perf_counter()
+  move = _ai.get_best_move(game)
+  stats = _ai.stats
+  result['time'] = round(time.perf_counter() - start, 3)
+  if move is None:
+    result['best_move'] = None
+    result['result'] = 'checkmate' if game.is_in_check(game.current_turn) else 'stalemate'
+    return result
+
+  # Scores are from the side to move's point of view
+  value = stats.value if game.current_turn == 'white' else -stats.value
+  result['best_move'] = _notation(move)
+  moves = mate_moves(value)
+  if moves is not None:
+    result['mate'] = moves
+  else:
+    result['score'] = value
+  result['depth'] = stats.depth
+  result['nodes'] = stats.nodes
+  result['pv'] = [_notation(pv_move) for pv_move in stats.principal_variation]
+  return result
+
+
+def _written_indices(path, start):
+  """
+  Indices at or after start already in an output file, written after the
+  last checkpoint of a run that was stopped. A last line cut short by the
+  stop is removed so the next result starts on a line of its own.
+  """
+  indices = set()
+  if path is None or not os.path.exists(path):
+    return indices
+  with open(path, 'rb+') as f:
+    data = f.read()
+    if data and not data.endswith(b'\n'):
+      f.truncate(data.rfind(b'\n') + 1)
+  with open(path) as f:
+    for line in f:
+      index = json.loads(line).get('index')
+      if index is not None and index >= start:
+        indices.add(index)
+  return indices
+
+
+def load_checkpoint(path):
+  """Number of input records already done, from a checkpoint file"""
+  if path is None or not os.path.exists(path):
+    return 0
+  with open(path) as f:
+    return json.load(f)['offset']
+
+
+def save_checkpoint(path, offset):
+  # Written to a temporary file and renamed so a crash never leaves half a checkpoint
+  temporary = path + '.tmp'
+  with open(temporary, 'w') as f:
+    json.dump({'offset': offset}, f)
+  os.replace(temporary, path)
+
+
+def run_analysis(records, output, options, workers=None, backend='mailbox', ordered=True,
+                 checkpoint=None, start=0, skip=()):
+  """
+  Analyzes (index, record) pairs in a process pool and writes one JSON
+  line per record to output. ordered=False writes results as soon as they
+  finish. Records in skip are not analyzed again. Returns the number of
+  results written.
+  """
+  workers = workers or os.cpu_count() or 1
+  limit = workers * QUEUE_DEPTH
+  records = iter(records)
+  skip = set(skip)
+  pending = set()
+  # Finished results waiting for earlier ones (ordered), and finished indices past the done offset
+  buffered = {}
+  finished = set(skip)
+  done_offset = start
+  written = 0
+  last_checkpoint = time.perf_counter()
+
+  def advance():
+    # The offset only moves past records whose results are all written (or were skipped)
+    nonlocal done_offset, written
+    while done_offset in finished:
+      result = buffered.pop(done_offset, None)
+      if result is not None:
+        output.write(json.dumps(result) + '\n')
+        written += 1
+      finished.discard(done_offset)
+      done_offset += 1
+
+  pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,))
+  try:
+    while True:
+      # Read ahead only as far as the results held back allow
+      while len(pending) + len(buffered) < limit:
+        job = next(records, None)
+        if job is None:
+          break
+        index, record = job
+        if index in skip:
+          continue
+        pending.add(pool.submit(analyze_position, index, record, backend))
+      if not pending:
+        break
+
+      done, pending = wait(pending, return_when=FIRST_COMPLETED)
+      for future in done:
+        result = future.result()
+        if ordered:
+          buffered[result['index']] = result
+        else:
+          output.write(json.dumps(result) + '\n')
+          written += 1
+        finished.add(result['index'])
+
+      advance()
+      if checkpoint is not None and time.perf_counter() - last_checkpoint >= CHECKPOINT_INTERVAL:
+        output.flush()
+        save_checkpoint(checkpoint, done_offset)
+        last_checkpoint = time.perf_counter()
+    advance()
+  except BaseException:
+    # Stopped (Ctrl-C): drop the queued positions and only wait for the ones being searched
+    pool.shutdown(cancel_futures=True)
+    raise
+  finally:
+    pool.shutdown()
+    # The checkpoint always matches what is written, even when the run is stopped
+    output.flush()
+    if checkpoint is not None:
+      save_checkpoint(checkpoint, done_offset)
+  return written
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Analyze FEN, EPD or JSONL positions and write JSONL results")
+  parser.add_argument('input', nargs='?', help="input file (default: stdin)")
+  parser.add_argument('--output', help="JSONL file to write (default: stdout)")
+  parser.add_argument('--depth', type=int, help="depth limit per position")
+  parser.add_argument('--movetime', type=float, help="seconds per position")
+  parser.add_argument('--nodes', type=int, help="nodes per position")
+  parser.add_argument('--hash', type=int, default=16, help="transposition table size per worker in MB")
+  parser.add_argument('--workers', type=int, default=None, help="default: number of CPU cores")
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox')
+  parser.add_argument('--unordered', action='store_true', help="write results as they finish, not in input order")
+  parser.add_argument('--checkpoint', help="file keeping the number of records done, to resume from")
+  parser.add_argument('--start', type=int, help="skip this many input records (default: the checkpoint)")
+  args = parser.parse_args()
+
+  options = {'depth': args.depth, 'movetime': args.movetime, 'max_nodes': args.nodes, 'tt_size_mb': args.hash}
+  if args.depth is None and args.movetime is None and args.nodes is None:
+    options['depth'] = 4
+
+  start = args.start if args.start is not None else load_checkpoint(args.checkpoint)
+  # With a checkpoint the output is never truncated: a run stopped before its first record
+  # finished still has a checkpoint of 0, but may have written later records (--unordered)
+  resuming = start > 0 or args.checkpoint is not None
+  # A stopped run may have written results past the checkpoint
+  skip = _written_indices(args.output, start) if resuming else set()
+  output = open(args.output, 'a' if resuming else 'w') if args.output else sys.stdout
+  source = open(args.input) if args.input else sys.stdin
+  if start or skip:
+    print(f"Resuming after {start} records ({len(skip)} later ones already written)", file=sys.stderr)
+
+  began = time.perf_counter()
+  try:
+    written = run_analysis(read_records(source, start), output, options, args.workers, args.backend,
+                           not args.unordered, args.checkpoint, start, skip)
+  except KeyboardInterrupt:
+    sys.exit("Stopped; run the same command again to resume" if args.checkpoint else "Stopped")
+  finally:
+    if source is not sys.stdin:
+      source.close()
+    if output is not sys.stdout:
+      output.close()
+  elapsed = time.perf_counter() - began
+  print(f"Analyzed {written} positions in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.1f}/s)", file=sys.stderr)
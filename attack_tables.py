@@ -0,0 +1,63 @@
+"""
+Move tables computed once at import time.
+
+Every table is indexed by square number (row * 8 + col) and holds
+(row, col) positions so they can be used directly on ChessGame.board.
+"""
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                  (1, -2), (1, 2), (2, -1), (2, 1))
+
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1),
+                (0, 1), (1, -1), (1, 0), (1, 1))
+
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def square_index(pos):
+  """Converts (row, col) to a square number from 0 (a8) to 63 (h1)"""
+  return pos[0] * 8 + pos[1]
+
+
+def _on_board(row, col):
+  return 0 <= row < 8 and 0 <= col < 8
+
+
+def _jump_table(offsets):
+  """For each square, the squares reachable with one of the offsets"""
+  table = []
+  for square in range(64):
+    row, col = divmod(square, 8)
+    table.append(tuple((row + dr, col + dc) for dr, dc in offsets
+                       if _on_board(row + dr, col + dc)))
+  return table
+
+
+def _ray_table(directions):
+  """For each square, one ray per direction ordered outwards from it"""
+  table = []
+  for square in range(64):
+    row, col = divmod(square, 8)
+    rays = []
+    for dr, dc in directions:
+      ray = []
+      r, c = row + dr, col + dc
+      while _on_board(r, c):
+        ray.append((r, c))
+        r += dr
+        c += dc
+      if ray:
+        rays.append(tuple(ray))
+    table.append(tuple(rays))
+  return table
+
+
+SQUARES = [divmod(square, 8) for square in range(64)]
+
+KNIGHT_TARGETS = _jump_table(KNIGHT_OFFSETS)
+KING_TARGETS = _jump_table(KING_OFFSETS)
+
+ROOK_RAYS = _ray_table(ROOK_DIRECTIONS)
+BISHOP_RAYS = _ray_table(BISHOP_DIRECTIONS)
+QUEEN_RAYS = [ROOK_RAYS[square] + BISHOP_RAYS[square] for square in range(64)]
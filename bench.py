@@ -0,0 +1,193 @@
+"""
+Fixed-depth search benchmark with a regression baseline.
+
+Searches a built-in set of positions (openings, middlegames, endgames)
+to a fixed depth with a fresh AIPlayer and prints the total nodes, a
+signature of the node counts and best moves, and the speed. The search
+is deterministic, so the signature only changes when the search itself
+changes; the speed is reported as median and spread over --repeat runs.
+
+  python bench.py --depth 4 --repeat 5 --save-baseline bench.json
+  python bench.py --depth 4 --repeat 5 --baseline bench.json
+
+With --baseline the run fails (exit status 1) if the signature differs,
+or if the median speed is more than --max-slowdown below the baseline's
+(or more than twice the spread between repeated runs, if that is larger).
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import zlib
+
+from ai_player import AIPlayer
+from bitboard import BACKENDS
+from move import code_to_notation
+
+# Share the median nodes per second may drop below the baseline before the run fails
+MAX_SLOWDOWN = 0.05
+
+BENCH_POSITIONS = [
+  # Openings
+  'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+  'rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2',
+  'r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+  'rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5',
+  'rnbqkb1r/ppp1pppp/5n2/3p4/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 1 3',
+  'rnbqk2r/ppp1bppp/4pn2/3p2B1/2PP4/2N5/PP2PPPP/R2QKBNR w KQkq - 4 5',
+  'rnbqkb1r/pp3ppp/4pn2/2pp4/3P4/2P1PN2/PP3PPP/RNBQKB1R w KQkq - 0 5',
+  'r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5',
+  'rnbqkb1r/pp1ppp1p/5np1/2p5/2PP4/5N2/PP2PPPP/RNBQKB1R w KQkq - 0 4',
+  'r1bqkbnr/pp1ppppp/2n5/2p5/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 2 3',
+  # Middlegames
+  'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 10',
+  '4rrk1/pp1n3p/3q2pQ/2p1pb2/2PP4/2P3N1/P2B2PP/4RRK1 b - - 7 19',
+  'rq3rk1/ppp2ppp/1bnpb3/3N2B1/3NP3/7P/PPPQ1PP1/2KR3R w - - 7 14',
+  'r1bq1r1k/1pp1n1pp/1p1p4/4p2Q/4Pp2/1BNP4/PPP2PPP/3R1RK1 w - - 2 14',
+  'r3r1k1/2p2ppp/p1p1bn2/8/1q2P3/2NPQN2/PPP3PP/R4RK1 b - - 2 15',
+  'r1bbk1nr/pp3p1p/2n5/1N4p1/2Np1B2/8/PPP2PPP/2KR1B1R w kq - 0 13',
+  'r1bq1rk1/ppp1nppp/4n3/3p3Q/3P4/1BP1B3/PP1N2PP/R4RK1 w - - 1 16',
+  '4r1k1/r1q2ppp/ppp2n2/4P3/5Rb1/1N1BQ3/PPP3PP/R5K1 w - - 1 17',
+  '2rqkb1r/ppp2p2/2npb1p1/1N1Nn2p/2P1PP2/8/PP2B1PP/R1BQK2R b KQ - 0 11',
+  'r1bq1r1k/b1p1npp1/p2p3p/1p6/3PP3/1B2NN2/PP3PPP/R2Q1RK1 w - - 1 16',
+  '3r1rk1/p5pp/bpp1pp2/8/q1PP1P2/b3P3/P2NQRPP/1R2B1K1 b - - 6 22',
+  'r1q2rk1/2p1bppp/2Pp4/p6b/Q1PNp3/4B3/PP1R1PPP/2K4R w - - 2 18',
+  '4k2r/1pb2ppp/1p2p3/1R1p4/3P4/2r1PN2/P4PPP/1R4K1 b - - 3 22',
+  '3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 4 26',
+  'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+  'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+  'r2r1n2/pp2bk2/2p1p2p/3q4/3PN1QP/2P3R1/P4PP1/5RK1 w - - 0 1',
+  '6k1/3b3r/1p1p4/p1n2p2/1PPNpP1q/P3Q1p1/1R1RB1P1/5K2 b - - 0 1',
+  # Endgames
+  '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 11',
+  '6k1/6p1/6Pp/ppp5/3pn2P/1P3K2/1PP2P2/8 b - - 0 1',
+  '8/8/8/8/5kp1/P7/8/1K1N4 w - - 0 1',
+  '8/8/8/5N2/8/p7/8/2NK3k w - - 0 1',
+  '8/3k4/8/8/8/4B3/4KB2/2B5 w - - 0 1',
+  '8/8/1P6/5pr1/8/4R3/7k/2K5 w - - 0 1',
+  '8/2p4P/8/kr6/6R1/8/8/1K6 w - - 0 1',
+  '8/8/3P3k/8/1p6/8/1P6/1K3n2 b - - 0 1',
+  '8/R7/2q5/8/6k1/8/1P5p/K6R w - - 0 124',
+  '5k2/8/3K4/4P3/8/8/8/8 w - - 0 1',
+  '8/5pk1/6p1/7p/7P/6P1/5PK1/8 w - - 0 1',
+  '2r3k1/5pp1/7p/8/8/7P/5PP1/3R2K1 w - - 0 1',
+]
+
+
+def bench(depth=4, backend='mailbox', positions=BENCH_POSITIONS, report=None):
+  """
+  Searches every position to depth with a fresh AIPlayer. Returns a dict
+  with the total nodes, seconds, nodes per second, the signature and
+  each position's nodes and best move.
+  """
+  nodes = []
+  best_moves = []
+  elapsed = 0.0
+  for number, fen in enumerate(positions, 1):
+    game = BACKENDS[backend].from_fen(fen)
+    # A new player per position, so no table, killer or history carries over from the one before
+    ai = AIPlayer(depth=depth)
+    start = time.perf_counter()
+    move = ai.get_best_move(game)
+    elapsed += time.perf_counter() - start
+    nodes.append(ai.stats.nodes)
+    best_moves.append(code_to_notation(move.code) if move is not None else '0000')
+    if report is not None:
+      report(f"Position {number}/{len(positions)}: {best_moves[-1]} {nodes[-1]} nodes")
+
+  # CRC-32 of every position's node count and best move: changes with any change to the search
+  text = ' '.join(f"{count}:{move}" for count, move in zip(nodes, best_moves))
+  total = sum(nodes)
+  return {
+    'depth': depth,
+    'backend': backend,
+    'positions': len(positions),
+    'nodes': total,
+    'signature': f"{zlib.crc32(text.encode()):08x}",
+    'seconds': elapsed,
+    'nps': total / elapsed if elapsed > 0 else 0.0,
+    'position_nodes': nodes,
+    'best_moves': best_moves,
+  }
+
+
+def summarize(runs):
+  """Median, minimum, maximum and relative standard deviation of the speed over repeated runs"""
+  speeds = [run['nps'] for run in runs]
+  median = statistics.median(speeds)
+  spread = statistics.stdev(speeds) / median if len(speeds) > 1 and median else 0.0
+  return {'median': median, 'min': min(speeds), 'max': max(speeds), 'spread': spread}
+
+
+def compare(result, speed, baseline, max_slowdown=MAX_SLOWDOWN):
+  """Problems with a run against a baseline: a list of messages, empty if it passes"""
+  problems = []
+  for key in ('depth', 'backend', 'positions'):
+    if result[key] != baseline[key]:
+      problems.append(f"{key} is {result[key]}, baseline has {baseline[key]}")
+  if problems:
+    return problems
+
+  if result['signature'] != baseline['signature']:
+    problems.append(f"signature {result['signature']} differs from baseline {baseline['signature']} "
+                    f"({result['nodes']} nodes, baseline {baseline['nodes']})")
+    for number, (now, before, move, old_move) in enumerate(zip(
+        result['position_nodes'], baseline['position_nodes'], result['best_moves'], baseline['best_moves']), 1):
+      if now != before or move != old_move:
+        problems.append(f"  position {number}: {now} nodes {move}, baseline {before} nodes {old_move}")
+
+  # A drop within twice the run-to-run spread of either run is noise
+  allowed = max(max_slowdown, 2 * speed['spread'], 2 * baseline.get('spread', 0.0))
+  if speed['median'] < baseline['nps'] * (1 - allowed):
+    problems.append(f"median speed {speed['median']:,.0f} nps is {1 - speed['median'] / baseline['nps']:.1%} "
+                    f"below baseline {baseline['nps']:,.0f} nps (allowed {allowed:.1%})")
+  return problems
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Fixed-depth search benchmark")
+  parser.add_argument('--depth', type=int, default=4)
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox')
+  parser.add_argument('--repeat', type=int, default=1, help="runs to take the median speed of")
+  parser.add_argument('--baseline', help="JSON baseline to compare against")
+  parser.add_argument('--save-baseline', help="write this run as a JSON baseline")
+  parser.add_argument('--max-slowdown', type=float, default=MAX_SLOWDOWN,
+                      help="allowed drop of the median nodes per second below the baseline (0.05 = 5%%)")
+  parser.add_argument('--verbose', action='store_true', help="print every position's result")
+  args = parser.parse_args()
+
+  runs = []
+  for repeat in range(args.repeat):
+    runs.append(bench(args.depth, args.backend, report=print if args.verbose and repeat == 0 else None))
+    if args.repeat > 1:
+      print(f"Run {repeat + 1}: {runs[-1]['seconds']:.2f}s, {runs[-1]['nps']:,.0f} nps")
+  result = runs[0]
+  if any(run['signature'] != result['signature'] for run in runs):
+    sys.exit("Signature changed between runs: the search is not deterministic")
+  speed = summarize(runs)
+
+  print(f"Positions: {result['positions']} at depth {result['depth']} ({result['backend']})")
+  print(f"Nodes searched: {result['nodes']}")
+  print(f"Signature: {result['signature']}")
+  print(f"Time: {statistics.median(run['seconds'] for run in runs):.2f}s (median)")
+  print(f"Nodes/second: {speed['median']:,.0f} median, {speed['min']:,.0f}-{speed['max']:,.0f} "
+        f"over {len(runs)} runs (spread {speed['spread']:.1%})")
+
+  if args.save_baseline:
+    baseline = dict(result, nps=speed['median'], spread=speed['spread'], runs=len(runs))
+    del baseline['seconds']
+    with open(args.save_baseline, 'w') as f:
+      json.dump(baseline, f, indent=1)
+    print(f"Saved baseline to {args.save_baseline}")
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    problems = compare(result, speed, baseline, args.max_slowdown)
+    if problems:
+      print("FAIL")
+      for problem in problems:
+        print(problem)
+      sys.exit(1)
+    print(f"OK: same signature as {args.baseline}, median speed {speed['median'] / baseline['nps'] - 1:+.1%}")
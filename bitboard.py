@@ -0,0 +1,580 @@
+"""
+Bitboard board backend.
+
+Each of the twelve piece types (per color) is a Python int with bit
+row * 8 + col set for every square it occupies, so bit 0 is a8 and
+bit 63 is h1. BitboardGame offers the same methods as ChessGame, so
+AIPlayer, BoardEvaluator and main.py run on either backend.
+
+Moves are generated with whole-set int operations (all unpinned pawns
+are pushed with one shift per direction) and attacks come from line
+tables, with no per-square helper calls in the hot loops. That makes
+perft about 3x and the search about 2x as fast as on the mailbox board
+(see perft.py, movegen_benchmark.compare_backends and bench.py). A
+tenfold faster search is out of scope for this backend: about 30% of a
+bitboard search is AIPlayer's own Python code, the same on both
+backends, and the move loops cost a Python step per generated move.
+"""
+from array import array
+
+from piece import PIECE_TYPES, EMPTY, piece_index
+from move import Move, NULL_MOVE, pack_move, move_squares
+from chess_engine import ChessGame, CASTLING_SQUARES
+from attack_tables import square_index, SQUARES, KNIGHT_TARGETS, KING_TARGETS
+from zobrist import PIECE_KEYS, BLACK_TO_MOVE, compute_key
+from board_evaluator import SQUARE_VALUES, KIND_VALUES
+from position_cache import PositionCache
+
+WHITE, BLACK = 0, 1
+COLORS = ('white', 'black')
+
+# Piece indices: color * 6 + kind, kind following PIECE_TYPES
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+FULL = (1 << 64) - 1
+# Rows the pawns of each color start on
+PAWN_START_ROWS = (0xFF << 48, 0xFF << 8)
+# Everything but the a and h files, so pawn captures shifted a file aside do not wrap around
+NOT_FILE_A = FULL ^ sum(1 << (row * 8) for row in range(8))
+NOT_FILE_H = FULL ^ sum(1 << (row * 8 + 7) for row in range(8))
+
+# One shared, never-moving piece per index, used for Move objects and board views
+PROTOTYPES = [piece_type(COLORS[color], None) for color in (WHITE, BLACK) for piece_type in PIECE_TYPES] + [None]
+
+
+def _mask(positions):
+  mask = 0
+  for row, col in positions:
+    mask |= 1 << (row * 8 + col)
+  return mask
+
+
+def _bit_positions(bb):
+  """Yields the square numbers of the set bits, lowest first"""
+  while bb:
+    low = bb & -bb
+    yield low.bit_length() - 1
+    bb ^= low
+
+
+KNIGHT_ATTACKS = [_mask(KNIGHT_TARGETS[square]) for square in range(64)]
+KING_ATTACKS = [_mask(KING_TARGETS[square]) for square in range(64)]
+
+# Squares attacked by a pawn of each color standing on a square
+PAWN_ATTACKS = (
+  [_mask((row - 1, col + dc) for dc in (-1, 1) if 0 <= row - 1 and 0 <= col + dc < 8)
+   for row, col in SQUARES],
+  [_mask((row + 1, col + dc) for dc in (-1, 1) if row + 1 < 8 and 0 <= col + dc < 8)
+   for row, col in SQUARES],
+)
+
+
+def _build_line_tables(direction):
+  """
+  Slider attacks along one line (rank, file or diagonal) through each
+  square, looked up by the occupancy of that line. Edge squares never
+  change the result, so they are left out of the mask and every table
+  holds at most 64 entries.
+  """
+  dr, dc = direction
+  masks, tables = [], []
+  for row, col in SQUARES:
+    rays = []
+    for sign in (1, -1):
+      ray = []
+      r, c = row + sign * dr, col + sign * dc
+      while 0 <= r < 8 and 0 <= c < 8:
+        ray.append(r * 8 + c)
+        r += sign * dr
+        c += sign * dc
+      rays.append(ray)
+
+    relevant = 0
+    for ray in rays:
+      for square in ray[:-1]:
+        relevant |= 1 << square
+
+    table = {}
+    subset = 0
+    while True:
+      attacks = 0
+      for ray in rays:
+        for square in ray:
+          attacks |= 1 << square
+          if subset >> square & 1:
+            break
+      table[subset] = attacks
+      # Carry-rippler step to the next subset of the relevant squares
+      subset = (subset - relevant) & relevant
+      if subset == 0:
+        break
+
+    masks.append(relevant)
+    tables.append(table)
+  return masks, tables
+
+
+RANK_MASKS, RANK_TABLES = _build_line_tables((0, 1))
+FILE_MASKS, FILE_TABLES = _build_line_tables((1, 0))
+DIAGONAL_MASKS, DIAGONAL_TABLES = _build_line_tables((1, 1))
+ANTI_DIAGONAL_MASKS, ANTI_DIAGONAL_TABLES = _build_line_tables((1, -1))
+
+
+def rook_attacks(square, occupied):
+  return (RANK_TABLES[square][occupied & RANK_MASKS[square]] |
+          FILE_TABLES[square][occupied & FILE_MASKS[square]])
+
+
+def bishop_attacks(square, occupied):
+  return (DIAGONAL_TABLES[square][occupied & DIAGONAL_MASKS[square]] |
+          ANTI_DIAGONAL_TABLES[square][occupied & ANTI_DIAGONAL_MASKS[square]])
+
+
+def _build_between_and_line():
+  """Squares strictly between two aligned squares, and the full line through them"""
+  between = [[0] * 64 for i in range(64)]
+  line = [[0] * 64 for i in range(64)]
+  for start, (row, col) in enumerate(SQUARES):
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1), (0, -1), (-1, 0), (-1, -1), (-1, 1)):
+      full_line = 1 << start
+      for sign in (1, -1):
+        r, c = row + sign * dr, col + sign * dc
+        while 0 <= r < 8 and 0 <= c < 8:
+          full_line |= 1 << (r * 8 + c)
+          r += sign * dr
+          c += sign * dc
+
+      passed = 0
+      r, c = row + dr, col + dc
+      while 0 <= r < 8 and 0 <= c < 8:
+        end = r * 8 + c
+        between[start][end] = passed
+        line[start][end] = full_line
+        passed |= 1 << end
+        r += dr
+        c += dc
+  return between, line
+
+
+BETWEEN, LINE = _build_between_and_line()
+
+
+class BitboardGame:
+
+  def __init__(self):
+    self._set_position(ChessGame())
+
+  @classmethod
+  def from_game(cls, game):
+    """Creates a bitboard copy of a ChessGame position (the move history is not copied)"""
+    bitboard_game = cls()
+    bitboard_game._set_position(game)
+    return bitboard_game
+
+  @classmethod
+  def from_fen(cls, fen):
+    """Sets up a position from a FEN string, see ChessGame.from_fen"""
+    return cls.from_game(ChessGame.from_fen(fen))
+
+  def to_game(self):
+    """Creates a ChessGame holding the same position"""
+    game = ChessGame()
+    game.board = [[None for i in range(8)] for i in range(8)]
+    for square, index in enumerate(self.squares):
+      if index != EMPTY:
+        position = SQUARES[square]
+        piece = PIECE_TYPES[index % 6](COLORS[index // 6], position)
+        piece.has_moved = not (self.unmoved >> square & 1)
+        game.board[position[0]][position[1]] = piece
+    game.squares = list(self.squares)
+    game.white_king_pos = self.white_king_pos
+    game.black_king_pos = self.black_king_pos
+    game.current_turn = self.current_turn
+    game.halfmove_clock = self.halfmove_clock
+    game.fullmove_number = self.fullmove_number
+    game.zobrist_key = self.zobrist_key
+    game.eval_score = self.eval_score
+    return game
+
+  def _set_position(self, game):
+    self.bitboards = [0] * 12
+    self.squares = [EMPTY] * 64
+    self.unmoved = 0
+    for row in range(8):
+      for col in range(8):
+        piece = game.board[row][col]
+        if piece is not None:
+          square = row * 8 + col
+          index = piece_index(piece)
+          self.bitboards[index] |= 1 << square
+          self.squares[square] = index
+          if not piece.has_moved:
+            self.unmoved |= 1 << square
+
+    self.occupancy = [0, 0]
+    for index in range(12):
+      self.occupancy[index // 6] |= self.bitboards[index]
+    self.occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+    self.current_turn = game.current_turn
+    self.halfmove_clock = game.halfmove_clock
+    self.fullmove_number = game.fullmove_number
+    self.zobrist_key = compute_key(game.board, game.current_turn)
+    self.eval_score = sum(SQUARE_VALUES[index][square] for square, index in enumerate(self.squares) if index != EMPTY)
+    self.move_history = array('H')
+    self._undo_stack = []
+    self._position_cache = PositionCache()
+
+  @property
+  def board(self):
+    """An 8x8 list of pieces like ChessGame.board (built on every access, read only)"""
+    squares = self.squares
+    return [[PROTOTYPES[index] for index in squares[row * 8:row * 8 + 8]] for row in range(8)]
+
+  @property
+  def white_king_pos(self):
+    return SQUARES[self.bitboards[KING].bit_length() - 1]
+
+  @property
+  def black_king_pos(self):
+    return SQUARES[self.bitboards[6 + KING].bit_length() - 1]
+
+  # The rule checks, position cache and display only use the methods below, so they are shared
+  __getstate__ = ChessGame.__getstate__
+  display_board = ChessGame.display_board
+  to_fen = ChessGame.to_fen
+  get_legal_moves = ChessGame.get_legal_moves
+  generate_legal_moves = ChessGame.generate_legal_moves
+  get_legal_codes = ChessGame.get_legal_codes
+  outcome = ChessGame.outcome
+  set_cache_size = ChessGame.set_cache_size
+  is_checkmate = ChessGame.is_checkmate
+  is_stalemate = ChessGame.is_stalemate
+  is_game_over = ChessGame.is_game_over
+
+  def _attackers(self, square, color, occupied):
+    """Bitboard of the pieces of color attacking square, sliders blocked by occupied"""
+    bbs = self.bitboards
+    base = color * 6
+    queens = bbs[base + QUEEN]
+    # rook_attacks and bishop_attacks, inlined: this runs for every check test and SEE step
+    return ((KNIGHT_ATTACKS[square] & bbs[base + KNIGHT]) |
+            (KING_ATTACKS[square] & bbs[base + KING]) |
+            (PAWN_ATTACKS[1 - color][square] & bbs[base + PAWN]) |
+            ((DIAGONAL_TABLES[square][occupied & DIAGONAL_MASKS[square]] |
+              ANTI_DIAGONAL_TABLES[square][occupied & ANTI_DIAGONAL_MASKS[square]]) & (bbs[base + BISHOP] | queens)) |
+            ((RANK_TABLES[square][occupied & RANK_MASKS[square]] |
+              FILE_TABLES[square][occupied & FILE_MASKS[square]]) & (bbs[base + ROOK] | queens)))
+
+  def _pinned(self, king_square, us, occupied):
+    """Bitboard of our pieces that are absolutely pinned to our king"""
+    bbs = self.bitboards
+    base = (1 - us) * 6
+    own = self.occupancy[us]
+    # Enemy sliders that would see the king if nothing stood in between
+    snipers = ((rook_attacks(king_square, 0) & (bbs[base + ROOK] | bbs[base + QUEEN])) |
+               (bishop_attacks(king_square, 0) & (bbs[base + BISHOP] | bbs[base + QUEEN])))
+    pinned = 0
+    for square in _bit_positions(snipers):
+      blockers = BETWEEN[king_square][square] & occupied
+      if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+        pinned |= blockers
+    return pinned
+
+  def generate_legal_codes(self, color, captures_only=False):
+    """Packed legal moves for a given color (only the captures if captures_only), see ChessGame.get_legal_codes"""
+    us = WHITE if color == 'white' else BLACK
+    them = 1 - us
+    bbs = self.bitboards
+    occupied = self.occupied
+    own = self.occupancy[us]
+    enemy = self.occupancy[them]
+    base = us * 6
+    codes = []
+    append = codes.append
+
+    king_square = bbs[base + KING].bit_length() - 1
+    if king_square < 0:
+      return codes
+
+    # The enemy pieces by kind, for the attack tests below
+    enemy_base = them * 6
+    enemy_pawns = bbs[enemy_base + PAWN]
+    enemy_knights = bbs[enemy_base + KNIGHT]
+    enemy_king = bbs[enemy_base + KING]
+    enemy_diagonal = bbs[enemy_base + BISHOP] | bbs[enemy_base + QUEEN]
+    enemy_straight = bbs[enemy_base + ROOK] | bbs[enemy_base + QUEEN]
+    pawn_attacks = PAWN_ATTACKS[us]
+
+    # King moves, checked against attacks with the king taken off the board (_attackers, inlined)
+    without_king = occupied ^ (1 << king_square)
+    targets = KING_ATTACKS[king_square] & (enemy if captures_only else ~own)
+    origin = pack_move(king_square, 0)
+    while targets:
+      low = targets & -targets
+      targets ^= low
+      target = low.bit_length() - 1
+      if (KNIGHT_ATTACKS[target] & enemy_knights or KING_ATTACKS[target] & enemy_king or
+          pawn_attacks[target] & enemy_pawns):
+        continue
+      if (DIAGONAL_TABLES[target][without_king & DIAGONAL_MASKS[target]] |
+          ANTI_DIAGONAL_TABLES[target][without_king & ANTI_DIAGONAL_MASKS[target]]) & enemy_diagonal:
+        continue
+      if (RANK_TABLES[target][without_king & RANK_MASKS[target]] |
+          FILE_TABLES[target][without_king & FILE_MASKS[target]]) & enemy_straight:
+        continue
+      append(origin | target)
+
+    checkers = self._attackers(king_square, them, occupied)
+    if checkers & (checkers - 1):
+      # Double check: only the king can move
+      return codes
+
+    if checkers:
+      # Capture the checker or block the line to the king
+      allowed = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+    else:
+      allowed = FULL
+    if captures_only:
+      allowed &= enemy
+    pinned = self._pinned(king_square, us, occupied)
+    line = LINE[king_square]
+    empty = ~occupied & FULL
+
+    # Pawns off a pin move all at once: shift the whole set a rank forward (and a file aside
+    # for captures), then read each move's source back from its target
+    pawns = bbs[base + PAWN]
+    free = pawns & ~pinned
+    double_rank = free & PAWN_START_ROWS[us] & self.unmoved
+    if us == WHITE:
+      single = free >> 8 & empty
+      double = double_rank >> 16 & empty & empty >> 8
+      pawn_moves = ((single & allowed, 8), (double & allowed, 16),
+                    ((free & NOT_FILE_A) >> 9 & enemy & allowed, 9),
+                    ((free & NOT_FILE_H) >> 7 & enemy & allowed, 7))
+    else:
+      single = free << 8 & empty
+      double = double_rank << 16 & empty & empty << 8
+      pawn_moves = ((single & allowed, -8), (double & allowed, -16),
+                    ((free & NOT_FILE_A) << 7 & enemy & allowed, -7),
+                    ((free & NOT_FILE_H) << 9 & enemy & allowed, -9))
+    for targets, offset in pawn_moves:
+      while targets:
+        low = targets & -targets
+        targets ^= low
+        target = low.bit_length() - 1
+        append(pack_move(target + offset, target))
+
+    # Pinned pawns, one at a time, kept on the pin line
+    pinned_pawns = pawns & pinned
+    step = -8 if us == WHITE else 8
+    while pinned_pawns:
+      source_bit = pinned_pawns & -pinned_pawns
+      pinned_pawns ^= source_bit
+      source = source_bit.bit_length() - 1
+      targets = pawn_attacks[source] & enemy
+      # A pawn on the last rank stays there (no promotion)
+      if 0 <= source + step < 64 and empty >> (source + step) & 1:
+        targets |= 1 << (source + step)
+        if source_bit & PAWN_START_ROWS[us] & self.unmoved and empty >> (source + 2 * step) & 1:
+          targets |= 1 << (source + 2 * step)
+      targets &= allowed & line[source]
+      origin = pack_move(source, 0)
+      while targets:
+        low = targets & -targets
+        targets ^= low
+        append(origin | low.bit_length() - 1)
+
+    # Knights (a pinned knight can never stay on the pin line) and sliders
+    not_own = ~own & FULL & allowed
+    sources = bbs[base + KNIGHT] & ~pinned
+    while sources:
+      low = sources & -sources
+      sources ^= low
+      source = low.bit_length() - 1
+      targets = KNIGHT_ATTACKS[source] & not_own
+      origin = pack_move(source, 0)
+      while targets:
+        low = targets & -targets
+        targets ^= low
+        append(origin | low.bit_length() - 1)
+
+    diagonal = bbs[base + BISHOP] | bbs[base + QUEEN]
+    straight = bbs[base + ROOK] | bbs[base + QUEEN]
+    sources = diagonal | straight
+    while sources:
+      low = sources & -sources
+      sources ^= low
+      source = low.bit_length() - 1
+      targets = 0
+      if low & diagonal:
+        targets = (DIAGONAL_TABLES[source][occupied & DIAGONAL_MASKS[source]] |
+                   ANTI_DIAGONAL_TABLES[source][occupied & ANTI_DIAGONAL_MASKS[source]])
+      if low & straight:
+        targets |= (RANK_TABLES[source][occupied & RANK_MASKS[source]] |
+                    FILE_TABLES[source][occupied & FILE_MASKS[source]])
+      targets &= not_own
+      if low & pinned:
+        targets &= line[source]
+      origin = pack_move(source, 0)
+      while targets:
+        low = targets & -targets
+        targets ^= low
+        append(origin | low.bit_length() - 1)
+
+    return codes
+
+  def _king_attacked(self, color):
+    us = WHITE if color == 'white' else BLACK
+    king = self.bitboards[us * 6 + KING]
+    if not king:
+      return False
+    return self._attackers(king.bit_length() - 1, 1 - us, self.occupied) != 0
+
+  def is_in_check(self, color):
+    """Check if the given color's king is in check (a few table lookups, cheaper than the position cache)"""
+    return self._king_attacked(color)
+
+  def has_non_pawn_material(self, color):
+    """True if color has a knight, bishop, rook or queen, see ChessGame.has_non_pawn_material"""
+    base = 0 if color == 'white' else 6
+    bitboards = self.bitboards
+    return (bitboards[base + KNIGHT] | bitboards[base + BISHOP] | bitboards[base + ROOK] | bitboards[base + QUEEN]) != 0
+
+  def castling_rights(self):
+    """FEN castling field from the unmoved kings and rooks, see ChessGame.castling_rights"""
+    rights = ''
+    for symbol, king_pos, rook_pos in CASTLING_SQUARES:
+      base = 0 if symbol.isupper() else 6
+      king, rook = square_index(king_pos), square_index(rook_pos)
+      if (self.squares[king] == base + KING and self.squares[rook] == base + ROOK and
+          self.unmoved >> king & 1 and self.unmoved >> rook & 1):
+        rights += symbol
+    return rights or '-'
+
+  def static_exchange(self, code):
+    """
+    Static exchange evaluation of a packed move: the material the moving
+    side wins (or loses, if negative) when both sides keep recapturing on
+    the target square with their least valuable piece. Pins are ignored.
+    """
+    bbs = self.bitboards
+    source, target = move_squares(code)
+    captured = self.squares[target]
+    gains = [KIND_VALUES[captured % 6] if captured != EMPTY else 0]
+    on_square = KIND_VALUES[self.squares[source] % 6]
+    occupied = self.occupied ^ (1 << source)
+    color = 1 - self.squares[source] // 6
+
+    while True:
+      # Pieces taken off the board no longer attack, and sliders behind them now do
+      attackers = self._attackers(target, color, occupied) & occupied
+      if not attackers:
+        break
+      for kind in range(6):
+        candidates = attackers & bbs[color * 6 + kind]
+        if candidates:
+          break
+      gains.append(on_square - gains[-1])
+      on_square = KIND_VALUES[kind]
+      occupied ^= candidates & -candidates
+      color = 1 - color
+
+    # Either side may stop capturing when continuing would lose material
+    for i in range(len(gains) - 1, 0, -1):
+      gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
+
+  def make_move(self, move):
+    """Execute a move (a Move or a packed move) on the board"""
+    code = move if move.__class__ is int else move.code
+    source, target = move_squares(code)
+    source_bit = 1 << source
+    target_bit = 1 << target
+    squares = self.squares
+
+    index = squares[source]
+    captured = squares[target]
+    color = index // 6
+    self._undo_stack.append((captured, self.unmoved, self.zobrist_key, self.eval_score, self.halfmove_clock))
+
+    keys = PIECE_KEYS[index]
+    values = SQUARE_VALUES[index]
+    key = self.zobrist_key ^ keys[source] ^ keys[target] ^ BLACK_TO_MOVE
+    score = self.eval_score + values[target] - values[source]
+    moved = source_bit | target_bit
+    self.bitboards[index] ^= moved
+    self.occupancy[color] ^= moved
+    if captured != EMPTY:
+      self.bitboards[captured] ^= target_bit
+      self.occupancy[1 - color] ^= target_bit
+      key ^= PIECE_KEYS[captured][target]
+      score -= SQUARE_VALUES[captured][target]
+      # The target square stays occupied
+      self.occupied ^= source_bit
+    else:
+      self.occupied ^= moved
+    self.zobrist_key = key
+    self.eval_score = score
+    squares[target] = index
+    squares[source] = EMPTY
+    self.unmoved &= ~(source_bit | target_bit)
+
+    self.halfmove_clock = 0 if captured != EMPTY or index % 6 == PAWN else self.halfmove_clock + 1
+    if color == BLACK:
+      self.fullmove_number += 1
+    self.move_history.append(code)
+    self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+
+  def make_null_move(self):
+    """Passes the turn without moving, for null-move pruning; unmake_move takes it back"""
+    self._undo_stack.append((EMPTY, self.unmoved, self.zobrist_key, self.eval_score, self.halfmove_clock))
+    self.zobrist_key ^= BLACK_TO_MOVE
+    if self.current_turn == 'black':
+      self.fullmove_number += 1
+    self.move_history.append(NULL_MOVE)
+    self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+
+  def unmake_move(self):
+    """Take back the last move made with make_move (or make_null_move) and return it packed"""
+    code = self.move_history.pop()
+    captured, self.unmoved, self.zobrist_key, self.eval_score, self.halfmove_clock = self._undo_stack.pop()
+    self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+    if self.current_turn == 'black':
+      self.fullmove_number -= 1
+    if code == NULL_MOVE:
+      return code
+    source, target = move_squares(code)
+    source_bit = 1 << source
+    target_bit = 1 << target
+    squares = self.squares
+
+    index = squares[target]
+    color = index // 6
+    moved = source_bit | target_bit
+    self.bitboards[index] ^= moved
+    self.occupancy[color] ^= moved
+    if captured != EMPTY:
+      self.bitboards[captured] ^= target_bit
+      self.occupancy[1 - color] ^= target_bit
+      self.occupied ^= source_bit
+    else:
+      self.occupied ^= moved
+    squares[source] = index
+    squares[target] = captured
+    return code
+
+  def decode_move(self, code):
+    """The Move of a packed move in the current position, see ChessGame.decode_move"""
+    source, target = move_squares(code)
+    return Move(SQUARES[source], SQUARES[target], PROTOTYPES[self.squares[source]], PROTOTYPES[self.squares[target]])
+
+
+BACKENDS = {
+  'mailbox': ChessGame,
+  'bitboard': BitboardGame,
+}
+
+
+def create_game(backend='mailbox'):
+  """Creates a new game at the starting position on the named backend"""
+  return BACKENDS[backend]()
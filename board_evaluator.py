@@ -1,4 +1,18 @@
-from piece import Pawn, Knight, Bishop, Rook, Queen, King
+import json
+import os
+
+from piece import Pawn, Knight, Bishop, Rook, Queen, King, PIECE_TYPES
+
+try:
+  import numpy as np
+except ImportError: # NumPy is only needed for evaluate_batch
+  np = None
+
+# Positions encoded per batch chunk; 65536 positions take 4 MB as int8
+BATCH_CHUNK_SIZE = 65536
+
+# Environment variable naming a weights file (see tune.py) to load on import
+WEIGHTS_ENV = 'CHESS_BOT_WEIGHTS'
 
 class BoardEvaluator:
 
@@ -78,12 +92,29 @@ class BoardEvaluator:
     [20, 30, 10,  0,  0, 10, 30, 20]
   ]
 
-  def evaluate(self, board):
+  def __init__(self, debug=False):
+    # In debug mode every evaluation is checked against a full rescan
+    self.debug = debug
+    # Calls to evaluate, for the search statistics
+    self.evaluations = 0
+
+  def evaluate(self, game):
     """
-    Evaluates the board from white's perspective.
+    Evaluates the position from white's perspective.
     Positive score means that white is winning,
     negative means black is winning.
+    Reads the score make_move keeps up to date, so it is O(1).
     """
+    self.evaluations += 1
+    score = game.eval_score
+    if self.debug:
+      expected = self.evaluate_board(game.board)
+      if score != expected:
+        raise AssertionError(f"Incremental score {score} does not match full evaluation {expected}")
+    return score
+
+  def evaluate_board(self, board):
+    """Evaluates a board from scratch by scanning all 64 squares"""
 
     score = 0
 
@@ -99,6 +130,48 @@ class BoardEvaluator:
 
     return score
 
+  def evaluate_batch(self, positions):
+    """
+    Evaluates many positions at once with NumPy. Positions can be games,
+    8x8 boards or 64 bytes already made by encode_board.
+    Returns an int64 array with the same scores as evaluate.
+    """
+    scores = list(self.evaluate_stream(positions))
+    if not scores:
+      return np.zeros(0, dtype=np.int64)
+    return np.concatenate(scores)
+
+  def evaluate_stream(self, positions, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Evaluates an iterable of positions chunk_size at a time, yielding one
+    score array per chunk, so memory stays flat however long the input is.
+    """
+    if np is None:
+      raise ImportError("evaluate_batch needs NumPy: pip install numpy")
+
+    codes = bytearray()
+    count = 0
+    for position in positions:
+      if isinstance(position, (bytes, bytearray)):
+        codes += position
+      else:
+        codes += encode_board(getattr(position, 'board', position))
+      count += 1
+      if count == chunk_size:
+        yield self._score_codes(np.frombuffer(codes, dtype=np.int8).reshape(count, 64))
+        codes = bytearray()
+        count = 0
+    if count:
+      yield self._score_codes(np.frombuffer(codes, dtype=np.int8).reshape(count, 64))
+
+  def _score_codes(self, codes):
+    """Scores an (N, 64) array of square codes with one gather and sum"""
+    global _batch_weights
+    if _batch_weights is None:
+      # Row 0 is the empty square, row index + 1 is the piece index
+      _batch_weights = np.array([[0] * 64] + SQUARE_VALUES, dtype=np.int64)
+    return _batch_weights[codes, np.arange(64)].sum(axis=1)
+
   def _get_piece_value(self, piece, row, col):
     """Get total value of a piece including the positional bonus"""
     piece_type = type(piece).__name__
@@ -118,4 +191,70 @@ class BoardEvaluator:
     elif piece_type == 'King':
         position_value = self.KING_TABLE[row][col] if piece.color == 'white' else self.KING_TABLE[7-row][col]
 
-    return material_value + position_value
\ No newline at end of file
+    return material_value + position_value
+
+
+def _build_square_values():
+  """
+  Material plus positional value of every piece index (see
+  piece.piece_index) on every square, signed from white's perspective
+  """
+  evaluator = BoardEvaluator()
+  values = []
+  for color in ('white', 'black'):
+    sign = 1 if color == 'white' else -1
+    for piece_type in PIECE_TYPES:
+      piece = piece_type(color, None)
+      values.append([sign * evaluator._get_piece_value(piece, square // 8, square % 8)
+                     for square in range(64)])
+  return values
+
+
+SQUARE_VALUES = _build_square_values()
+
+# Material value of each piece kind, in PIECE_TYPES order
+KIND_VALUES = [BoardEvaluator.PIECE_VALUES[piece_type.__name__] for piece_type in PIECE_TYPES]
+
+# Piece-square table attribute of each piece type
+TABLE_NAMES = {piece_type.__name__: piece_type.__name__.upper() + '_TABLE' for piece_type in PIECE_TYPES}
+
+
+def current_weights():
+  """The piece values and tables in use, in the format of a weights file"""
+  return {
+    'piece_values': dict(BoardEvaluator.PIECE_VALUES),
+    'tables': {name: [list(row) for row in getattr(BoardEvaluator, attribute)]
+               for name, attribute in TABLE_NAMES.items()},
+  }
+
+
+# NumPy copy of SQUARE_VALUES for the batch evaluator, made on first use
+_batch_weights = None
+
+
+def load_weights(path):
+  """
+  Replaces the piece values and tables with those of a weights file
+  written by tune.py. Games keep the score they were set up with, so
+  load the weights before creating any.
+  """
+  global _batch_weights
+  with open(path) as f:
+    weights = json.load(f)
+  BoardEvaluator.PIECE_VALUES.update(weights['piece_values'])
+  for name, table in weights['tables'].items():
+    setattr(BoardEvaluator, TABLE_NAMES[name], table)
+  # Updated in place, since the backends and the search imported these lists
+  SQUARE_VALUES[:] = _build_square_values()
+  KIND_VALUES[:] = [BoardEvaluator.PIECE_VALUES[piece_type.__name__] for piece_type in PIECE_TYPES]
+  # The batch evaluator's copy is made again from the new tables
+  _batch_weights = None
+
+
+if os.environ.get(WEIGHTS_ENV):
+  load_weights(os.environ[WEIGHTS_ENV])
+
+
+def encode_board(board):
+  """Encodes a board as 64 bytes: 0 for an empty square, else piece index + 1"""
+  return bytes([0 if piece is None else piece.index + 1 for row in board for piece in row])
@@ -1,15 +1,55 @@
-from piece import Pawn, Knight, Bishop, Rook, Queen, King
-from move import Move
-import copy
+from array import array
+
+from piece import Pawn, Knight, Bishop, Rook, Queen, King, EMPTY
+from move import Move, NULL_MOVE, pack_move, move_squares
+from attack_tables import SQUARES, KNIGHT_TARGETS, KING_TARGETS, ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS
+from zobrist import PIECE_KEYS, BLACK_TO_MOVE, compute_key
+from board_evaluator import BoardEvaluator, SQUARE_VALUES, KIND_VALUES
+from position_cache import PositionCache, MOVES, IN_CHECK, OUTCOME
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+FEN_PIECES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}
+# FEN letter of each piece kind
+FEN_LETTERS = 'pnbrqk'
+
+# FEN castling symbol, king and rook home squares
+CASTLING_SQUARES = (('K', (7, 4), (7, 7)), ('Q', (7, 4), (7, 0)),
+                    ('k', (0, 4), (0, 7)), ('q', (0, 4), (0, 0)))
+
+
+def _square_indices(board):
+  """Piece index of every square (EMPTY for none), in square order"""
+  return [EMPTY if piece is None else piece.index for row in board for piece in row]
 
 class ChessGame:
 
   def __init__(self):
     self.board = self._create_board()
+    # The board again as piece indices by square, which the search reads packed moves against
+    self.squares = _square_indices(self.board)
     self.current_turn = 'white'
-    self.move_history = []
+    # Packed moves (see move.py), NULL_MOVE for a null move
+    self.move_history = array('H')
     self.white_king_pos = (7, 4)
     self.black_king_pos = (0, 4)
+    # FEN move counters: plies since the last capture or pawn move, and the move number
+    self.halfmove_clock = 0
+    self.fullmove_number = 1
+    # One (captured piece, had_moved, previous key, previous score, previous halfmove clock)
+    # record per move in move_history
+    self._undo_stack = []
+    self.zobrist_key = compute_key(self.board, self.current_turn)
+    # Material plus positional score, updated by make_move
+    self.eval_score = BoardEvaluator().evaluate_board(self.board)
+    # Legal moves, check and outcome of recently seen positions
+    self._position_cache = PositionCache()
+
+  def __getstate__(self):
+    # Games sent to other processes start with an empty position cache
+    state = dict(self.__dict__)
+    state['_position_cache'] = PositionCache(self._position_cache.size)
+    return state
 
   def _create_board(self):
     """Initialize the chess board with pieces"""
@@ -43,6 +83,90 @@ class ChessGame:
 
     return board
 
+  @classmethod
+  def from_fen(cls, fen):
+    """
+    Sets up a position from a FEN string. The engine plays without castling
+    and en passant, so those fields only decide which kings and rooks count
+    as unmoved. Missing move counters default to 0 and 1.
+    """
+    fields = fen.split()
+    if len(fields) < 2:
+      raise ValueError(f"Invalid FEN: {fen}")
+    ranks = fields[0].split('/')
+    if len(ranks) != 8 or fields[1] not in ('w', 'b'):
+      raise ValueError(f"Invalid FEN: {fen}")
+    castling = fields[2] if len(fields) > 2 else '-'
+    counters = fields[4:6]
+    if not all(counter.isdigit() for counter in counters):
+      raise ValueError(f"Invalid FEN: {fen}")
+
+    game = cls()
+    game.board = [[None for i in range(8)] for i in range(8)]
+    kings = {}
+    for row, rank in enumerate(ranks):
+      col = 0
+      for char in rank:
+        if char.isdigit():
+          col += int(char)
+          continue
+        piece_type = FEN_PIECES.get(char.lower())
+        if piece_type is None or col > 7:
+          raise ValueError(f"Invalid FEN: {fen}")
+        color = 'white' if char.isupper() else 'black'
+        piece = piece_type(color, (row, col))
+        game.board[row][col] = piece
+        if piece_type is King:
+          kings[color] = (row, col)
+        col += 1
+      if col != 8:
+        raise ValueError(f"Invalid FEN: {fen}")
+    if len(kings) != 2:
+      raise ValueError(f"FEN needs one king per side: {fen}")
+
+    # Pawns off their start rank have moved; kings and rooks keep the castling rights
+    unmoved_squares = {(6, col) for col in range(8)} | {(1, col) for col in range(8)}
+    for symbol, king_pos, rook_pos in CASTLING_SQUARES:
+      if symbol in castling:
+        unmoved_squares.update((king_pos, rook_pos))
+    for row in range(8):
+      for col in range(8):
+        piece = game.board[row][col]
+        if piece is not None and not isinstance(piece, (Knight, Bishop, Queen)):
+          piece.has_moved = (row, col) not in unmoved_squares
+
+    game.white_king_pos = kings['white']
+    game.black_king_pos = kings['black']
+    game.squares = _square_indices(game.board)
+    game.current_turn = 'white' if fields[1] == 'w' else 'black'
+    if counters:
+      game.halfmove_clock = int(counters[0])
+    if len(counters) > 1:
+      game.fullmove_number = max(int(counters[1]), 1)
+    game.zobrist_key = compute_key(game.board, game.current_turn)
+    game.eval_score = BoardEvaluator().evaluate_board(game.board)
+    return game
+
+  def to_fen(self):
+    """
+    FEN string of the position. En passant is always '-'.
+    """
+    ranks = []
+    for row in self.board:
+      rank, empty = '', 0
+      for piece in row:
+        if piece is None:
+          empty += 1
+          continue
+        if empty:
+          rank += str(empty)
+          empty = 0
+        letter = FEN_LETTERS[piece.KIND]
+        rank += letter.upper() if piece.color == 'white' else letter
+      ranks.append(rank + (str(empty) if empty else ''))
+    turn = 'w' if self.current_turn == 'white' else 'b'
+    return f"{'/'.join(ranks)} {turn} {self.castling_rights()} - {self.halfmove_clock} {self.fullmove_number}"
+
   def display_board(self):
     """Displays the current state of the board"""
     print("\n  a b c d e f g h")
@@ -58,126 +182,432 @@ class ChessGame:
     print("  ---------------")
     print("  a b c d e f g h\n")
 
-  def get_legal_moves(self, color):
-    """Get all legal moves for a given color"""
-    moves = []
+  def get_legal_moves(self, color, captures_only=False):
+    """Get all legal moves for a given color (only the captures if captures_only)"""
+    decode_move = self.decode_move
+    return [decode_move(code) for code in self.get_legal_codes(color, captures_only)]
+
+  def generate_legal_moves(self, color, captures_only=False):
+    """The moves of get_legal_moves, bypassing the position cache"""
+    decode_move = self.decode_move
+    return [decode_move(code) for code in self.generate_legal_codes(color, captures_only)]
+
+  def get_legal_codes(self, color, captures_only=False):
+    """get_legal_moves as packed moves (see move.py), which is what the search uses"""
+    if captures_only or color != self.current_turn:
+      return self.generate_legal_codes(color, captures_only)
+    # The side to move's moves are generated once per position; callers get a copy they may reorder
+    entry = self._position_cache.entry(self.zobrist_key)
+    codes = entry[MOVES]
+    if codes is None:
+      codes = entry[MOVES] = self.generate_legal_codes(color)
+    return list(codes)
+
+  def generate_legal_codes(self, color, captures_only=False):
+    """Generates the packed moves get_legal_codes returns, bypassing the position cache (for perft and benchmarks)"""
+    king_pos = self.white_king_pos if color == 'white' else self.black_king_pos
+    checkers, pins = self._find_checks_and_pins(color)
+
+    # Squares other than the king's that stop the check: capture the checker or block it
+    evasions = checkers[0][1] if len(checkers) == 1 else None
+    king_safe_squares = None
+
+    codes = []
     for row in range(8):
       for col in range(8):
         piece = self.board[row][col]
-        if piece and piece.color == color:
-          piece_moves = self._get_piece_moves(piece)
-          moves.extend(piece_moves)
-    return moves
+        if piece is None or piece.color != color:
+          continue
 
-  def _get_piece_moves(self, piece):
-    """Get all legal moves for a specific piece"""
-    moves = []
-    start_pos = piece.position
-    start_row, start_col = start_pos
+        start_pos = (row, col)
+        if start_pos == king_pos:
+          if king_safe_squares is None:
+            king_safe_squares = self._squares_safe_for_king(color)
+          targets = [pos for pos in self._get_piece_targets(piece) if pos in king_safe_squares]
+        elif len(checkers) > 1:
+          # Double check: only the king can move
+          continue
+        else:
+          targets = self._get_piece_targets(piece)
+          if start_pos in pins:
+            targets = [pos for pos in targets if pos in pins[start_pos]]
+          if evasions is not None:
+            targets = [pos for pos in targets if pos in evasions]
 
+        if captures_only:
+          targets = [pos for pos in targets if self.board[pos[0]][pos[1]] is not None]
+
+        start_square = row * 8 + col
+        for end_row, end_col in targets:
+          codes.append(pack_move(start_square, end_row * 8 + end_col))
+
+    return codes
+
+  def _find_checks_and_pins(self, color):
+    """
+    Scans outward from the king of the given color. Returns the checking
+    pieces as (position, squares that capture or block it) pairs, and the
+    pinned pieces as {position: squares it may move to along the pin}.
+    """
+    board = self.board
+    king_row, king_col = self.white_king_pos if color == 'white' else self.black_king_pos
+    king_square = king_row * 8 + king_col
+    checkers = []
+    pins = {}
+
+    for rays, sliders in ((ROOK_RAYS, (Rook, Queen)), (BISHOP_RAYS, (Bishop, Queen))):
+      for ray in rays[king_square]:
+        own_piece_pos = None
+        for index, pos in enumerate(ray):
+          piece = board[pos[0]][pos[1]]
+          if piece is None:
+            continue
+          if piece.color == color:
+            if own_piece_pos is not None:
+              break # Two of our pieces on the ray, nothing to see
+            own_piece_pos = pos
+            continue
+          if isinstance(piece, sliders):
+            line = set(ray[:index + 1])
+            if own_piece_pos is None:
+              checkers.append((pos, line))
+            else:
+              pins[own_piece_pos] = line
+          break
+
+    opponent_color = 'black' if color == 'white' else 'white'
+    for pos in KNIGHT_TARGETS[king_square]:
+      piece = board[pos[0]][pos[1]]
+      if piece is not None and piece.color == opponent_color and isinstance(piece, Knight):
+        checkers.append((pos, {pos}))
+
+    # Enemy pawns attack the king from the row in front of it
+    pawn_row = king_row - 1 if color == 'white' else king_row + 1
+    if 0 <= pawn_row < 8:
+      for pawn_col in (king_col - 1, king_col + 1):
+        if 0 <= pawn_col < 8:
+          piece = board[pawn_row][pawn_col]
+          if piece is not None and piece.color == opponent_color and isinstance(piece, Pawn):
+            checkers.append(((pawn_row, pawn_col), {(pawn_row, pawn_col)}))
+
+    return checkers, pins
+
+  def _squares_safe_for_king(self, color):
+    """Squares not attacked by the opponent, with the king off the board so sliders see through it"""
+    board = self.board
+    king_row, king_col = self.white_king_pos if color == 'white' else self.black_king_pos
+    king = board[king_row][king_col]
+    board[king_row][king_col] = None
+
+    attacked = set()
     for row in range(8):
       for col in range(8):
-        end_pos = (row, col)
-        if start_pos != end_pos:
-          # Create a temporary piece with updated position for validation
-          if piece.is_valid_move(self.board, end_pos):
-            # Check if move doesn't leave king in check
-            if not self._move_causes_check(start_pos, end_pos, piece.color):
-              captured = self.board[row][col]
-              # Create a move iwth acutal positions
-              move = Move(start_pos, end_pos, piece, captured)
-              moves.append(move)
-
-    return moves
-
-  def _move_causes_check(self, start_pos, end_pos, color):
-    """Check if a move would leave the king in check"""
-    # Make a temporary move
-    temp_board = copy.deepcopy(self.board)
-    temp_piece = temp_board[start_pos[0]][start_pos[1]]
-
-    if temp_piece is None:
-      return False
-
-    temp_board[end_pos[0]][end_pos[1]] = temp_piece
-    temp_board[start_pos[0]][start_pos[1]] = None
-    temp_piece.position = end_pos
-
-    # Find king position
-    king_pos = None
-    for row in range(8):
-      for col in range(8):
-        piece = temp_board[row][col]
-        if piece and isinstance(piece, King) and piece.color == color:
-          king_pos = (row, col)
+        piece = board[row][col]
+        if piece is None or piece.color == color:
+          continue
+        square = row * 8 + col
+        if isinstance(piece, Pawn):
+          attack_row = row - 1 if piece.color == 'white' else row + 1
+          if 0 <= attack_row < 8:
+            for attack_col in (col - 1, col + 1):
+              if 0 <= attack_col < 8:
+                attacked.add((attack_row, attack_col))
+        elif isinstance(piece, Knight):
+          attacked.update(KNIGHT_TARGETS[square])
+        elif isinstance(piece, King):
+          attacked.update(KING_TARGETS[square])
+        else:
+          if isinstance(piece, Queen):
+            rays = QUEEN_RAYS[square]
+          elif isinstance(piece, Rook):
+            rays = ROOK_RAYS[square]
+          else:
+            rays = BISHOP_RAYS[square]
+          for ray in rays:
+            for pos in ray:
+              attacked.add(pos)
+              if board[pos[0]][pos[1]] is not None:
+                break
+
+    board[king_row][king_col] = king
+    return {pos for pos in KING_TARGETS[king_row * 8 + king_col] if pos not in attacked}
+
+  def _get_piece_targets(self, piece):
+    """Get the squares a piece can reach, ignoring checks on its own king"""
+    board = self.board
+    color = piece.color
+    row, col = piece.position
+    square = row * 8 + col
+    targets = []
+
+    if isinstance(piece, Pawn):
+      direction = -1 if color == 'white' else 1
+      forward = row + direction
+      if 0 <= forward < 8:
+        if board[forward][col] is None:
+          targets.append((forward, col))
+          # Double move from starting position
+          start_rank = 6 if color == 'white' else 1
+          if row == start_rank and not piece.has_moved and board[forward + direction][col] is None:
+            targets.append((forward + direction, col))
+        for capture_col in (col - 1, col + 1):
+          if 0 <= capture_col < 8:
+            target = board[forward][capture_col]
+            if target is not None and target.color != color:
+              targets.append((forward, capture_col))
+      return targets
+
+    if isinstance(piece, Knight) or isinstance(piece, King):
+      table = KNIGHT_TARGETS if isinstance(piece, Knight) else KING_TARGETS
+      for end_pos in table[square]:
+        target = board[end_pos[0]][end_pos[1]]
+        if target is None or target.color != color:
+          targets.append(end_pos)
+      return targets
+
+    if isinstance(piece, Queen):
+      rays = QUEEN_RAYS[square]
+    elif isinstance(piece, Rook):
+      rays = ROOK_RAYS[square]
+    else:
+      rays = BISHOP_RAYS[square]
+
+    # Slide along each ray until something blocks it
+    for ray in rays:
+      for end_pos in ray:
+        target = board[end_pos[0]][end_pos[1]]
+        if target is None:
+          targets.append(end_pos)
+        else:
+          if target.color != color:
+            targets.append(end_pos)
           break
-      if king_pos:
+
+    return targets
+
+  def static_exchange(self, code):
+    """
+    Static exchange evaluation of a packed move: the material the moving
+    side wins (or loses, if negative) when both sides keep recapturing on
+    the target square with their least valuable piece. Pins are ignored.
+    """
+    start_square, end_square = move_squares(code)
+    start_pos, end_pos = SQUARES[start_square], SQUARES[end_square]
+    target = self.board[end_pos[0]][end_pos[1]]
+    piece = self.board[start_pos[0]][start_pos[1]]
+    gains = [KIND_VALUES[target.KIND] if target is not None else 0]
+    on_square = KIND_VALUES[piece.KIND]
+    removed = {start_pos}
+    color = 'black' if piece.color == 'white' else 'white'
+
+    while True:
+      attacker = self._least_valuable_attacker(end_pos, color, removed)
+      if attacker is None:
         break
+      # Gain if this side captures, assuming the other side's best reply
+      gains.append(on_square - gains[-1])
+      on_square = KIND_VALUES[attacker.KIND]
+      removed.add(attacker.position)
+      color = 'black' if color == 'white' else 'white'
 
-    if king_pos is None:
-      return False
+    # Either side may stop capturing when continuing would lose material
+    for i in range(len(gains) - 1, 0, -1):
+      gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
 
-    # Check if any opponent piece can attack the king
-    opponent_color = 'black' if color == 'white' else 'white'
-    for row in range(8):
-      for col in range(8):
-        piece = temp_board[row][col]
-        if piece and piece.color == opponent_color:
-          try:
-            if piece.is_valid_move(temp_board, king_pos):
-              return True
-          except:
-            # If validation fails, skip this piece
+  def _least_valuable_attacker(self, pos, color, removed):
+    """Cheapest piece of color attacking pos, treating the removed squares as empty"""
+    board = self.board
+    row, col = pos
+    square = row * 8 + col
+    attackers = []
+
+    # Pawns attack pos from the row behind it
+    pawn_row = row + 1 if color == 'white' else row - 1
+    if 0 <= pawn_row < 8:
+      for pawn_col in (col - 1, col + 1):
+        if 0 <= pawn_col < 8 and (pawn_row, pawn_col) not in removed:
+          piece = board[pawn_row][pawn_col]
+          if isinstance(piece, Pawn) and piece.color == color:
+            return piece
+
+    for targets, piece_type in ((KNIGHT_TARGETS, Knight), (KING_TARGETS, King)):
+      for attacker_pos in targets[square]:
+        piece = board[attacker_pos[0]][attacker_pos[1]]
+        if isinstance(piece, piece_type) and piece.color == color and attacker_pos not in removed:
+          attackers.append(piece)
+
+    for rays, sliders in ((ROOK_RAYS, (Rook, Queen)), (BISHOP_RAYS, (Bishop, Queen))):
+      for ray in rays[square]:
+        for attacker_pos in ray:
+          piece = board[attacker_pos[0]][attacker_pos[1]]
+          if piece is None or attacker_pos in removed:
             continue
+          if isinstance(piece, sliders) and piece.color == color:
+            attackers.append(piece)
+          break
 
-    return False
+    if not attackers:
+      return None
+    return min(attackers, key=lambda piece: KIND_VALUES[piece.KIND])
 
   def make_move(self, move):
-    """Execute a move on the board"""
-    start_row, start_col = move.start_pos
-    end_row, end_col = move.end_pos
+    """Execute a move (a Move or a packed move) on the board"""
+    code = move if move.__class__ is int else move.code
+    start_square, end_square = move_squares(code)
+    start_row, start_col = start_pos = SQUARES[start_square]
+    end_row, end_col = end_pos = SQUARES[end_square]
 
     piece = self.board[start_row][start_col]
+    captured = self.board[end_row][end_col]
+    self._undo_stack.append((captured, piece.has_moved, self.zobrist_key, self.eval_score, self.halfmove_clock))
+
+    # Update the hash key and score for the moved and captured pieces and the side to move
+    index = piece.index
+    keys = PIECE_KEYS[index]
+    values = SQUARE_VALUES[index]
+    key = self.zobrist_key ^ keys[start_square] ^ keys[end_square] ^ BLACK_TO_MOVE
+    score = self.eval_score + values[end_square] - values[start_square]
+    if captured is not None:
+      captured_index = captured.index
+      key ^= PIECE_KEYS[captured_index][end_square]
+      score -= SQUARE_VALUES[captured_index][end_square]
+    self.zobrist_key = key
+    self.eval_score = score
 
     # Move the piece
     self.board[end_row][end_col] = piece
     self.board[start_row][start_col] = None
-    piece.position = move.end_pos
+    self.squares[end_square] = index
+    self.squares[start_square] = EMPTY
+    piece.position = end_pos
     piece.has_moved = True
 
     # Update king position
     if isinstance(piece, King):
       if piece.color == 'white':
-        self.white_king_pos = move.end_pos
+        self.white_king_pos = end_pos
       else:
-        self.black_king_pos = move.end_pos
+        self.black_king_pos = end_pos
+
+    self.halfmove_clock = 0 if captured is not None or isinstance(piece, Pawn) else self.halfmove_clock + 1
+    if self.current_turn == 'black':
+      self.fullmove_number += 1
+    self.move_history.append(code)
+    self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+
+  def make_null_move(self):
+    """Passes the turn without moving, for null-move pruning; unmake_move takes it back"""
+    self._undo_stack.append((None, None, self.zobrist_key, self.eval_score, self.halfmove_clock))
+    self.zobrist_key ^= BLACK_TO_MOVE
+    if self.current_turn == 'black':
+      self.fullmove_number += 1
+    self.move_history.append(NULL_MOVE)
+    self.current_turn = 'black' if self.current_turn == 'white' else 'white'
 
-    self.move_history.append(move)
+  def unmake_move(self):
+    """Take back the last move made with make_move (or make_null_move) and return it packed"""
+    code = self.move_history.pop()
+    captured, had_moved, self.zobrist_key, self.eval_score, self.halfmove_clock = self._undo_stack.pop()
     self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+    if self.current_turn == 'black':
+      self.fullmove_number -= 1
+    if code == NULL_MOVE:
+      return code
+    start_square, end_square = move_squares(code)
+    start_row, start_col = start_pos = SQUARES[start_square]
+    end_row, end_col = SQUARES[end_square]
+
+    piece = self.board[end_row][end_col]
+
+    # Put the piece back and restore whatever it captured
+    self.board[start_row][start_col] = piece
+    self.board[end_row][end_col] = captured
+    self.squares[start_square] = piece.index
+    self.squares[end_square] = EMPTY if captured is None else captured.index
+    piece.position = start_pos
+    piece.has_moved = had_moved
+
+    if isinstance(piece, King):
+      if piece.color == 'white':
+        self.white_king_pos = start_pos
+      else:
+        self.black_king_pos = start_pos
+    return code
+
+  def decode_move(self, code):
+    """The Move of a packed move in the current position, i.e. before it is played"""
+    start_square, end_square = move_squares(code)
+    start_row, start_col = start_pos = SQUARES[start_square]
+    end_row, end_col = end_pos = SQUARES[end_square]
+    return Move(start_pos, end_pos, self.board[start_row][start_col], self.board[end_row][end_col])
 
   def is_checkmate(self, color):
     """Check if the given color is in checkmate"""
-    return len(self.get_legal_moves(color)) == 0 and self.is_in_check(color)
+    if color == self.current_turn:
+      return self.outcome() == 'checkmate'
+    return len(self.get_legal_codes(color)) == 0 and self.is_in_check(color)
 
   def is_stalemate(self, color):
     """Check if the given color is in stalemate"""
-    return len(self.get_legal_moves(color)) == 0 and not self.is_in_check(color)
+    if color == self.current_turn:
+      return self.outcome() == 'stalemate'
+    return len(self.get_legal_codes(color)) == 0 and not self.is_in_check(color)
 
   def is_in_check(self, color):
     """Check if the given color's king is in check"""
-    king_pos = self.white_king_pos if color == 'white' else self.black_king_pos
-    opponent_color = 'black' if color == 'white' else 'white'
+    if color != self.current_turn:
+      return self._king_attacked(color)
+    entry = self._position_cache.entry(self.zobrist_key)
+    in_check = entry[IN_CHECK]
+    if in_check is None:
+      in_check = entry[IN_CHECK] = self._king_attacked(color)
+    return in_check
 
-    for row in range(8):
-      for col in range(8):
-        piece = self.board[row][col]
-        if piece and piece.color == opponent_color:
-          if piece.is_valid_move(self.board, king_pos):
-            return True
+  def _king_attacked(self, color):
+    checkers, pins = self._find_checks_and_pins(color)
+    return len(checkers) > 0
 
+  def outcome(self):
+    """'checkmate' or 'stalemate' if the side to move has no legal moves, else None"""
+    entry = self._position_cache.entry(self.zobrist_key)
+    if entry[OUTCOME] is None:
+      if entry[MOVES] is None:
+        entry[MOVES] = self.generate_legal_codes(self.current_turn)
+      if entry[MOVES]:
+        entry[OUTCOME] = ''
+      else:
+        entry[OUTCOME] = 'checkmate' if self.is_in_check(self.current_turn) else 'stalemate'
+    return entry[OUTCOME] or None
+
+  def set_cache_size(self, size):
+    """Number of positions whose legal moves, check and outcome are kept"""
+    self._position_cache.resize(size)
+
+  def has_non_pawn_material(self, color):
+    """True if color has a knight, bishop, rook or queen (null moves are unsafe without one)"""
+    for row in self.board:
+      for piece in row:
+        if piece is not None and piece.color == color and not isinstance(piece, (Pawn, King)):
+          return True
     return False
 
+  def castling_rights(self):
+    """
+    FEN castling field ('KQkq', '-', ...) from which kings and rooks are
+    still unmoved on their home squares. The engine does not castle, but
+    FEN and opening book keys include the rights.
+    """
+    rights = ''
+    for symbol, king_pos, rook_pos in CASTLING_SQUARES:
+      king = self.board[king_pos[0]][king_pos[1]]
+      rook = self.board[rook_pos[0]][rook_pos[1]]
+      color = 'white' if symbol.isupper() else 'black'
+      if (isinstance(king, King) and isinstance(rook, Rook) and king.color == rook.color == color and
+          not king.has_moved and not rook.has_moved):
+        rights += symbol
+    return rights or '-'
+
   def is_game_over(self):
-    """Check if the game is over"""
-    return (self.is_checkmate('white') or self.is_checkmate('black') or
-            self.is_stalemate('white') or self.is_stalemate('black'))
\ No newline at end of file
+    """Check if the game is over (only the side to move can be mated or stalemated)"""
+    return self.outcome() is not None
\ No newline at end of file
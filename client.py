@@ -0,0 +1,120 @@
+"""
+Client for server.py, and a command-line game against the server.
+
+GameClient sends requests over one connection and matches the
+responses to them by id, so many requests (for many games) can be in
+flight at once:
+
+  client = await GameClient.connect('127.0.0.1', 5555)
+  game = (await client.request('new'))['game']
+  reply = await client.request('go', game=game, movetime=0.5)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+
+from chess_engine import ChessGame
+from server import DEFAULT_PORT
+
+
+class ServerError(Exception):
+  """The server answered a request with ok: false"""
+
+
+class GameClient:
+
+  def __init__(self, reader, writer):
+    self._reader = reader
+    self._writer = writer
+    self._ids = itertools.count(1)
+    self._waiting = {}
+    self._receiver = asyncio.create_task(self._receive())
+
+  @classmethod
+  async def connect(cls, host='127.0.0.1', port=DEFAULT_PORT):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+    return cls(reader, writer)
+
+  async def _receive(self):
+    """Hands each response to the request waiting for it"""
+    error = ConnectionError("connection closed")
+    try:
+      while True:
+        line = await self._reader.readline()
+        if not line:
+          break
+        response = json.loads(line)
+        future = self._waiting.pop(response.get('id'), None)
+        if future is not None and not future.done():
+          future.set_result(response)
+    except ConnectionError as exception:
+      error = exception
+    finally:
+      for future in self._waiting.values():
+        if not future.done():
+          future.set_exception(error)
+      self._waiting.clear()
+
+  async def send(self, op, **fields):
+    """Sends a request without waiting for (or keeping) its response"""
+    self._writer.write((json.dumps(dict(fields, op=op)) + '\n').encode())
+    await self._writer.drain()
+
+  async def request(self, op, check=True, **fields):
+    """Sends one request and returns its response (raising ServerError on errors if check)"""
+    request_id = next(self._ids)
+    future = asyncio.get_running_loop().create_future()
+    self._waiting[request_id] = future
+    self._writer.write((json.dumps(dict(fields, id=request_id, op=op)) + '\n').encode())
+    await self._writer.drain()
+    response = await future
+    if check and not response['ok']:
+      raise ServerError(response['error'])
+    return response
+
+  async def close(self):
+    self._writer.close()
+    try:
+      await self._writer.wait_closed()
+    except ConnectionError:
+      pass
+    await self._receiver
+
+
+async def play(host, port, color, movetime):
+  """Plays a game against the server at the terminal"""
+  client = await GameClient.connect(host, port)
+  try:
+    reply = await client.request('new')
+    game_id = reply['game']
+    while reply['outcome'] is None:
+      ChessGame.from_fen(reply['fen']).display_board()
+      if reply['turn'] != color:
+        print("Server is thinking...")
+        reply = await client.request('go', game=game_id, movetime=movetime)
+        print(f"Server plays {reply['move']} (depth {reply['depth']}, {reply['search_ms']:.0f} ms search, "
+              f"{reply['latency_ms']:.0f} ms total)")
+        continue
+
+      text = (await asyncio.to_thread(input, f"Your move ({color}): ")).strip().lower()
+      if text == 'quit':
+        return
+      try:
+        reply = await client.request('move', game=game_id, move=text)
+      except ServerError as error:
+        print(error)
+    ChessGame.from_fen(reply['fen']).display_board()
+    print(f"Game over: {reply['outcome']}")
+  finally:
+    await client.close()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Play a game against server.py")
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+  parser.add_argument('--color', choices=('white', 'black'), default='white')
+  parser.add_argument('--movetime', type=float, default=1.0, help="server seconds per move")
+  args = parser.parse_args()
+  asyncio.run(play(args.host, args.port, args.color, args.movetime))
@@ -0,0 +1,134 @@
+"""
+Compact game records and bulk PGN export.
+
+A game's move history is an array of packed 16-bit moves (see move.py),
+so a finished game is just its start position, its result and those
+moves. Records are stored back to back in a binary file:
+
+  magic b'PCBR', then per game:
+    uint8 result, uint16 FEN length, uint16 ply count (little-endian)
+    the start FEN (ASCII), then ply count packed moves (uint16 little-endian)
+
+A 60-move game takes about 300 bytes. Move objects and SAN are only
+made when records are turned into PGN, one game at a time.
+
+  python game_record.py games.bin --pgn games.pgn
+"""
+import argparse
+import struct
+import sys
+import time
+from array import array
+
+from bitboard import BACKENDS
+from chess_engine import START_FEN
+from move import NULL_MOVE
+from pgn import move_to_san, format_pgn
+
+MAGIC = b'PCBR'
+GAME_HEADER = struct.Struct('<BHH')
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+
+
+def game_record(game, result='*'):
+  """
+  (start FEN, result, packed moves) of a game. The moves are taken back
+  to find the start position and then played again, so the game ends up
+  as it was.
+  """
+  codes = array('H', game.move_history)
+  for code in codes:
+    game.unmake_move()
+  fen = game.to_fen()
+  for code in codes:
+    if code == NULL_MOVE:
+      game.make_null_move()
+    else:
+      game.make_move(game.decode_move(code))
+  return fen, result, codes
+
+
+def record_moves(record, backend='bitboard'):
+  """Replays a record, yielding (game, move) with each move before it is played"""
+  fen, result, codes = record
+  game = BACKENDS[backend].from_fen(fen)
+  for code in codes:
+    move = game.decode_move(code)
+    yield game, move
+    game.make_move(move)
+
+
+def record_sans(record, backend='bitboard'):
+  """SAN of every move of a record"""
+  return [move_to_san(game, move) for game, move in record_moves(record, backend)]
+
+
+def record_pgn(record, headers=None, backend='bitboard'):
+  """PGN text of a record, with the given tags before the start position's"""
+  fen, result, codes = record
+  headers = dict(headers or {})
+  if fen != START_FEN:
+    headers['SetUp'] = '1'
+    headers['FEN'] = fen
+  headers.setdefault('PlyCount', len(codes))
+  first_color = 'white' if fen.split()[1] == 'w' else 'black'
+  return format_pgn(headers, record_sans(record, backend), result, first_color)
+
+
+def write_records(records, f):
+  """Writes records to a binary file opened for writing ('wb' or 'ab'); returns how many"""
+  if f.tell() == 0:
+    f.write(MAGIC)
+  count = 0
+  for fen, result, codes in records:
+    codes = array('H', codes)
+    if sys.byteorder == 'big':
+      codes.byteswap()
+    fen = fen.encode('ascii')
+    f.write(GAME_HEADER.pack(RESULTS.index(result), len(fen), len(codes)))
+    f.write(fen)
+    f.write(codes.tobytes())
+    count += 1
+  return count
+
+
+def read_records(f):
+  """Yields the (start FEN, result, packed moves) records of a binary file"""
+  if f.read(len(MAGIC)) != MAGIC:
+    raise ValueError("not a game record file")
+  while True:
+    header = f.read(GAME_HEADER.size)
+    if not header:
+      return
+    if len(header) < GAME_HEADER.size:
+      raise ValueError("game record file cut short")
+    result, fen_length, plies = GAME_HEADER.unpack(header)
+    fen = f.read(fen_length).decode('ascii')
+    codes = array('H')
+    codes.frombytes(f.read(2 * plies))
+    if sys.byteorder == 'big':
+      codes.byteswap()
+    yield fen, RESULTS[result], codes
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Convert a binary game record file to PGN")
+  parser.add_argument('records', help="binary game record file")
+  parser.add_argument('--pgn', help="PGN file to write (default: stdout)")
+  parser.add_argument('--event', default='?', help="Event tag of the games")
+  args = parser.parse_args()
+
+  started = time.perf_counter()
+  output = open(args.pgn, 'w') if args.pgn else sys.stdout
+  games = plies = 0
+  try:
+    with open(args.records, 'rb') as f:
+      for record in read_records(f):
+        games += 1
+        plies += len(record[2])
+        output.write(record_pgn(record, {'Event': args.event, 'Round': games}))
+  finally:
+    if output is not sys.stdout:
+      output.close()
+  elapsed = time.perf_counter() - started
+  print(f"Wrote {games} games ({plies} plies) in {elapsed:.2f}s", file=sys.stderr)
@@ -0,0 +1,136 @@
+"""
+Load test for server.py: N simulated clients playing at the same time.
+
+Each client opens its own connection and plays --games games in which
+the server moves for both sides, for at most --plies plies each. A share
+of the clients (--abandon) disconnect in the middle of a search to
+exercise cancellation. The script reports request latency percentiles
+as the clients saw them, throughput and the server's own stats.
+
+  python load_test.py --spawn --clients 200 --nodes 300 --plies 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+from client import GameClient, ServerError
+from server import DEFAULT_PORT, percentiles
+
+
+async def run_client(host, port, games, plies, limits, latencies, abandon, rng):
+  client = await GameClient.connect(host, port)
+  try:
+    for game_number in range(games):
+      start = time.perf_counter()
+      reply = await client.request('new')
+      latencies.setdefault('new', []).append((time.perf_counter() - start) * 1000)
+      game_id = reply['game']
+
+      for ply in range(plies):
+        if reply['outcome'] is not None:
+          break
+        if abandon and rng.random() < 1 / plies:
+          # Ask for a search and hang up before it finishes
+          await client.send('go', game=game_id, **limits)
+          await asyncio.sleep(0.01)
+          return 'abandoned'
+        start = time.perf_counter()
+        try:
+          reply = await client.request('go', game=game_id, **limits)
+        except ServerError:
+          # Refused while the server is saturated: back off and try again
+          latencies.setdefault('refused', []).append((time.perf_counter() - start) * 1000)
+          await asyncio.sleep(0.05)
+          continue
+        latencies.setdefault('go', []).append((time.perf_counter() - start) * 1000)
+
+      await client.request('close', game=game_id)
+    return 'finished'
+  finally:
+    await client.close()
+
+
+async def load_test(host, port, clients, games, plies, limits, abandon_share, seed=0):
+  rng = random.Random(seed)
+  latencies = {}
+  started = time.perf_counter()
+  results = await asyncio.gather(*[
+    run_client(host, port, games, plies, limits, latencies, rng.random() < abandon_share, random.Random(rng.random()))
+    for client in range(clients)], return_exceptions=True)
+  elapsed = time.perf_counter() - started
+
+  failures = [result for result in results if isinstance(result, BaseException)]
+  print(f"{clients} clients in {elapsed:.1f}s: {results.count('finished')} finished, "
+        f"{results.count('abandoned')} abandoned, {len(failures)} failed")
+  for failure in failures[:5]:
+    print(f"  {failure!r}")
+  searches = len(latencies.get('go', []))
+  print(f"{searches} searches ({searches / elapsed:.1f}/s)")
+  print("Client-side latency (ms):")
+  for op, samples in sorted(latencies.items()):
+    print(f"  {op:<8} {percentiles(samples)}")
+
+  stats_client = await GameClient.connect(host, port)
+  try:
+    stats = await stats_client.request('stats')
+  finally:
+    await stats_client.close()
+  print(f"Server: {stats['sessions']} sessions, {stats['searches_cancelled']} searches cancelled, "
+        f"{stats['searches_refused']} refused")
+  print("Server-side latency (ms):")
+  for op, summary in sorted(stats['latencies'].items()):
+    print(f"  {op:<8} {summary}")
+  return not failures
+
+
+async def wait_for_server(host, port, timeout=30.0):
+  deadline = time.perf_counter() + timeout
+  while True:
+    try:
+      reader, writer = await asyncio.open_connection(host, port)
+      writer.close()
+      return
+    except OSError:
+      if time.perf_counter() > deadline:
+        raise
+      await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Simulate many clients playing on server.py")
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+  parser.add_argument('--spawn', action='store_true', help="start a server for the test and stop it afterwards")
+  parser.add_argument('--workers', type=int, help="search workers of a spawned server")
+  parser.add_argument('--clients', type=int, default=100)
+  parser.add_argument('--games', type=int, default=1, help="games per client")
+  parser.add_argument('--plies', type=int, default=20, help="plies per game")
+  parser.add_argument('--depth', type=int)
+  parser.add_argument('--movetime', type=float)
+  parser.add_argument('--nodes', type=int)
+  parser.add_argument('--abandon', type=float, default=0.1, help="share of clients that disconnect mid-search")
+  args = parser.parse_args()
+
+  limits = {key: value for key, value in (('depth', args.depth), ('movetime', args.movetime), ('nodes', args.nodes))
+            if value is not None}
+  server = None
+  if args.spawn:
+    server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+    command = [sys.executable, server_script, '--host', args.host, '--port', str(args.port)]
+    if args.workers:
+      command += ['--workers', str(args.workers)]
+    server = subprocess.Popen(command)
+  try:
+    asyncio.run(wait_for_server(args.host, args.port))
+    ok = asyncio.run(load_test(args.host, args.port, args.clients, args.games, args.plies, limits, args.abandon))
+  finally:
+    if server is not None:
+      # Like Ctrl+C, so the server shuts its worker pool down
+      server.send_signal(signal.SIGINT)
+      server.wait()
+  sys.exit(0 if ok else 1)
@@ -1,8 +1,29 @@
-from chess_engine import ChessGame
+import argparse
+
+from bitboard import BACKENDS, create_game
 from ai_player import AIPlayer
 from move import Move
-
-def main():
+from opening_book import OpeningBook
+
+# Search budget per difficulty: a depth limit and/or a time (seconds) or node budget
+DIFFICULTY_LEVELS = {
+  '1': {'depth': 2},
+  '2': {'depth': None, 'movetime': 1.0},
+  '3': {'depth': None, 'movetime': 3.0},
+}
+
+def describe_budget(budget):
+  """Describes a difficulty budget for the start of game message"""
+  parts = []
+  if budget.get('depth') is not None:
+    parts.append(f"depth {budget['depth']}")
+  if budget.get('movetime') is not None:
+    parts.append(f"{budget['movetime']:g}s per move")
+  if budget.get('max_nodes') is not None:
+    parts.append(f"{budget['max_nodes']} nodes per move")
+  return ", ".join(parts)
+
+def main(backend='mailbox', book_path=None, book_mode='weighted'):
   print("=" * 50)
   print("----- AI Chess Bot -----")
   print("=" * 50)
@@ -16,17 +37,17 @@ def main():
 
   print("Select difficulty:")
   print("1. Easy") # depth 2
-  print("2. Medium") # depth 3
-  print("3. Hard") # depth 4
+  print("2. Medium") # 1 second per move
+  print("3. Hard") # 3 seconds per move
 
   difficulty = input("\nEnter choice (1-3): ").strip()
-  depth_map = {'1': 2, '2': 3, '3': 4}
-  ai_depth = depth_map.get(difficulty, 3) # depth 3 by default
+  budget = DIFFICULTY_LEVELS.get(difficulty, DIFFICULTY_LEVELS['2']) # medium by default
 
-  game = ChessGame()
-  ai = AIPlayer(depth=ai_depth)
+  game = create_game(backend)
+  book = OpeningBook(book_path, book_mode) if book_path else None
+  ai = AIPlayer(book=book, **budget)
 
-  print(f"\nStarting the game with AI depth: {ai_depth}")
+  print(f"\nStarting the game with AI budget: {describe_budget(budget)}")
   print("Enter moves in format: e2e4 (from-square to-square, no spaces)")
   print("Type 'quit' to exit\n")
 
@@ -49,6 +70,7 @@ def main():
     if human_color is None or game.current_turn != human_color:
       print("AI is thinking...")
       best_move = ai.get_best_move(game)
+      print(ai.stats.summary())
 
       if best_move:
         print(f"AI plays: {best_move}")
@@ -113,15 +135,21 @@ def main():
   print("  GAME OVER")
   print("=" * 50)
 
-  if game.is_checkmate('white'):
-    print("BLACK WINS by checkmate!")
-  elif game.is_checkmate('black'):
-    print("WHITE WINS by checkmate!")
-  elif game.is_stalemate('white') or game.is_stalemate('black'):
+  outcome = game.outcome()
+  if outcome == 'checkmate':
+    print(f"{'BLACK' if game.current_turn == 'white' else 'WHITE'} WINS by checkmate!")
+  elif outcome == 'stalemate':
     print("DRAW by stalemate!")
 
   print(f"\nTotal moves: {move_count}")
   print("Thanks for playing!\n")
 
 if __name__ == "__main__":
-   main()
+  parser = argparse.ArgumentParser(description="Play chess against the AI bot")
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox',
+                      help="board representation to play on (default: mailbox)")
+  parser.add_argument('--book', help="Polyglot .bin opening book for the AI")
+  parser.add_argument('--book-mode', choices=('weighted', 'best'), default='weighted',
+                      help="pick book moves at random by weight, or always the best (default: weighted)")
+  args = parser.parse_args()
+  main(args.backend, args.book, args.book_mode)
@@ -0,0 +1,312 @@
+"""
+Forced-mate solver using depth-first proof-number search (df-pn).
+
+Proof-number search only looks for a proof that the side to move mates,
+so it does not evaluate positions. It always expands the line that needs
+the fewest further positions to prove (or disprove) the mate: a position
+where the attacker has one checking move that leaves a single reply is
+followed long before one with thirty quiet moves. The depth-first
+variant keeps its results in a fixed-size table instead of the whole
+tree, so memory stays bounded however long it runs.
+
+Positions are keyed by Zobrist key and the plies left, and mates in 1,
+2, ... moves are tried in turn, so the mate found is the shortest. Move
+generation and check detection are the engine's own, with their
+per-position cache.
+
+  python mate_solver.py --fen "r5rk/5p1p/5R2/4B3/8/8/7P/7K w - - 0 1" --moves 3
+  python mate_solver.py puzzles.epd --moves 5 --nodes 1000000
+
+In an EPD file, a "dm N" operation sets the mate length to look for and
+"bm" is checked against the first move of the line.
+"""
+import argparse
+import statistics
+import time
+from collections import OrderedDict
+
+from analyze import epd_operations
+from bitboard import BACKENDS
+from pgn import move_to_san
+
+# Proof and disproof numbers are capped here; a position with proof number 0 is a proven mate
+INFINITY = 10 ** 9
+# Positions kept in the table (about 200 bytes each)
+DEFAULT_TABLE_SIZE = 500000
+DEFAULT_MAX_NODES = 1000000
+
+
+class NodeLimitReached(Exception):
+  """Raised inside the search when the node limit is used up"""
+
+
+class MateSolver:
+  """
+  Searches for a mate by the side to move. Proven positions also keep the
+  number of plies to mate, which picks the mating line: the quickest mate
+  for the attacker against the longest defence.
+  """
+
+  def __init__(self, max_nodes=DEFAULT_MAX_NODES, table_size=DEFAULT_TABLE_SIZE):
+    self.max_nodes = max_nodes
+    self.table_size = table_size
+    # (Zobrist key, plies left) -> (proof number, disproof number, plies to mate or None)
+    self.table = OrderedDict()
+    self.nodes = 0
+
+  def solve(self, game, max_moves):
+    """
+    Looks for a mate in at most max_moves moves. Returns a dict with
+    'result' ('mate', 'no mate' or 'unknown' if the node limit ran out
+    first), 'moves' and 'line' (Move objects) for a mate, 'nodes' and
+    'time'.
+    """
+    self.nodes = 0
+    started = time.perf_counter()
+    result = {'result': 'no mate', 'max_moves': max_moves}
+    plies_played = len(game.move_history)
+    try:
+      for moves in range(1, max_moves + 1):
+        plies = 2 * moves - 1
+        if self._search(game, plies)[0] == 0:
+          result.update(result='mate', moves=moves, line=self._mating_line(game, plies))
+          break
+    except NodeLimitReached:
+      # Stopped somewhere down the tree: take back the moves made since
+      while len(game.move_history) > plies_played:
+        game.unmake_move()
+      result['result'] = 'unknown'
+    result['nodes'] = self.nodes
+    result['time'] = time.perf_counter() - started
+    return result
+
+  def _search(self, game, plies):
+    """Proves or disproves the position to the end, returning its table entry"""
+    self._mid(game, plies, True, INFINITY, INFINITY)
+    return self._entry(game, plies, True)
+
+  def _lookup(self, key):
+    # Every use counts as recent, so the positions on the current line are the last to go
+    entry = self.table.get(key)
+    if entry is not None:
+      self.table.move_to_end(key)
+    return entry
+
+  def _store(self, key, entry):
+    table = self.table
+    table[key] = entry
+    table.move_to_end(key)
+    if len(table) > self.table_size:
+      table.popitem(last=False)
+
+  def _entry(self, game, plies, attacker):
+    """The table entry of the current position, or its starting values if it is not in the table"""
+    key = (game.zobrist_key, plies)
+    entry = self._lookup(key)
+    if entry is not None:
+      return entry
+
+    moves = game.get_legal_codes(game.current_turn)
+    if not moves:
+      # Only the defender being checkmated counts; stalemate, or the attacker mated, does not
+      if not attacker and game.is_in_check(game.current_turn):
+        entry = (0, INFINITY, 0)
+      else:
+        entry = (INFINITY, 0, None)
+    elif plies == 0:
+      entry = (INFINITY, 0, None)
+    elif attacker:
+      # One good move is enough for the attacker: every move is another chance to disprove
+      entry = (1, len(moves), None)
+    else:
+      # Every defence has to be refuted, so fewer replies are quicker to prove
+      entry = (len(moves), 1, None)
+    self._store(key, entry)
+    return entry
+
+  def _mid(self, game, plies, attacker, proof_threshold, disproof_threshold):
+    """
+    Expands the current position until its proof number reaches
+    proof_threshold or its disproof number disproof_threshold (Nagai's
+    multiple iterative deepening).
+    """
+    self.nodes += 1
+    if self.nodes > self.max_nodes:
+      raise NodeLimitReached()
+
+    key = (game.zobrist_key, plies)
+    proof, disproof, length = self._entry(game, plies, attacker)
+    if proof == 0 or disproof == 0:
+      return
+
+    moves = game.get_legal_codes(game.current_turn)
+    child_keys = []
+    for move in moves:
+      game.make_move(move)
+      child_keys.append(game.zobrist_key)
+      self._entry(game, plies - 1, not attacker)
+      game.unmake_move()
+
+    while True:
+      entries = []
+      for move, child_key in zip(moves, child_keys):
+        entry = self._lookup((child_key, plies - 1))
+        if entry is None:
+          # Dropped from the table since: work out its starting values again
+          game.make_move(move)
+          entry = self._entry(game, plies - 1, not attacker)
+          game.unmake_move()
+        entries.append(entry)
+
+      if attacker:
+        proof = min(entry[0] for entry in entries)
+        disproof = min(sum(entry[1] for entry in entries), INFINITY)
+      else:
+        proof = min(sum(entry[0] for entry in entries), INFINITY)
+        disproof = min(entry[1] for entry in entries)
+      if proof >= proof_threshold or disproof >= disproof_threshold:
+        break
+
+      # The child to expand: the easiest to prove (attacker) or disprove (defender), and how
+      # far it may go before the second best one would be easier
+      side = 0 if attacker else 1
+      best = second = None
+      for index, entry in enumerate(entries):
+        if best is None or entry[side] < entries[best][side]:
+          second = entries[best][side] if best is not None else second
+          best = index
+        elif second is None or entry[side] < second:
+          second = entry[side]
+      second = INFINITY if second is None else second
+      if attacker:
+        child_proof = min(proof_threshold, second + 1)
+        child_disproof = min(disproof_threshold - disproof + entries[best][1], INFINITY)
+      else:
+        child_proof = min(proof_threshold - proof + entries[best][0], INFINITY)
+        child_disproof = min(disproof_threshold, second + 1)
+      game.make_move(moves[best])
+      self._mid(game, plies - 1, not attacker, child_proof, child_disproof)
+      game.unmake_move()
+
+    if proof == 0:
+      # Plies to mate: the attacker's quickest proven move, or the defender's longest defence
+      lengths = [entry[2] for entry in entries if entry[0] == 0]
+      length = 1 + (min(lengths) if attacker else max(lengths))
+    self._store(key, (proof, disproof, length))
+
+  def _mating_line(self, game, plies):
+    """The moves of a proven mate, following the table from the current position"""
+    line = []
+    attacker = True
+    while True:
+      moves = game.get_legal_codes(game.current_turn)
+      if not moves or plies == 0:
+        break
+      choice = None
+      for move in moves:
+        game.make_move(move)
+        entry = self._lookup((game.zobrist_key, plies - 1))
+        if entry is None:
+          # Dropped from the table: prove it again
+          self._mid(game, plies - 1, not attacker, INFINITY, INFINITY)
+          entry = self._entry(game, plies - 1, not attacker)
+        game.unmake_move()
+        if entry[0] != 0:
+          continue
+        if choice is None or (entry[2] < choice[1] if attacker else entry[2] > choice[1]):
+          choice = (move, entry[2])
+      if choice is None:
+        break
+      line.append(game.decode_move(choice[0]))
+      game.make_move(choice[0])
+      plies -= 1
+      attacker = not attacker
+    for move in line:
+      game.unmake_move()
+    return line
+
+
+def line_to_san(game, line):
+  """SAN moves of a line played from the current position (which is left as it was)"""
+  sans = []
+  for move in line:
+    sans.append(move_to_san(game, move))
+    game.make_move(move)
+  for move in line:
+    game.unmake_move()
+  return sans
+
+
+def solve_puzzles(lines, max_moves, max_nodes, table_size=DEFAULT_TABLE_SIZE, backend='mailbox', report=print):
+  """
+  Solves EPD puzzles (a "dm N" operation overrides max_moves) and
+  reports each one, then the solve rate and time per puzzle. Returns
+  the list of result dicts.
+  """
+  results = []
+  for number, line in enumerate(lines, 1):
+    fields = line.split(None, 4)
+    if len(fields) < 4 or line.startswith('#'):
+      continue
+    operations = epd_operations(fields[4]) if len(fields) > 4 else {}
+    name = operations.get('id', f"#{number}")
+    try:
+      game = BACKENDS[backend].from_fen(' '.join(fields[:4]))
+    except ValueError as error:
+      report(f"{name}: {error}")
+      continue
+    moves = int(operations['dm']) if operations.get('dm', '').isdigit() else max_moves
+
+    # A fresh table per puzzle, so every one is timed from scratch
+    result = MateSolver(max_nodes, table_size).solve(game, moves)
+    result['id'] = name
+    if result['result'] == 'mate':
+      result['san'] = line_to_san(game, result['line'])
+      expected = operations.get('bm', '').split()
+      result['key_matches'] = not expected or result['san'][0].rstrip('+#') in [move.rstrip('+#!?') for move in expected]
+      detail = f"mate in {result['moves']}: {' '.join(result['san'])}"
+      if not result['key_matches']:
+        detail += f" (bm {operations['bm']})"
+    elif result['result'] == 'no mate':
+      detail = f"no mate within {moves}"
+    else:
+      detail = "node limit reached"
+    report(f"{name}: {detail} ({result['nodes']} nodes, {result['time']:.2f}s)")
+    results.append(result)
+
+  if results:
+    solved = [result for result in results if result['result'] == 'mate']
+    times = [result['time'] for result in results]
+    nodes = sum(result['nodes'] for result in results)
+    report(f"Solved {len(solved)}/{len(results)} ({len(solved) / len(results):.0%}), "
+           f"{sum(not result['key_matches'] for result in solved)} with a different first move than bm")
+    report(f"Time per puzzle: {statistics.mean(times):.2f}s mean, {statistics.median(times):.2f}s median, "
+           f"{max(times):.2f}s max; {nodes} nodes ({nodes / max(sum(times), 1e-9):,.0f} nodes/s)")
+  return results
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Find forced mates with proof-number search")
+  parser.add_argument('puzzles', nargs='?', help="EPD file of puzzles")
+  parser.add_argument('--fen', help="solve one position instead")
+  parser.add_argument('--moves', type=int, default=5, help="longest mate to look for, in moves")
+  parser.add_argument('--nodes', type=int, default=DEFAULT_MAX_NODES, help="node limit per position")
+  parser.add_argument('--table-size', type=int, default=DEFAULT_TABLE_SIZE, help="positions kept in the table")
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox')
+  args = parser.parse_args()
+
+  if args.fen:
+    game = BACKENDS[args.backend].from_fen(args.fen)
+    result = MateSolver(args.nodes, args.table_size).solve(game, args.moves)
+    if result['result'] == 'mate':
+      print(f"Mate in {result['moves']}: {' '.join(line_to_san(game, result['line']))}")
+    elif result['result'] == 'no mate':
+      print(f"No mate within {args.moves}")
+    else:
+      print(f"Node limit reached, no mate found within {args.moves}")
+    print(f"{result['nodes']} nodes in {result['time']:.2f}s")
+  elif args.puzzles:
+    with open(args.puzzles) as f:
+      solve_puzzles(f, args.moves, args.nodes, args.table_size, args.backend)
+  else:
+    parser.error("give an EPD file or --fen")
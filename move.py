@@ -1,10 +1,41 @@
+# Packed moves are 16-bit ints: from square in bits 6-11, to square in bits 0-5
+# (square = row * 8 + col) and a flag in bits 12-15 for promotions. The engine
+# does not promote, so the flag is always 0 for now. 0 (a8 to a8) is never a
+# real move and stands for a null move in a game's move history.
+#
+# Move generation, the search, the move history and the transposition table
+# all use packed moves; Move objects are only made for callers that want one
+# (get_legal_moves, decode_move).
+NULL_MOVE = 0
+FLAG_SHIFT = 12
+
+
+def pack_move(start_square, end_square, flag=0):
+  return flag << FLAG_SHIFT | start_square << 6 | end_square
+
+
+def move_squares(code):
+  """(from square, to square) of a packed move"""
+  return code >> 6 & 63, code & 63
+
+
+def code_to_notation(code):
+  """Coordinate notation of a packed move (like e2e4), without building a Move"""
+  start, end = move_squares(code)
+  return f"{chr(97 + (start & 7))}{8 - (start >> 3)}{chr(97 + (end & 7))}{8 - (end >> 3)}"
+
+
 class Move:
+  # Slots instead of a __dict__ per move, like Piece
+  __slots__ = ('start_pos', 'end_pos', 'piece', 'captured_piece', 'code')
 
   def __init__(self, start_pos, end_pos, piece, captured_piece=None):
     self.start_pos = start_pos
     self.end_pos = end_pos
     self.piece = piece
     self.captured_piece = captured_piece
+    # The packed form, which make_move, the search tables and move history use
+    self.code = pack_move(start_pos[0] * 8 + start_pos[1], end_pos[0] * 8 + end_pos[1])
 
   def __str__(self):
     start = self.pos_to_chess_notation(self.start_pos)
@@ -24,4 +55,4 @@ class Move:
     """Converts chess notation (e4) to (row, col) format"""
     col = ord(notation[0]) - 97
     row = 8 - int(notation[1])
-    return (row, col)
\ No newline at end of file
+    return (row, col)
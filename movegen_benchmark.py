@@ -0,0 +1,151 @@
+import sys
+import time
+import tracemalloc
+
+from chess_engine import ChessGame
+from bitboard import BitboardGame
+from ai_player import AIPlayer
+from move import Move
+from piece import King
+
+# Positions reached from the start by a fixed sequence of moves
+POSITIONS = {
+  'start': '',
+  'italian': 'e2e4 e7e5 g1f3 b8c6 f1c4 g8f6 d2d3 f8c5 b1c3 d7d6 c1g5 h7h6 g5f6 d8f6',
+  'sicilian': 'e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6 c1e3 e7e5 d4b3 c8e6 f2f3 f8e7 d1d2 b8d7 g2g4 h7h6',
+  'queens_gambit': 'd2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7 e2e3 b8d7 g1f3 c7c6 a1c1 h7h6 g5h4 f6e4 h4e7 d8e7',
+}
+
+
+def setup_position(moves):
+  """Plays a space separated list of moves like 'e2e4 e7e5' from the start"""
+  game = ChessGame()
+  for notation in moves.split():
+    start_pos = Move.chess_notation_to_pos(notation[:2])
+    end_pos = Move.chess_notation_to_pos(notation[2:])
+    for move in game.get_legal_moves(game.current_turn):
+      if move.start_pos == start_pos and move.end_pos == end_pos:
+        game.make_move(move)
+        break
+    else:
+      raise ValueError(f"Illegal move in setup: {notation}")
+  return game
+
+
+def _leaves_king_in_check(game, start_pos, end_pos, color):
+  """The original legality test: try the move and ask every opponent piece if it hits the king"""
+  board = game.board
+  piece = board[start_pos[0]][start_pos[1]]
+  captured = board[end_pos[0]][end_pos[1]]
+  board[end_pos[0]][end_pos[1]] = piece
+  board[start_pos[0]][start_pos[1]] = None
+  piece.position = end_pos
+
+  king_pos = next((row, col) for row in range(8) for col in range(8)
+                  if isinstance(board[row][col], King) and board[row][col].color == color)
+  in_check = any(board[row][col] is not None and board[row][col].color != color and
+                 board[row][col].is_valid_move(board, king_pos)
+                 for row in range(8) for col in range(8))
+
+  piece.position = start_pos
+  board[start_pos[0]][start_pos[1]] = piece
+  board[end_pos[0]][end_pos[1]] = captured
+  return in_check
+
+
+def scan_legal_moves(game, color):
+  """The original generator: asks every piece about all 63 other squares, then tries each move"""
+  moves = []
+  for row in range(8):
+    for col in range(8):
+      piece = game.board[row][col]
+      if piece and piece.color == color:
+        for end_row in range(8):
+          for end_col in range(8):
+            end_pos = (end_row, end_col)
+            if end_pos != piece.position and piece.is_valid_move(game.board, end_pos):
+              if not _leaves_king_in_check(game, piece.position, end_pos, color):
+                moves.append(Move(piece.position, end_pos, piece, game.board[end_row][end_col]))
+  return moves
+
+
+def _move_set(moves):
+  return {(move.start_pos, move.end_pos) for move in moves}
+
+
+def _moves_per_second(generate, game, min_time):
+  """Runs the generator repeatedly for at least min_time seconds"""
+  color = game.current_turn
+  generated = 0
+  start = time.perf_counter()
+  elapsed = 0.0
+  while elapsed < min_time:
+    generated += len(generate(game, color))
+    elapsed = time.perf_counter() - start
+  return generated / elapsed
+
+
+def run(min_time=1.0):
+  """Checks both generators agree and prints their speed on each position"""
+  print(f"{'position':<15}{'moves':>7}{'scan moves/s':>15}{'engine moves/s':>16}{'speedup':>9}")
+  for name, moves in POSITIONS.items():
+    game = setup_position(moves)
+    color = game.current_turn
+
+    expected = _move_set(scan_legal_moves(game, color))
+    generated = _move_set(game.generate_legal_moves(color))
+    if generated != expected:
+      raise AssertionError(f"Move generators disagree on {name}: "
+                           f"missing {expected - generated}, extra {generated - expected}")
+
+    scan_speed = _moves_per_second(scan_legal_moves, game, min_time)
+    table_speed = _moves_per_second(lambda g, c: g.generate_legal_codes(c), game, min_time)
+    print(f"{name:<15}{len(expected):>7}{scan_speed:>15,.0f}{table_speed:>16,.0f}{table_speed / scan_speed:>8.1f}x")
+
+
+def compare_backends(depth=3):
+  """Prints search nodes per second on the mailbox and bitboard backends"""
+  print(f"\n{'position':<15}{'mailbox nodes/s':>17}{'bitboard nodes/s':>18}{'speedup':>9}")
+  for name, moves in POSITIONS.items():
+    game = setup_position(moves)
+    speeds = []
+    for backend_game in (game, BitboardGame.from_game(game)):
+      ai = AIPlayer(depth=depth)
+      start = time.perf_counter()
+      ai.get_best_move(backend_game)
+      speeds.append(ai.nodes_evaluated / (time.perf_counter() - start))
+    print(f"{name:<15}{speeds[0]:>17,.0f}{speeds[1]:>18,.0f}{speeds[1] / speeds[0]:>8.1f}x")
+
+
+def _object_size(obj):
+  """Bytes used by an object and its attribute dict, if it has one"""
+  return sys.getsizeof(obj) + (sys.getsizeof(obj.__dict__) if hasattr(obj, '__dict__') else 0)
+
+
+def search_footprint(max_nodes=100000, position='italian'):
+  """Prints object sizes, nodes per second and peak allocations of a fixed-node search"""
+  game = setup_position(POSITIONS[position])
+  print(f"\nPiece: {_object_size(game.board[7][4])} bytes, "
+        f"move: {_object_size(game.get_legal_moves(game.current_turn)[0])} bytes, "
+        f"packed move (what the search uses): {sys.getsizeof(game.get_legal_codes(game.current_turn)[0])} bytes")
+
+  ai = AIPlayer(depth=None, max_nodes=max_nodes)
+  start = time.perf_counter()
+  ai.get_best_move(game)
+  elapsed = time.perf_counter() - start
+  nodes = ai.nodes_evaluated + ai.quiescence_nodes
+  print(f"{nodes} node search: {elapsed:.2f}s, {nodes / elapsed:,.0f} nodes/s")
+
+  # A second run under tracemalloc, which slows everything down, for the allocation peak
+  ai = AIPlayer(depth=None, max_nodes=max_nodes)
+  tracemalloc.start()
+  ai.get_best_move(game)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  print(f"Peak memory allocated during the search: {peak / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+  run()
+  compare_backends()
+  search_footprint()
@@ -0,0 +1,152 @@
+"""
+Polyglot (.bin) opening books.
+
+A book is a file of 16-byte entries (key, move, weight, learn) sorted by
+the Polyglot hash of the position. The file is memory-mapped and
+binary-searched, so opening it reads nothing up front and every engine
+process using the same book shares the pages in the OS file cache.
+"""
+import mmap
+import random
+import struct
+
+from piece import Pawn, Knight, Bishop, Rook, Queen, King
+from move import NULL_MOVE, move_squares
+from polyglot_keys import POLYGLOT_RANDOM
+
+# key, move, weight, learn (big-endian)
+BOOK_ENTRY = struct.Struct('>QHHI')
+
+# Polyglot piece kinds: black pawn 0, white pawn 1, black knight 2, ...
+_POLYGLOT_KIND = {piece_type: 2 * kind for kind, piece_type in enumerate((Pawn, Knight, Bishop, Rook, Queen, King))}
+_CASTLING_OFFSETS = {'K': 768, 'Q': 769, 'k': 770, 'q': 771}
+_EN_PASSANT_OFFSET = 772
+_TURN_OFFSET = 780
+
+
+def _en_passant_file(game):
+  """
+  File of a pawn that just moved two squares if an enemy pawn stands next
+  to it (Polyglot hashes the file only then). The engine does not play
+  en passant, but book keys include it.
+  """
+  if not game.move_history or game.move_history[-1] == NULL_MOVE:
+    return None
+  start, end = move_squares(game.move_history[-1])
+  row, col = divmod(end, 8)
+  board = game.board
+  # The moved piece now stands on its target square
+  if not isinstance(board[row][col], Pawn) or abs(row - start // 8) != 2:
+    return None
+  for side_col in (col - 1, col + 1):
+    if 0 <= side_col < 8:
+      piece = board[row][side_col]
+      if isinstance(piece, Pawn) and piece.color == game.current_turn:
+        return col
+  return None
+
+
+def polyglot_key(game):
+  """The Polyglot hash of a position, used to look it up in a book"""
+  key = 0
+  board = game.board
+  for row in range(8):
+    for col in range(8):
+      piece = board[row][col]
+      if piece is not None:
+        kind = _POLYGLOT_KIND[type(piece)] + (piece.color == 'white')
+        key ^= POLYGLOT_RANDOM[64 * kind + 8 * (7 - row) + col]
+
+  for symbol in game.castling_rights():
+    if symbol in _CASTLING_OFFSETS:
+      key ^= POLYGLOT_RANDOM[_CASTLING_OFFSETS[symbol]]
+  file = _en_passant_file(game)
+  if file is not None:
+    key ^= POLYGLOT_RANDOM[_EN_PASSANT_OFFSET + file]
+  if game.current_turn == 'white':
+    key ^= POLYGLOT_RANDOM[_TURN_OFFSET]
+  return key
+
+
+def _decode_move(code):
+  """Polyglot move to ((row, col), (row, col)); the promotion bits are dropped"""
+  to_square = code & 0x3F
+  from_square = code >> 6 & 0x3F
+  return (7 - (from_square >> 3), from_square & 7), (7 - (to_square >> 3), to_square & 7)
+
+
+class OpeningBook:
+  """
+  Looks up book moves for positions of either backend. mode='weighted'
+  picks moves at random in proportion to their weights, mode='best'
+  always plays the highest-weighted one.
+  """
+
+  def __init__(self, path, mode='weighted', rng=None):
+    if mode not in ('weighted', 'best'):
+      raise ValueError(f"Unknown book mode: {mode}")
+    self.path = path
+    self.mode = mode
+    self.rng = rng or random.Random()
+    self._file = open(path, 'rb')
+    size = self._file.seek(0, 2)
+    # mmap refuses empty files
+    self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+    self.num_entries = size // BOOK_ENTRY.size
+
+  def close(self):
+    if isinstance(self._data, mmap.mmap):
+      self._data.close()
+    self._file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def _first_entry(self, key):
+    """Index of the first entry with this key or a larger one"""
+    low, high = 0, self.num_entries
+    while low < high:
+      middle = (low + high) // 2
+      if BOOK_ENTRY.unpack_from(self._data, middle * BOOK_ENTRY.size)[0] < key:
+        low = middle + 1
+      else:
+        high = middle
+    return low
+
+  def entries(self, game):
+    """(move, weight) for every legal book move in the position, best first"""
+    key = polyglot_key(game)
+    found = []
+    index = self._first_entry(key)
+    while index < self.num_entries:
+      entry_key, code, weight, learn = BOOK_ENTRY.unpack_from(self._data, index * BOOK_ENTRY.size)
+      if entry_key != key:
+        break
+      found.append((_decode_move(code), weight))
+      index += 1
+    if not found:
+      return []
+
+    # Keep only moves the engine can play (book castling moves are not)
+    legal = {(move.start_pos, move.end_pos): move for move in game.get_legal_moves(game.current_turn)}
+    moves = [(legal[squares], weight) for squares, weight in found if squares in legal]
+    moves.sort(key=lambda entry: entry[1], reverse=True)
+    return moves
+
+  def choose(self, game):
+    """A book move for the position, or None when out of book"""
+    # Weight 0 marks a move the book knows but never plays
+    moves = [entry for entry in self.entries(game) if entry[1] > 0]
+    if not moves:
+      return None
+    if self.mode == 'best':
+      return moves[0][0]
+    total = sum(weight for move, weight in moves)
+    pick = self.rng.randrange(total)
+    for move, weight in moves:
+      pick -= weight
+      if pick < 0:
+        return move
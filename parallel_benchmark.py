@@ -0,0 +1,49 @@
+import argparse
+import os
+import time
+
+from ai_player import AIPlayer
+from movegen_benchmark import POSITIONS, setup_position
+
+
+def time_to_depth(workers, depth):
+  """Seconds and total nodes to search every benchmark position to depth"""
+  ai = AIPlayer(depth=depth, workers=workers)
+  elapsed = 0.0
+  nodes = 0
+  try:
+    for moves in POSITIONS.values():
+      game = setup_position(moves)
+      ai.transposition_table.clear()
+      start = time.perf_counter()
+      ai.get_best_move(game)
+      elapsed += time.perf_counter() - start
+      nodes += ai.stats.nodes + ai.helper_nodes
+  finally:
+    ai.close()
+  return elapsed, nodes
+
+
+def run(depth=4, max_workers=None):
+  """Prints time-to-depth speedup for 1, 2, 4, ... workers"""
+  max_workers = max_workers or os.cpu_count() or 1
+  counts = [1]
+  while counts[-1] * 2 <= max_workers:
+    counts.append(counts[-1] * 2)
+  if counts[-1] != max_workers:
+    counts.append(max_workers)
+
+  print(f"{'workers':>7}{'seconds':>10}{'nodes':>10}{'nodes/s':>10}{'speedup':>9}")
+  baseline = None
+  for workers in counts:
+    elapsed, nodes = time_to_depth(workers, depth)
+    baseline = baseline or elapsed
+    print(f"{workers:>7}{elapsed:>10.2f}{nodes:>10}{nodes / elapsed:>10,.0f}{baseline / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Measure Lazy SMP speedup per core count")
+  parser.add_argument('--depth', type=int, default=4)
+  parser.add_argument('--max-workers', type=int, default=None, help="default: number of CPU cores")
+  args = parser.parse_args()
+  run(args.depth, args.max_workers)
@@ -0,0 +1,205 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth.
+
+The counts depend only on the move generator, so they catch any bug in
+get_legal_moves, make_move or unmake_move, and the time taken is a clean
+measure of their speed. The engine plays without castling, en passant
+and promotion (a pawn on the last rank stays there), so the expected
+counts below differ from published perft tables; they were produced
+with the python-chess oracle restricted to the same rules.
+"""
+import argparse
+import time
+
+from chess_engine import START_FEN
+from bitboard import BACKENDS
+from move import Move, code_to_notation
+
+# name, FEN, {depth: leaf nodes}
+PERFT_SUITE = [
+  ('start', START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+  ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+   {1: 46, 2: 1865, 3: 86585}),
+  ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+   {1: 14, 2: 191, 3: 2810, 4: 43087}),
+  ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+   {1: 6, 2: 222, 3: 7861}),
+  ('middlegame', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+   {1: 40, 2: 1349, 3: 51751}),
+  ('symmetric', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+   {1: 46, 2: 2079, 3: 89890}),
+]
+
+
+def move_name(move):
+  """Coordinate notation like e2e4"""
+  return Move.pos_to_chess_notation(move.start_pos) + Move.pos_to_chess_notation(move.end_pos)
+
+
+def perft(game, depth):
+  """Number of move sequences of exactly depth plies from this position"""
+  # Uncached: every position is generated, so its time measures the move generator
+  moves = game.generate_legal_codes(game.current_turn)
+  if depth <= 1:
+    return len(moves) if depth == 1 else 1
+
+  nodes = 0
+  for move in moves:
+    game.make_move(move)
+    nodes += perft(game, depth - 1)
+    game.unmake_move()
+  return nodes
+
+
+def divide(game, depth):
+  """Perft split by root move: {'e2e4': nodes, ...}"""
+  counts = {}
+  for code in game.generate_legal_codes(game.current_turn):
+    game.make_move(code)
+    counts[code_to_notation(code)] = perft(game, depth - 1)
+    game.unmake_move()
+  return counts
+
+
+def _oracle_moves(board):
+  """python-chess legal moves under the engine's rules: no castling, en passant or promotion"""
+  import chess
+  moves = []
+  for move in board.legal_moves:
+    if board.is_castling(move) or board.is_en_passant(move):
+      continue
+    # The four promotions collapse into the pawn just stepping onto the last rank
+    plain = chess.Move(move.from_square, move.to_square)
+    if plain not in moves:
+      moves.append(plain)
+  return moves
+
+
+def _oracle_perft(board, depth):
+  moves = _oracle_moves(board)
+  if depth <= 1:
+    return len(moves) if depth == 1 else 1
+  nodes = 0
+  for move in moves:
+    board.push(move)
+    nodes += _oracle_perft(board, depth - 1)
+    board.pop()
+  return nodes
+
+
+def _oracle_divide(board, depth):
+  counts = {}
+  for move in _oracle_moves(board):
+    board.push(move)
+    counts[move.uci()] = _oracle_perft(board, depth - 1)
+    board.pop()
+  return counts
+
+
+def _oracle_board(fen):
+  try:
+    import chess
+  except ImportError:
+    raise ImportError("--cross-check needs python-chess: pip install chess") from None
+  return chess.Board(fen)
+
+
+def cross_check(fen, depth, backend='mailbox'):
+  """
+  Compares divide against the oracle and follows the first root move
+  whose count differs down the tree, until the two disagree on the move
+  list itself. Returns the path of moves to that position and the
+  (missing, extra) moves there, or None if every count matches.
+  """
+  game = BACKENDS[backend].from_fen(fen)
+  board = _oracle_board(fen)
+  path = []
+  while depth >= 1:
+    ours = divide(game, depth)
+    theirs = _oracle_divide(board, depth)
+    if ours.keys() != theirs.keys():
+      return path, sorted(theirs.keys() - ours.keys()), sorted(ours.keys() - theirs.keys())
+
+    wrong = next((name for name in ours if ours[name] != theirs[name]), None)
+    if wrong is None:
+      return None
+    move = next(move for move in game.get_legal_moves(game.current_turn) if move_name(move) == wrong)
+    game.make_move(move)
+    board.push_uci(wrong)
+    path.append(wrong)
+    depth -= 1
+  return None
+
+
+def oracle_counts(fen, max_depth):
+  """Expected {depth: nodes} for a FEN under the engine's rules, for extending PERFT_SUITE"""
+  board = _oracle_board(fen)
+  return {depth: _oracle_perft(board, depth) for depth in range(1, max_depth + 1)}
+
+
+def run_suite(max_depth=None, backend='mailbox'):
+  """Checks every suite position and prints nodes per second; returns True if all counts match"""
+  print(f"{'position':<12}{'depth':>6}{'nodes':>10}{'expected':>10}{'seconds':>9}{'nodes/s':>10}")
+  passed = True
+  total_nodes = 0
+  total_time = 0.0
+  for name, fen, expected in PERFT_SUITE:
+    game = BACKENDS[backend].from_fen(fen)
+    for depth, count in sorted(expected.items()):
+      if max_depth is not None and depth > max_depth:
+        break
+      start = time.perf_counter()
+      nodes = perft(game, depth)
+      elapsed = time.perf_counter() - start
+      total_nodes += nodes
+      total_time += elapsed
+      status = '' if nodes == count else '  MISMATCH'
+      passed = passed and nodes == count
+      print(f"{name:<12}{depth:>6}{nodes:>10}{count:>10}{elapsed:>9.2f}{nodes / elapsed:>10,.0f}{status}")
+  print(f"Total: {total_nodes} nodes in {total_time:.2f}s ({total_nodes / total_time:,.0f} nodes/s)")
+  return passed
+
+
+def _print_cross_check(fen, depth, backend):
+  result = cross_check(fen, depth, backend)
+  if result is None:
+    print(f"{fen}: depth {depth} matches the oracle")
+    return True
+  path, missing, extra = result
+  print(f"{fen}: move generator differs after: {' '.join(path) or '(root)'}")
+  print(f"  missing: {' '.join(missing) or '-'}")
+  print(f"  extra:   {' '.join(extra) or '-'}")
+  return False
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Perft move generator test and benchmark")
+  parser.add_argument('--fen', help="position to test (default: run the built-in suite)")
+  parser.add_argument('--depth', type=int, default=None)
+  parser.add_argument('--divide', action='store_true', help="print the node count below each root move")
+  parser.add_argument('--cross-check', action='store_true',
+                      help="compare move by move against python-chess")
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox')
+  args = parser.parse_args()
+
+  if args.cross_check:
+    fens = [args.fen] if args.fen else [fen for name, fen, expected in PERFT_SUITE]
+    depth = args.depth or 3
+    ok = all([_print_cross_check(fen, depth, args.backend) for fen in fens])
+  elif args.fen:
+    game = BACKENDS[args.backend].from_fen(args.fen)
+    depth = args.depth or 3
+    start = time.perf_counter()
+    if args.divide:
+      counts = divide(game, depth)
+      for name in sorted(counts):
+        print(f"{name}: {counts[name]}")
+      nodes = sum(counts.values())
+    else:
+      nodes = perft(game, depth)
+    elapsed = time.perf_counter() - start
+    print(f"Nodes: {nodes} ({elapsed:.2f}s, {nodes / elapsed:,.0f} nodes/s)")
+    ok = True
+  else:
+    ok = run_suite(args.depth, args.backend)
+  raise SystemExit(0 if ok else 1)
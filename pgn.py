@@ -0,0 +1,141 @@
+"""
+Standard algebraic notation (SAN) and PGN text for games played by the engine.
+
+The engine has no castling, en passant or promotion, so a pawn reaching
+the last rank is written without a promotion piece (e8 rather than e8=Q).
+Games read from other sources can only be followed up to their first
+castling or promotion.
+"""
+import re
+
+from piece import Pawn, King
+
+PIECE_LETTERS = {'Knight': 'N', 'Bishop': 'B', 'Rook': 'R', 'Queen': 'Q', 'King': 'K'}
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+# Comments, variations (innermost first), NAGs and move numbers are dropped from movetext
+_COMMENT = re.compile(r'\{[^}]*\}|;[^\n]*')
+_VARIATION = re.compile(r'\([^()]*\)')
+_NOISE = re.compile(r'\$\d+|\d+\.(\.\.)?')
+_TAG = re.compile(r'\[(\w+)\s+"(.*)"\]')
+
+
+def move_to_san(game, move):
+  """SAN of a legal move (like Nbd7, exd5 or Qh5+) in the position before it is played"""
+  start_row, start_col = move.start_pos
+  end = move.end_pos
+  target = 'abcdefgh'[end[1]] + str(8 - end[0])
+  piece = game.board[start_row][start_col]
+  capture = game.board[end[0]][end[1]] is not None
+
+  if isinstance(piece, Pawn):
+    san = ('abcdefgh'[start_col] + 'x' if capture else '') + target
+  else:
+    san = PIECE_LETTERS[type(piece).__name__]
+    if not isinstance(piece, King):
+      # Other pieces of the same type that could also go there
+      rivals = [other.start_pos for other in game.get_legal_moves(game.current_turn)
+                if other.end_pos == end and other.start_pos != move.start_pos and
+                type(game.board[other.start_pos[0]][other.start_pos[1]]) is type(piece)]
+      if rivals:
+        if all(col != start_col for row, col in rivals):
+          san += 'abcdefgh'[start_col]
+        elif all(row != start_row for row, col in rivals):
+          san += str(8 - start_row)
+        else:
+          san += 'abcdefgh'[start_col] + str(8 - start_row)
+    san += ('x' if capture else '') + target
+
+  game.make_move(move)
+  if game.is_in_check(game.current_turn):
+    san += '#' if not game.get_legal_moves(game.current_turn) else '+'
+  game.unmake_move()
+  return san
+
+
+def format_pgn(headers, sans, result, first_color='white', first_number=1):
+  """
+  PGN text of one game. headers is an ordered dict of tag names to
+  values (Result is filled in from result); sans are the moves in SAN.
+  """
+  headers = dict(headers)
+  headers['Result'] = result
+  lines = [f'[{name} "{value}"]' for name, value in headers.items()]
+  lines.append('')
+
+  tokens = []
+  number = first_number
+  for ply, san in enumerate(sans):
+    white_to_move = (ply % 2 == 0) == (first_color == 'white')
+    if white_to_move:
+      tokens.append(f"{number}.")
+    elif ply == 0:
+      tokens.append(f"{number}...")
+    tokens.append(san)
+    if not white_to_move:
+      number += 1
+  tokens.append(result)
+
+  # Movetext lines of at most 80 characters
+  line = ''
+  for token in tokens:
+    if line and len(line) + 1 + len(token) > 80:
+      lines.append(line)
+      line = token
+    else:
+      line = f"{line} {token}" if line else token
+  lines.append(line)
+  return '\n'.join(lines) + '\n\n'
+
+
+def parse_san(game, san):
+  """The legal move a SAN string (Nf3, exd5, R1e2+) stands for, or None if there is none"""
+  san = san.rstrip('+#!?')
+  if san.startswith('O-O') or '=' in san or len(san) < 2:
+    # Castling and promotion are not part of the engine's rules
+    return None
+  letter = san[0] if san[0] in 'NBRQK' else ''
+  hint = san[len(letter):-2].replace('x', '')
+  end_col, end_row = ord(san[-2]) - 97, 8 - int(san[-1]) if san[-1].isdigit() else -1
+  for move in game.get_legal_moves(game.current_turn):
+    if move.end_pos != (end_row, end_col):
+      continue
+    if PIECE_LETTERS.get(type(move.piece).__name__, '') != letter:
+      continue
+    start_row, start_col = move.start_pos
+    if any(char != ('abcdefgh'[start_col] if char.isalpha() else str(8 - start_row)) for char in hint):
+      continue
+    return move
+  return None
+
+
+def read_pgn(stream):
+  """Yields (headers, SAN moves, result) for each game of a PGN text stream"""
+  headers, movetext = {}, []
+  for line in stream:
+    line = line.strip()
+    match = _TAG.match(line)
+    if match:
+      if movetext:
+        yield _finish_game(headers, movetext)
+        headers, movetext = {}, []
+      headers[match.group(1)] = match.group(2)
+    elif line:
+      movetext.append(line)
+  if headers or movetext:
+    yield _finish_game(headers, movetext)
+
+
+def _finish_game(headers, movetext):
+  text = _COMMENT.sub(' ', '\n'.join(movetext))
+  while True:
+    stripped = _VARIATION.sub(' ', text)
+    if stripped == text:
+      break
+    text = stripped
+  tokens = _NOISE.sub(' ', text).split()
+  result = headers.get('Result', '*')
+  if tokens and tokens[-1] in RESULTS:
+    result = tokens.pop()
+  return headers, tokens, result
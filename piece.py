@@ -1,9 +1,36 @@
+def _can_land(piece, board, end_row, end_col):
+  """True if the target square is empty or holds an enemy piece"""
+  target = board[end_row][end_col]
+  return target is None or target.color != piece.color
+
+def _path_is_clear(board, start_row, start_col, end_row, end_col):
+  """True if no piece stands between two squares on the same rank, file or diagonal"""
+  row_step = (end_row > start_row) - (end_row < start_row)
+  col_step = (end_col > start_col) - (end_col < start_col)
+  row, col = start_row + row_step, start_col + col_step
+  while row != end_row or col != end_col:
+    if board[row][col] is not None:
+      return False
+    row += row_step
+    col += col_step
+  return True
+
 class Piece:
+  # Slots instead of a __dict__ per piece; the symbols and kind live on the class
+  __slots__ = ('color', 'position', 'has_moved', 'index')
+  SYMBOLS = ('?', '?')
+  KIND = None
 
   def __init__(self, color, position):
     self.color = color
     self.position = position
     self.has_moved = False
+    # Piece code from 0 to 11: white kinds first, then black (see piece_index)
+    self.index = self.KIND if color == 'white' else self.KIND + 6
+
+  @property
+  def symbol(self):
+    return self.SYMBOLS[self.color != 'white']
 
   def __str__(self):
     return self.symbol
@@ -13,10 +40,9 @@ class Piece:
     raise NotImplementedError
 
 class Pawn(Piece):
-
-  def __init__(self, color, position):
-    super().__init__(color, position)
-    self.symbol = '♙' if color == 'white' else '♟'
+  __slots__ = ()
+  SYMBOLS = ('♙', '♟')
+  KIND = 0
 
   def is_valid_move(self, board, end_pos):
     start_row, start_col = self.position
@@ -45,10 +71,9 @@ class Pawn(Piece):
     return False
 
 class Knight(Piece):
-
-  def __init__(self, color, position):
-    super().__init__(color, position)
-    self.symbol = '♘' if color == 'white' else '♞'
+  __slots__ = ()
+  SYMBOLS = ('♘', '♞')
+  KIND = 1
 
   def is_valid_move(self, board, end_pos):
     start_row, start_col = self.position
@@ -58,15 +83,13 @@ class Knight(Piece):
     col_diff = abs(end_col - start_col)
 
     if (row_diff == 2 and col_diff == 1) or (row_diff == 1 and col_diff == 2):
-      target = board[end_row][end_col]
-      return target is None or target.color != self.color
+      return _can_land(self, board, end_row, end_col)
     return False
 
 class Bishop(Piece):
-
-  def __init__(self, color, position):
-    super().__init__(color, position)
-    self.symbol = '♗' if color == 'white' else '♝'
+  __slots__ = ()
+  SYMBOLS = ('♗', '♝')
+  KIND = 2
 
   def is_valid_move(self, board, end_pos):
     start_row, start_col = self.position
@@ -76,24 +99,12 @@ class Bishop(Piece):
       return False
 
     # Check if the path is clear
-    row_step = 1 if end_row > start_row else -1
-    col_step = 1 if end_col > start_col else -1
-
-    current_row, current_col = start_row + row_step, start_col + col_step
-    while (current_row, current_col) != (end_row, end_col):
-      if board[current_row][current_col] is not None:
-        return False
-      current_row += row_step
-      current_col += col_step
-
-    target = board[end_row][end_col]
-    return target is None or target.color != self.color
+    return _path_is_clear(board, start_row, start_col, end_row, end_col) and _can_land(self, board, end_row, end_col)
 
 class Rook(Piece):
-
-  def __init__(self, color, position):
-    super().__init__(color, position)
-    self.symbol = '♖' if color == 'white' else '♜'
+  __slots__ = ()
+  SYMBOLS = ('♖', '♜')
+  KIND = 3
 
   def is_valid_move(self, board, end_pos):
     start_row, start_col = self.position
@@ -102,48 +113,28 @@ class Rook(Piece):
     if start_row != end_row and start_col != end_col:
       return False
 
-    # Check if the paht is clear
-    if start_row == end_row:
-      step = 1 if end_col > start_col else -1
-      for col in range(start_col + step, end_col, step):
-        if board[start_row][col] is not None:
-          return False
-    else:
-      step = 1 if end_row > start_row else -1
-      for row in range(start_row + step, end_row, step):
-        if board[row][start_col] is not None:
-          return False
-
-    target = board[end_row][end_col]
-    return target is None or target.color != self.color
+    # Check if the path is clear
+    return _path_is_clear(board, start_row, start_col, end_row, end_col) and _can_land(self, board, end_row, end_col)
 
 class Queen(Piece):
-
-  def __init__(self, color, position):
-    super().__init__(color, position)
-    self.symbol = '♕' if color == 'white' else '♛'
+  __slots__ = ()
+  SYMBOLS = ('♕', '♛')
+  KIND = 4
 
   def is_valid_move(self, board, end_pos):
     start_row, start_col = self.position
     end_row, end_col = end_pos
 
-    # Check if it's a rook-like move
-    if start_row == end_row or start_col == end_col:
-      temp_rook = Rook(self.color, self.position)
-      return temp_rook.is_valid_move(board, end_pos)
-
-    # Check if it's a bishop-like move
-    if abs(end_row - start_row) == abs(end_col - start_col):
-      temp_bishop = Bishop(self.color, self.position)
-      return temp_bishop.is_valid_move(board, end_pos)
+    # Rook-like or bishop-like move, checked with the same helpers as theirs
+    if start_row == end_row or start_col == end_col or abs(end_row - start_row) == abs(end_col - start_col):
+      return _path_is_clear(board, start_row, start_col, end_row, end_col) and _can_land(self, board, end_row, end_col)
 
     return False
 
 class King(Piece):
-
-  def __init__(self, color, position):
-    super().__init__(color, position)
-    self.symbol = '♔' if color == 'white' else '♚'
+  __slots__ = ()
+  SYMBOLS = ('♔', '♚')
+  KIND = 5
 
   def is_valid_move(self, board, end_pos):
     start_row, start_col = self.position
@@ -153,6 +144,14 @@ class King(Piece):
     col_diff = abs(end_col - start_col)
 
     if row_diff <= 1 and col_diff <= 1 and (row_diff + col_diff) > 0:
-      target = board[end_row][end_col]
-      return target is None or target.color != self.color
-    return False
\ No newline at end of file
+      return _can_land(self, board, end_row, end_col)
+    return False
+
+# Piece kinds in a fixed order, used to index per-piece tables
+PIECE_TYPES = (Pawn, Knight, Bishop, Rook, Queen, King)
+# Piece index of an empty square in a game's squares list
+EMPTY = 12
+
+def piece_index(piece):
+  """Index of a piece from 0 to 11: white kinds first, then black, in PIECE_TYPES order"""
+  return piece.index
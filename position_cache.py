@@ -0,0 +1,56 @@
+"""
+Per-position memo of legal moves, check and game-over status.
+
+A search node, the game loop in main.py and the rule checks all ask the
+same position for its legal moves, whether the side to move is in check
+and whether the game is over. Each game keeps a small LRU cache keyed by
+the Zobrist key, so each of these is computed once per position.
+"""
+from collections import OrderedDict
+
+# Positions kept per game: enough for the nodes along a search path. Larger caches barely
+# hit more often (siblings are searched once per iteration) but hold thousands of move lists
+DEFAULT_SIZE = 64
+
+# Slots of an entry
+MOVES, IN_CHECK, OUTCOME = range(3)
+
+
+class PositionCache:
+  """
+  LRU map from Zobrist key to [legal moves, in check, outcome] of the
+  side to move. Slots are None until somebody computes them.
+  """
+
+  def __init__(self, size=DEFAULT_SIZE):
+    self.size = size
+    self._entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def entry(self, key):
+    """The entry of a position, created empty (and the oldest one dropped) if missing"""
+    entries = self._entries
+    entry = entries.get(key)
+    if entry is None:
+      self.misses += 1
+      entry = entries[key] = [None, None, None]
+      if len(entries) > self.size:
+        entries.popitem(last=False)
+    else:
+      self.hits += 1
+      entries.move_to_end(key)
+    return entry
+
+  def resize(self, size):
+    """Changes the number of positions kept, dropping the oldest ones if it shrinks"""
+    self.size = size
+    while len(self._entries) > size:
+      self._entries.popitem(last=False)
+
+  def clear(self):
+    self._entries.clear()
+    self.hits = self.misses = 0
+
+  def __len__(self):
+    return len(self._entries)
@@ -0,0 +1,224 @@
+"""
+Statistics about a search, and an opt-in profiler.
+
+AIPlayer keeps its counters as plain attributes while it searches and
+copies them into its SearchStats (ai.stats) after every finished depth,
+so collecting them costs nothing inside the search itself.
+"""
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+from move import Move
+
+# Categories of AIPlayer(timing=True), and the game methods timed for each
+TIMED_METHODS = {
+  'get_legal_moves': 'move generation',
+  'get_legal_codes': 'move generation',
+  'is_game_over': 'legality checks',
+  'is_in_check': 'legality checks',
+  'is_checkmate': 'legality checks',
+  'is_stalemate': 'legality checks',
+  'outcome': 'legality checks',
+  'static_exchange': 'exchange evaluation',
+  'make_move': 'make/unmake',
+  'make_null_move': 'make/unmake',
+  'unmake_move': 'make/unmake',
+}
+
+
+def _notation(move):
+  return Move.pos_to_chess_notation(move.start_pos) + Move.pos_to_chess_notation(move.end_pos)
+
+
+class SearchStats:
+  """
+  Counters and timings of one get_best_move call. iterations holds one
+  dict per finished depth with its value, nodes, seconds and PV; nodes
+  and seconds are those of that depth alone.
+  """
+
+  def __init__(self):
+    self.main_nodes = 0
+    self.quiescence_nodes = 0
+    self.leaf_evaluations = 0
+    self.helper_nodes = 0
+    self.cutoffs = 0
+    self.first_move_cutoffs = 0
+    self.depth = 0
+    self.value = None
+    self.best_move = None
+    self.principal_variation = []
+    self.iterations = []
+    self.elapsed = 0.0
+    # Seconds per category, filled only by AIPlayer(timing=True)
+    self.timings = {}
+    self.book_move = False
+    self.finished = False
+
+  @property
+  def nodes(self):
+    return self.main_nodes + self.quiescence_nodes
+
+  @property
+  def nps(self):
+    return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+  @property
+  def effective_branching_factor(self):
+    """Nodes of the last depth over nodes of the one before, or None before depth 2"""
+    if len(self.iterations) < 2 or self.iterations[-2]['nodes'] == 0:
+      return None
+    return self.iterations[-1]['nodes'] / self.iterations[-2]['nodes']
+
+  @property
+  def first_move_cutoff_rate(self):
+    return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+  def snapshot(self):
+    """A copy that later updates of this object do not change"""
+    copy = SearchStats()
+    copy.__dict__.update(self.__dict__)
+    copy.principal_variation = list(self.principal_variation)
+    copy.iterations = [dict(iteration) for iteration in self.iterations]
+    copy.timings = dict(self.timings)
+    return copy
+
+  def as_dict(self):
+    """Plain values (moves in coordinate notation) for logging or JSON"""
+    return {
+      'depth': self.depth,
+      'value': self.value,
+      'best_move': _notation(self.best_move) if self.best_move else None,
+      'pv': [_notation(move) for move in self.principal_variation],
+      'nodes': self.nodes,
+      'main_nodes': self.main_nodes,
+      'quiescence_nodes': self.quiescence_nodes,
+      'leaf_evaluations': self.leaf_evaluations,
+      'helper_nodes': self.helper_nodes,
+      'nps': round(self.nps),
+      'elapsed': self.elapsed,
+      'cutoffs': self.cutoffs,
+      'first_move_cutoff_rate': self.first_move_cutoff_rate,
+      'effective_branching_factor': self.effective_branching_factor,
+      'iterations': [dict(iteration, pv=[_notation(move) for move in iteration['pv']])
+                     for iteration in self.iterations],
+      'timings': self.timings,
+      'book_move': self.book_move,
+    }
+
+  def summary(self):
+    """A few lines for people, like the ones main.py shows after each AI move"""
+    if self.book_move:
+      return "Book move"
+    lines = [
+      f"Nodes evaluated: {self.main_nodes} (quiescence: {self.quiescence_nodes}, "
+      f"leaf evaluations: {self.leaf_evaluations})",
+      f"Search depth: {self.depth} ({self.elapsed:.2f}s, {self.nps:,.0f} nodes/s)",
+    ]
+    if self.effective_branching_factor is not None:
+      lines.append(f"Effective branching factor: {self.effective_branching_factor:.1f}")
+    lines.append(f"Cutoffs on first move: {self.first_move_cutoff_rate:.1%}")
+    for category, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+      lines.append(f"Time in {category}: {seconds:.2f}s")
+    lines.append(f"Best move evaluation: {self.value}")
+    return '\n'.join(lines)
+
+
+class _TimedProxy:
+  """Forwards everything to the wrapped object, timing the listed methods"""
+
+  def __init__(self, target, methods, timings):
+    self._target = target
+    for name, category in methods.items():
+      if hasattr(target, name):
+        setattr(self, name, self._timed(getattr(target, name), category, timings))
+
+  @staticmethod
+  def _timed(method, category, timings):
+    timings.setdefault(category, 0.0)
+
+    def call(*args, **kwargs):
+      start = time.perf_counter()
+      try:
+        return method(*args, **kwargs)
+      finally:
+        timings[category] += time.perf_counter() - start
+    return call
+
+  def __getattr__(self, name):
+    return getattr(self._target, name)
+
+
+def timed_game(game, timings):
+  """The game with its move generation, legality and make/unmake calls timed into timings"""
+  return _TimedProxy(game, TIMED_METHODS, timings)
+
+
+def timed_evaluator(evaluator, timings):
+  return _TimedProxy(evaluator, {'evaluate': 'evaluation'}, timings)
+
+
+def profile_search(ai, game, report_path=None, memory=True, top=30, **limits):
+  """
+  Runs ai.get_best_move(game, **limits) under cProfile (and tracemalloc
+  if memory) and returns (move, report text); the report is also
+  written to report_path if given.
+  """
+  profiler = cProfile.Profile()
+  if memory:
+    tracemalloc.start()
+  profiler.enable()
+  try:
+    move = ai.get_best_move(game, **limits)
+  finally:
+    profiler.disable()
+    snapshot = tracemalloc.take_snapshot() if memory else None
+    peak = tracemalloc.get_traced_memory()[1] if memory else 0
+    if memory:
+      tracemalloc.stop()
+
+  report = io.StringIO()
+  report.write(ai.stats.summary() + '\n\n')
+  stats = pstats.Stats(profiler, stream=report)
+  stats.sort_stats('cumulative').print_stats(top)
+  stats.sort_stats('tottime').print_stats(top)
+  if snapshot is not None:
+    report.write(f"Peak traced memory: {peak / 1024:.0f} KiB\n")
+    report.write("Largest allocations still held at the end of the search:\n")
+    for stat in snapshot.statistics('lineno')[:top]:
+      report.write(f"  {stat}\n")
+
+  text = report.getvalue()
+  if report_path is not None:
+    with open(report_path, 'w') as f:
+      f.write(text)
+  return move, text
+
+
+if __name__ == "__main__":
+  import argparse
+  from ai_player import AIPlayer
+  from bitboard import BACKENDS
+  from chess_engine import START_FEN
+
+  parser = argparse.ArgumentParser(description="Profile one search and print or save the report")
+  parser.add_argument('--fen', default=START_FEN)
+  parser.add_argument('--depth', type=int, default=4)
+  parser.add_argument('--movetime', type=float, help="seconds (searches to --depth if not given)")
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox')
+  parser.add_argument('--report', help="file to write the report to (default: print it)")
+  parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc, which slows the search")
+  parser.add_argument('--timing', action='store_true', help="also time move generation, evaluation, ...")
+  args = parser.parse_args()
+
+  ai = AIPlayer(depth=None if args.movetime else args.depth, movetime=args.movetime, timing=args.timing)
+  game = BACKENDS[args.backend].from_fen(args.fen)
+  move, report = profile_search(ai, game, args.report, memory=not args.no_memory)
+  if args.report is None:
+    print(report)
+  else:
+    print(ai.stats.summary())
+    print(f"Report written to {args.report}")
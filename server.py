@@ -0,0 +1,397 @@
+"""
+Asyncio game server: many games over one TCP port.
+
+The protocol is one JSON object per line each way. Requests name an op
+and may carry an id, which is copied into the response:
+
+  {"id": 1, "op": "new"}                         -> {"id": 1, "ok": true, "game": 7, "fen": ...}
+  {"id": 2, "op": "move", "game": 7, "move": "e2e4"}
+  {"id": 3, "op": "go", "game": 7, "movetime": 0.5}  (or depth, nodes; plays the move unless "play": false)
+  {"id": 4, "op": "state", "game": 7}
+  {"id": 5, "op": "close", "game": 7}
+  {"id": 6, "op": "stats"}                       (sessions, queue and latency percentiles per op)
+
+Errors come back as {"ok": false, "error": "..."}. Every response has
+latency_ms, and "go" responses also split it into queue and search time.
+
+Games live in the event loop, so one process holds thousands of them.
+Searches run in a process pool with at most --workers at a time; later
+ones wait their turn, and once --max-queue are waiting new ones are
+refused. A client's games are dropped when it disconnects, and its
+searches are cancelled, including ones already running in a worker.
+
+  python server.py --port 5555 --workers 4
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ai_player import AIPlayer, mate_moves
+from bitboard import BACKENDS
+from chess_engine import START_FEN
+from uci import move_to_uci, find_move
+
+DEFAULT_PORT = 5555
+# Requests of one connection handled at the same time; reading waits beyond that
+CONNECTION_REQUESTS = 64
+# Latency samples kept per op for the percentiles
+LATENCY_SAMPLES = 10000
+# Longest search a request may ask for, in seconds
+MAX_MOVETIME = 30.0
+
+
+class StopFlag:
+  """One slot of a shared byte array, used as the stop_event of a search in another process"""
+
+  def __init__(self, flags, slot):
+    self.flags = flags
+    self.slot = slot
+
+  def is_set(self):
+    return self.flags[self.slot] != 0
+
+
+# Per worker process: the stop flags shared with the server, and an AIPlayer per table size
+_stop_flags = None
+_players = {}
+
+
+def _init_worker(stop_flags):
+  global _stop_flags
+  _stop_flags = stop_flags
+
+
+def search_position(fen, limits, backend, slot, tt_size_mb):
+  """Searches a position in a worker process; the search stops early if the server sets its flag"""
+  if tt_size_mb not in _players:
+    _players[tt_size_mb] = AIPlayer(depth=None, tt_size_mb=tt_size_mb)
+  ai = _players[tt_size_mb]
+  game = BACKENDS[backend].from_fen(fen)
+  move = ai.get_best_move(game, stop_event=StopFlag(_stop_flags, slot), **limits)
+  if move is None:
+    return None
+  stats = ai.stats
+  result = {
+    'move': move_to_uci(move),
+    'depth': stats.depth,
+    'nodes': stats.nodes,
+    'pv': [move_to_uci(pv_move) for pv_move in stats.principal_variation],
+  }
+  # Scores are from the side to move's point of view
+  value = stats.value if game.current_turn == 'white' else -stats.value
+  moves = mate_moves(value)
+  if moves is not None:
+    result['mate'] = moves
+  else:
+    result['score'] = value
+  return result
+
+
+def percentiles(samples):
+  """count, p50, p90, p99 and max of a list of latencies"""
+  if not samples:
+    return {'count': 0}
+  ordered = sorted(samples)
+
+  def at(share):
+    return round(ordered[min(int(share * len(ordered)), len(ordered) - 1)], 2)
+  return {'count': len(ordered), 'p50': at(0.5), 'p90': at(0.9), 'p99': at(0.99), 'max': round(ordered[-1], 2)}
+
+
+class RequestError(Exception):
+  """A request that cannot be served; its message goes back to the client"""
+
+
+class Session:
+  """One game on the server and the connection that owns it"""
+
+  def __init__(self, game_id, game, backend, owner):
+    self.id = game_id
+    self.game = game
+    self.backend = backend
+    self.owner = owner
+    # Requests on the same game run one after the other
+    self.lock = asyncio.Lock()
+
+
+class GameServer:
+
+  def __init__(self, workers=None, backend='mailbox', max_queue=1000, default_limits=None, tt_size_mb=16):
+    self.workers = workers or os.cpu_count() or 1
+    self.backend = backend
+    self.max_queue = max_queue
+    self.default_limits = default_limits or {'depth': 3}
+    self.tt_size_mb = tt_size_mb
+    self.sessions = {}
+    self.connections = 0
+    self._game_ids = itertools.count(1)
+    self._connection_ids = itertools.count(1)
+    # One stop flag per search the pool runs at a time
+    self._stop_flags = multiprocessing.RawArray('b', self.workers)
+    self._free_slots = list(range(self.workers))
+    self._pool = None
+    self._search_slots = None
+    self.searches_running = 0
+    self.searches_waiting = 0
+    self.searches_cancelled = 0
+    self.searches_refused = 0
+    self.latencies = {}
+    self._server = None
+
+  async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+    # Spawned rather than forked workers, which would inherit client sockets and keep them open
+    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(self._stop_flags,))
+    self._search_slots = asyncio.Semaphore(self.workers)
+    self._server = await asyncio.start_server(self._serve_connection, host, port, limit=1 << 16)
+    return self._server
+
+  async def close(self):
+    if self._server is not None:
+      self._server.close()
+      await self._server.wait_closed()
+    for slot in range(self.workers):
+      self._stop_flags[slot] = 1
+    if self._pool is not None:
+      self._pool.shutdown(cancel_futures=True)
+
+  def _record_latency(self, op, milliseconds):
+    if op not in self.latencies:
+      self.latencies[op] = deque(maxlen=LATENCY_SAMPLES)
+    self.latencies[op].append(milliseconds)
+
+  async def _serve_connection(self, reader, writer):
+    connection = next(self._connection_ids)
+    self.connections += 1
+    write_lock = asyncio.Lock()
+    slots = asyncio.Semaphore(CONNECTION_REQUESTS)
+    tasks = set()
+
+    async def respond(line, received):
+      try:
+        response = await self.handle_line(line, connection, received)
+        async with write_lock:
+          writer.write((json.dumps(response) + '\n').encode())
+          await writer.drain()
+      except (ConnectionError, asyncio.CancelledError):
+        pass
+      finally:
+        slots.release()
+
+    try:
+      while True:
+        await slots.acquire()
+        try:
+          line = await reader.readline()
+        except (ConnectionError, ValueError):
+          break
+        if not line:
+          break
+        task = asyncio.create_task(respond(line, time.perf_counter()))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    finally:
+      # The client is gone: stop its searches and drop its games
+      for task in list(tasks):
+        task.cancel()
+      if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+      for game_id in [game_id for game_id, session in self.sessions.items() if session.owner == connection]:
+        del self.sessions[game_id]
+      self.connections -= 1
+      writer.close()
+      try:
+        await writer.wait_closed()
+      except ConnectionError:
+        pass
+
+  async def handle_line(self, line, connection, received=None):
+    """Response dict for one request line"""
+    received = received or time.perf_counter()
+    request_id = None
+    op = 'invalid'
+    try:
+      request = json.loads(line)
+      if not isinstance(request, dict):
+        raise RequestError("request must be a JSON object")
+      request_id = request.get('id')
+      op = request.get('op')
+      handler = getattr(self, f"_op_{op}", None) if isinstance(op, str) else None
+      if handler is None:
+        op = 'invalid'
+        raise RequestError(f"unknown op: {request.get('op')}")
+      response = await handler(request, connection)
+      response['ok'] = True
+    except RequestError as error:
+      response = {'ok': False, 'error': str(error)}
+    except (ValueError, TypeError) as error:
+      response = {'ok': False, 'error': f"bad request: {error}"}
+    except Exception as error:
+      # A bug should cost one request its answer, not the connection
+      response = {'ok': False, 'error': f"internal error: {error!r}"}
+    if request_id is not None:
+      response['id'] = request_id
+    latency = (time.perf_counter() - received) * 1000
+    response['latency_ms'] = round(latency, 2)
+    self._record_latency(op, latency)
+    return response
+
+  def _session(self, request, connection):
+    session = self.sessions.get(request.get('game'))
+    if session is None or session.owner != connection:
+      raise RequestError(f"no such game: {request.get('game')}")
+    return session
+
+  @staticmethod
+  def _position(game):
+    return {'fen': game.to_fen(), 'turn': game.current_turn, 'outcome': game.outcome()}
+
+  async def _op_new(self, request, connection):
+    backend = request.get('backend', self.backend)
+    if backend not in BACKENDS:
+      raise RequestError(f"unknown backend: {backend}")
+    game = BACKENDS[backend].from_fen(request.get('fen', START_FEN))
+    session = Session(next(self._game_ids), game, backend, connection)
+    self.sessions[session.id] = session
+    return dict({'game': session.id}, **self._position(game))
+
+  async def _op_move(self, request, connection):
+    session = self._session(request, connection)
+    async with session.lock:
+      move = find_move(session.game, str(request.get('move', '')))
+      if move is None:
+        raise RequestError(f"illegal move: {request.get('move')}")
+      session.game.make_move(move)
+      return self._position(session.game)
+
+  async def _op_state(self, request, connection):
+    session = self._session(request, connection)
+    game = session.game
+    return dict(self._position(game), moves=[move_to_uci(move) for move in game.get_legal_moves(game.current_turn)])
+
+  async def _op_close(self, request, connection):
+    session = self._session(request, connection)
+    del self.sessions[session.id]
+    return {'game': session.id}
+
+  async def _op_stats(self, request, connection):
+    return {
+      'sessions': len(self.sessions),
+      'connections': self.connections,
+      'workers': self.workers,
+      'searches_running': self.searches_running,
+      'searches_waiting': self.searches_waiting,
+      'searches_cancelled': self.searches_cancelled,
+      'searches_refused': self.searches_refused,
+      'latencies': {op: percentiles(samples) for op, samples in self.latencies.items()},
+    }
+
+  def _limits(self, request):
+    limits = {}
+    if request.get('depth') is not None:
+      limits['depth'] = int(request['depth'])
+    if request.get('nodes') is not None:
+      limits['max_nodes'] = int(request['nodes'])
+    if request.get('movetime') is not None:
+      limits['movetime'] = min(float(request['movetime']), MAX_MOVETIME)
+    limits = limits or dict(self.default_limits)
+    # Every search ends in bounded time, whatever depth it asks for
+    limits.setdefault('movetime', MAX_MOVETIME)
+    return limits
+
+  async def _op_go(self, request, connection):
+    session = self._session(request, connection)
+    limits = self._limits(request)
+    async with session.lock:
+      game = session.game
+      if game.outcome() is not None:
+        raise RequestError(f"game over: {game.outcome()}")
+      fen = game.to_fen()
+      queued = time.perf_counter()
+      result = await self.search(fen, limits, session.backend)
+      searched = time.perf_counter()
+
+      started = result.pop('started')
+      if request.get('play', True):
+        game.make_move(find_move(game, result['move']))
+      result.update(self._position(game))
+      result['queue_ms'] = round((started - queued) * 1000, 2)
+      result['search_ms'] = round((searched - started) * 1000, 2)
+      return result
+
+  async def search(self, fen, limits, backend):
+    """
+    Runs search_position in the pool once a worker is free. Cancelling
+    the calling task while the search runs stops the search in its worker.
+    """
+    if self.searches_waiting >= self.max_queue:
+      self.searches_refused += 1
+      raise RequestError("server busy: too many searches waiting")
+
+    self.searches_waiting += 1
+    try:
+      await self._search_slots.acquire()
+    except asyncio.CancelledError:
+      self.searches_cancelled += 1
+      raise
+    finally:
+      self.searches_waiting -= 1
+
+    slot = self._free_slots.pop()
+    self._stop_flags[slot] = 0
+    self.searches_running += 1
+    started = time.perf_counter()
+    future = asyncio.get_running_loop().run_in_executor(
+      self._pool, search_position, fen, limits, backend, slot, self.tt_size_mb)
+    try:
+      result = await asyncio.shield(future)
+    except asyncio.CancelledError:
+      # The worker stops at its next budget check; the slot is free once it has
+      self.searches_cancelled += 1
+      self._stop_flags[slot] = 1
+      future.add_done_callback(lambda done: self._release_slot(slot))
+      raise
+    self._release_slot(slot)
+    if result is None:
+      raise RequestError("no legal moves")
+    result['started'] = started
+    return result
+
+  def _release_slot(self, slot):
+    self.searches_running -= 1
+    self._free_slots.append(slot)
+    self._search_slots.release()
+
+
+async def serve(host, port, **options):
+  server = GameServer(**options)
+  tcp_server = await server.start(host, port)
+  print(f"Serving on {', '.join(str(sock.getsockname()) for sock in tcp_server.sockets)} "
+        f"with {server.workers} search workers", flush=True)
+  try:
+    await tcp_server.serve_forever()
+  finally:
+    await server.close()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Serve many games over a line-based JSON protocol")
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+  parser.add_argument('--workers', type=int, default=None, help="search processes (default: number of CPU cores)")
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox', help="default backend of new games")
+  parser.add_argument('--max-queue', type=int, default=1000, help="searches allowed to wait for a worker")
+  parser.add_argument('--hash', type=int, default=16, help="transposition table size per worker in MB")
+  parser.add_argument('--depth', type=int, default=3, help="search depth of go requests without limits")
+  args = parser.parse_args()
+  try:
+    asyncio.run(serve(args.host, args.port, workers=args.workers, backend=args.backend, max_queue=args.max_queue,
+                      default_limits={'depth': args.depth}, tt_size_mb=args.hash))
+  except KeyboardInterrupt:
+    pass
@@ -0,0 +1,288 @@
+"""
+Headless self-play matches between two AIPlayer configurations.
+
+Games run in a process pool, one game per worker at a time, so the
+number of games per minute grows with the number of cores. Each
+opening is played twice with colors swapped. Finished games are
+appended to a PGN file (and with --records, a binary game record file)
+straight away, and the match stops early once the SPRT decides between
+the two Elo hypotheses.
+
+  python tournament.py --engine new quiescence=True --engine old quiescence=False \
+      --nodes 2000 --games 1000 --openings openings.epd --pgn match.pgn
+"""
+import argparse
+import ast
+import datetime
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from ai_player import AIPlayer
+from bitboard import BACKENDS
+from chess_engine import START_FEN
+from game_record import game_record, record_pgn, write_records
+from piece import Pawn, Knight, Bishop, King
+
+# Games longer than this are adjudicated as draws
+MAX_PLIES = 400
+# Plies without a capture or pawn move before the game is drawn (the fifty-move rule)
+QUIET_PLY_LIMIT = 100
+
+
+def load_openings(path):
+  """Start positions from a file with one FEN or EPD record per line"""
+  openings = []
+  with open(path) as f:
+    for line in f:
+      fields = line.split()
+      if len(fields) >= 4 and not line.startswith('#'):
+        # EPD records carry four position fields followed by operations
+        openings.append(' '.join(fields[:4]) + ' 0 1')
+  return openings
+
+
+def parse_engine(args):
+  """['name', 'key=value', ...] from the command line to (name, AIPlayer keyword arguments)"""
+  name, options = args[0], {}
+  for option in args[1:]:
+    key, value = option.split('=', 1)
+    try:
+      options[key] = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+      options[key] = value
+  return name, options
+
+
+# Players of a worker process, kept between games so their tables are allocated once
+_players = {}
+
+
+def _player(name, options):
+  key = (name, tuple(sorted(options.items())))
+  if key not in _players:
+    _players[key] = AIPlayer(**dict({'depth': None}, **options))
+  return _players[key]
+
+
+def _only_minor_pieces(game):
+  """True if neither side has enough material left to mate"""
+  pieces = [piece for row in game.board for piece in row if piece is not None and not isinstance(piece, King)]
+  return len(pieces) == 0 or (len(pieces) == 1 and isinstance(pieces[0], (Knight, Bishop)))
+
+
+def _game_result(game, legal_moves, repetitions, quiet_plies, plies):
+  """(result, termination) if the game is over, else None"""
+  if not legal_moves:
+    if game.is_in_check(game.current_turn):
+      return ('0-1' if game.current_turn == 'white' else '1-0'), 'checkmate'
+    return '1/2-1/2', 'stalemate'
+  if repetitions >= 3:
+    return '1/2-1/2', 'threefold repetition'
+  if quiet_plies >= QUIET_PLY_LIMIT:
+    return '1/2-1/2', 'fifty-move rule'
+  if _only_minor_pieces(game):
+    return '1/2-1/2', 'insufficient material'
+  if plies >= MAX_PLIES:
+    return '1/2-1/2', 'adjudicated: move limit'
+  return None
+
+
+def play_game(round_number, engines, white, fen, backend):
+  """
+  Plays one game in a worker process. engines is ((name, options),
+  (name, options)) and white is the index of the engine playing white.
+  Returns the result, termination reason, game record and PGN text.
+  """
+  players = [_player(name, options) for name, options in engines]
+  for player in players:
+    player.transposition_table.clear()
+  game = BACKENDS[backend].from_fen(fen)
+
+  seen = {game.zobrist_key: 1}
+  quiet_plies = 0
+  while True:
+    legal_moves = game.get_legal_moves(game.current_turn)
+    outcome = _game_result(game, legal_moves, seen[game.zobrist_key], quiet_plies, len(game.move_history))
+    if outcome is not None:
+      break
+
+    mover = white if game.current_turn == 'white' else 1 - white
+    move = players[mover].get_best_move(game)
+    quiet = move.captured_piece is None and not isinstance(move.piece, Pawn)
+    game.make_move(move)
+    quiet_plies = quiet_plies + 1 if quiet else 0
+    seen[game.zobrist_key] = seen.get(game.zobrist_key, 0) + 1
+
+  result, termination = outcome
+  headers = {
+    'Event': 'Self-play match',
+    'Site': 'python-chess-bot',
+    'Date': datetime.date.today().strftime('%Y.%m.%d'),
+    'Round': round_number,
+    'White': engines[white][0],
+    'Black': engines[1 - white][0],
+    'Result': result,
+    'Termination': termination,
+  }
+  # The SAN moves are made from the packed move history once the game is over
+  record = game_record(game, result)
+  return {
+    'round': round_number,
+    'white': white,
+    'result': result,
+    'termination': termination,
+    'record': record,
+    'pgn': record_pgn(record, headers, backend),
+  }
+
+
+def elo_difference(wins, draws, losses):
+  """Elo difference implied by the score and its 95% error margin"""
+  games = wins + draws + losses
+  score = (wins + draws / 2) / games
+  if score <= 0 or score >= 1:
+    return (math.inf if score >= 1 else -math.inf), math.inf
+  variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+  margin = 1.96 * math.sqrt(variance / games)
+
+  def to_elo(s):
+    s = min(max(s, 1e-9), 1 - 1e-9)
+    return 400 * math.log10(s / (1 - s))
+  return to_elo(score), (to_elo(score + margin) - to_elo(score - margin)) / 2
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+  """
+  Log-likelihood ratio of H1 (Elo difference is elo1) against H0 (it is
+  elo0), using the normal approximation of the trinomial score.
+  """
+  games = wins + draws + losses
+  if games == 0:
+    return 0.0
+  score = (wins + draws / 2) / games
+  variance = ((wins + draws / 4) / games - score ** 2) / games
+  # Only all wins, all draws or all losses leave no spread to measure
+  if variance <= 0:
+    return 0.0
+  s0 = 1 / (1 + 10 ** (-elo0 / 400))
+  s1 = 1 / (1 + 10 ** (-elo1 / 400))
+  return (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+def run_match(engines, games, openings=None, workers=None, backend='mailbox', pgn_path=None,
+              elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05, records_path=None):
+  """
+  Plays up to games games between engines[0] and engines[1] and returns
+  (wins, draws, losses) from engines[0]'s point of view.
+  """
+  openings = openings or [START_FEN]
+  workers = workers or os.cpu_count() or 1
+  lower, upper = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+  wins = draws = losses = 0
+  pgn_file = open(pgn_path, 'a') if pgn_path else None
+  records_file = open(records_path, 'ab') if records_path else None
+
+  def jobs():
+    for game_index in range(games):
+      # Both colors of each opening, one after the other
+      yield game_index + 1, engines, game_index % 2, openings[game_index // 2 % len(openings)], backend
+
+  pending = set()
+  job_iter = jobs()
+  decision = None
+  started = datetime.datetime.now()
+  try:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      while True:
+        # Keep every worker busy, but do not queue games the SPRT may make unnecessary
+        while decision is None and len(pending) < workers * 2:
+          job = next(job_iter, None)
+          if job is None:
+            break
+          pending.add(pool.submit(play_game, *job))
+        if not pending:
+          break
+
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+          if future.cancelled():
+            continue
+          game = future.result()
+          if pgn_file is not None:
+            pgn_file.write(game['pgn'])
+            pgn_file.flush()
+          if records_file is not None:
+            write_records([game['record']], records_file)
+            records_file.flush()
+
+          first_engine_white = game['white'] == 0
+          if game['result'] == '1/2-1/2':
+            draws += 1
+          elif (game['result'] == '1-0') == first_engine_white:
+            wins += 1
+          else:
+            losses += 1
+
+          played = wins + draws + losses
+          elo, margin = elo_difference(wins, draws, losses)
+          llr = sprt_llr(wins, draws, losses, elo0, elo1)
+          minutes = max((datetime.datetime.now() - started).total_seconds() / 60, 1e-9)
+          print(f"Game {game['round']}: {game['result']} ({game['termination']}) | "
+                f"{engines[0][0]} +{wins} ={draws} -{losses} | Elo {elo:+.1f} +/- {margin:.1f} | "
+                f"LLR {llr:.2f} [{lower:.2f}, {upper:.2f}] | {played / minutes:.1f} games/min")
+
+          if decision is None and llr >= upper:
+            decision = f"H1 accepted: {engines[0][0]} is stronger by about {elo1:g} Elo or more"
+          elif decision is None and llr <= lower:
+            decision = f"H0 accepted: {engines[0][0]} is not stronger by {elo1:g} Elo"
+        if decision is not None:
+          # Games already running finish; the ones not started are dropped
+          for future in pending:
+            future.cancel()
+  finally:
+    if pgn_file is not None:
+      pgn_file.close()
+    if records_file is not None:
+      records_file.close()
+
+  print(decision or "SPRT inconclusive: game limit reached")
+  return wins, draws, losses
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Play AIPlayer configurations against each other")
+  parser.add_argument('--engine', nargs='+', action='append', required=True, metavar='NAME [KEY=VALUE ...]',
+                      help="engine name and AIPlayer arguments, e.g. --engine new depth=3 quiescence=False "
+                           "(give it twice)")
+  parser.add_argument('--games', type=int, default=100)
+  parser.add_argument('--openings', help="FEN or EPD file of start positions")
+  parser.add_argument('--movetime', type=float, help="seconds per move")
+  parser.add_argument('--nodes', type=int, help="nodes per move")
+  parser.add_argument('--depth', type=int, help="depth limit per move")
+  parser.add_argument('--workers', type=int, default=None, help="default: number of CPU cores")
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox')
+  parser.add_argument('--pgn', help="file to append the games to")
+  parser.add_argument('--records', help="binary game record file to append the games to (see game_record.py)")
+  parser.add_argument('--elo0', type=float, default=0.0)
+  parser.add_argument('--elo1', type=float, default=5.0)
+  parser.add_argument('--alpha', type=float, default=0.05)
+  parser.add_argument('--beta', type=float, default=0.05)
+  args = parser.parse_args()
+
+  if len(args.engine) != 2:
+    parser.error("give exactly two --engine options")
+  engines = []
+  for engine_args in args.engine:
+    name, options = parse_engine(engine_args)
+    # Shared limits apply unless an engine sets its own
+    for key, value in (('movetime', args.movetime), ('max_nodes', args.nodes), ('depth', args.depth)):
+      if value is not None:
+        options.setdefault(key, value)
+    if not any(key in options for key in ('movetime', 'max_nodes', 'depth')):
+      parser.error(f"engine {name} needs a --movetime, --nodes or --depth limit")
+    engines.append((name, options))
+
+  openings = load_openings(args.openings) if args.openings else None
+  run_match(engines, args.games, openings, args.workers, args.backend, args.pgn,
+            args.elo0, args.elo1, args.alpha, args.beta, args.records)
@@ -0,0 +1,100 @@
+import struct
+from multiprocessing import shared_memory
+
+# Bound types: how a stored score relates to the true value of the position
+EXACT, LOWER_BOUND, UPPER_BOUND = 1, 2, 3
+
+# key, score, best move (packed, see move.py), depth, bound type (0 marks an empty slot)
+ENTRY = struct.Struct('<QiHbB')
+# Each bucket holds a depth-preferred slot followed by an always-replace slot
+BUCKET_SIZE = 2 * ENTRY.size
+
+
+def _checksum(score, move, depth, bound):
+  """The entry's data as one 64-bit number, XORed into the stored key"""
+  return (score & 0xFFFFFFFF) | move << 32 | (depth & 0xFF) << 48 | bound << 56
+
+
+class TranspositionTable:
+  """
+  Entries are stored with key XOR data, so an entry torn by two processes
+  writing it at once fails the key check instead of returning bad data.
+  shared=True puts the table in shared memory; other processes attach
+  to it with shared_name=table.name.
+  """
+
+  def __init__(self, size_mb=16, shared=False, shared_name=None):
+    self.size_mb = size_mb
+    self.num_buckets = max(1, int(size_mb * 1024 * 1024) // BUCKET_SIZE)
+    self.size_bytes = self.num_buckets * BUCKET_SIZE
+    self.shared_memory = None
+    if shared_name is not None:
+      self.shared_memory = shared_memory.SharedMemory(name=shared_name)
+      self.data = self.shared_memory.buf
+    elif shared:
+      self.shared_memory = shared_memory.SharedMemory(create=True, size=self.size_bytes)
+      self.data = self.shared_memory.buf
+    else:
+      self.data = bytearray(self.size_bytes)
+    self.name = self.shared_memory.name if self.shared_memory else None
+    self.hits = 0
+    self.misses = 0
+    self.stores = 0
+    self.overwrites = 0
+
+  def clear(self):
+    """Empties the table and resets the counters"""
+    self.data[:self.size_bytes] = bytes(self.size_bytes)
+    self.hits = self.misses = self.stores = self.overwrites = 0
+
+  def close(self, unlink=False):
+    """Detaches from shared memory; the creating process also unlinks it"""
+    if self.shared_memory is not None:
+      self.data = bytearray(0)
+      self.shared_memory.close()
+      if unlink:
+        self.shared_memory.unlink()
+      self.shared_memory = None
+
+  def probe(self, key):
+    """Returns (depth, score, bound, move) stored for key, or None"""
+    offset = (key % self.num_buckets) * BUCKET_SIZE
+    for slot in (offset, offset + ENTRY.size):
+      entry_key, score, move, depth, bound = ENTRY.unpack_from(self.data, slot)
+      if bound and entry_key ^ _checksum(score, move, depth, bound) == key:
+        self.hits += 1
+        return depth, score, bound, move
+    self.misses += 1
+    return None
+
+  def store(self, key, depth, score, bound, move=0):
+    """
+    Saves a search result. Results at least as deep as the one in the
+    depth-preferred slot (or for the same position) go there, the rest
+    go to the always-replace slot.
+    """
+    offset = (key % self.num_buckets) * BUCKET_SIZE
+    entry = ENTRY.unpack_from(self.data, offset)
+    same_position = entry[0] ^ _checksum(*entry[1:]) == key
+    if entry[4] and not same_position and depth < entry[3]:
+      offset += ENTRY.size
+      entry = ENTRY.unpack_from(self.data, offset)
+      same_position = entry[0] ^ _checksum(*entry[1:]) == key
+
+    if entry[4] and not same_position:
+      self.overwrites += 1
+    self.stores += 1
+    ENTRY.pack_into(self.data, offset, key ^ _checksum(score, move, depth, bound), score, move, depth, bound)
+
+  def stats(self):
+    """Counters for sizing the table"""
+    probes = self.hits + self.misses
+    return {
+      'size_bytes': self.size_bytes,
+      'entries': self.num_buckets * 2,
+      'hits': self.hits,
+      'misses': self.misses,
+      'hit_rate': self.hits / probes if probes else 0.0,
+      'stores': self.stores,
+      'overwrites': self.overwrites,
+    }
@@ -0,0 +1,317 @@
+"""
+Texel-style tuning of the piece values and piece-square tables.
+
+Two steps. convert reads PGN games or FEN lines with results and writes
+a dataset directory: for every position the piece-square features (piece
+index * 64 + square + 1, at most 32 of them, 0 padding) as a uint16
+matrix, and the game result. Both are raw files the trainer memory-maps,
+so a dataset can be far larger than RAM.
+
+  python tune.py convert games.pgn quiet-labeled.epd --output dataset
+
+train fits all material and table values to the results with logistic
+loss, by Adam gradient descent over shuffled mini-batches read one slice
+of the memory map at a time, and writes a weights file. BoardEvaluator
+loads it when the CHESS_BOT_WEIGHTS environment variable names it.
+
+  python tune.py train dataset --epochs 10 --output weights.json
+  CHESS_BOT_WEIGHTS=weights.json python main.py
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from bitboard import BitboardGame
+from board_evaluator import current_weights
+from pgn import read_pgn, parse_san
+from piece import PIECE_TYPES
+
+MAX_PIECES = 32
+# Feature 0 is padding; then piece index * 64 + square + 1 for the twelve piece indices
+FEATURE_COUNT = 12 * 64 + 1
+# Positions gathered before they are appended to the dataset files, and scored at once
+WRITE_CHUNK = 65536
+# Opening plies of each PGN game left out (book moves say little about the result)
+SKIP_PLIES = 8
+# Results stored as 0, 1, 2 for a black win, draw and white win
+RESULT_CODES = {'1-0': 2, '1/2-1/2': 1, '0-1': 0, '1.0': 2, '0.5': 1, '0.0': 0}
+_RESULT = re.compile(r'(1-0|0-1|1/2-1/2|\b[01]\.[05]\b)')
+
+KING = len(PIECE_TYPES) - 1
+# Square of the same table entry for a black piece
+MIRROR = np.arange(64) ^ 56
+
+
+def position_features(game):
+  """The feature indices of a position, padded with zeros to MAX_PIECES"""
+  features = [piece.index * 64 + row * 8 + col + 1
+              for row, pieces in enumerate(game.board) for col, piece in enumerate(pieces) if piece is not None]
+  return features + [0] * (MAX_PIECES - len(features))
+
+
+def pgn_positions(stream):
+  """
+  (game, result code) for the quiet positions of each PGN game: past the
+  opening, not in check and not about to capture. A game is followed up
+  to its first move the engine cannot play.
+  """
+  for headers, sans, result in read_pgn(stream):
+    if result not in RESULT_CODES:
+      continue
+    try:
+      game = BitboardGame.from_fen(headers['FEN']) if 'FEN' in headers else BitboardGame()
+    except ValueError:
+      continue
+    code = RESULT_CODES[result]
+    for ply, san in enumerate(sans):
+      move = parse_san(game, san)
+      if move is None:
+        break
+      if ply >= SKIP_PLIES and move.captured_piece is None and not game.is_in_check(game.current_turn):
+        yield game, code
+      game.make_move(move)
+
+
+def fen_positions(stream):
+  """(game, result code) for lines of FEN or EPD with a result (1-0, 0.5, c9 "1/2-1/2"; ...)"""
+  for line in stream:
+    # Four position fields, then move counters, EPD operations or the result
+    fields = line.split(None, 4)
+    match = _RESULT.search(fields[4]) if len(fields) == 5 else None
+    if match is None or line.startswith('#'):
+      continue
+    try:
+      game = BitboardGame.from_fen(' '.join(fields[:4]))
+    except ValueError:
+      continue
+    yield game, RESULT_CODES[match.group(1)]
+
+
+def convert(paths, output):
+  """Appends the positions of PGN and FEN/EPD files to a dataset directory; returns the new total"""
+  os.makedirs(output, exist_ok=True)
+  count = dataset_size(output)
+  features = []
+  results = bytearray()
+  with open(os.path.join(output, 'features.bin'), 'ab') as feature_file, \
+       open(os.path.join(output, 'results.bin'), 'ab') as result_file:
+    # Rows past the counted ones are left over from a conversion that stopped mid-chunk
+    feature_file.truncate(count * MAX_PIECES * 2)
+    result_file.truncate(count)
+
+    def flush():
+      nonlocal count
+      if results:
+        np.array(features, dtype=np.uint16).tofile(feature_file)
+        result_file.write(results)
+        feature_file.flush()
+        result_file.flush()
+        count += len(results)
+        # Counted only once both files hold the rows
+        _write_meta(output, count)
+        features.clear()
+        results.clear()
+
+    for path in paths:
+      with open(path) as f:
+        positions = pgn_positions(f) if path.lower().endswith('.pgn') else fen_positions(f)
+        for game, result in positions:
+          features.append(position_features(game))
+          results.append(result)
+          if len(results) >= WRITE_CHUNK:
+            flush()
+    flush()
+  _write_meta(output, count)
+  return count
+
+
+def _write_meta(output, count):
+  # Written to a temporary file and renamed, so meta.json is never half written
+  temporary = os.path.join(output, 'meta.json.tmp')
+  with open(temporary, 'w') as f:
+    json.dump({'positions': count, 'max_pieces': MAX_PIECES}, f)
+  os.replace(temporary, os.path.join(output, 'meta.json'))
+
+
+def dataset_size(path):
+  meta = os.path.join(path, 'meta.json')
+  if not os.path.exists(meta):
+    return 0
+  with open(meta) as f:
+    return json.load(f)['positions']
+
+
+def open_dataset(path):
+  """Read-only memory maps of a dataset: (N, 32) features and N result codes"""
+  count = dataset_size(path)
+  if count == 0:
+    raise ValueError(f"empty dataset: {path}")
+  features = np.memmap(os.path.join(path, 'features.bin'), dtype=np.uint16, mode='r', shape=(count, MAX_PIECES))
+  results = np.memmap(os.path.join(path, 'results.bin'), dtype=np.uint8, mode='r', shape=(count,))
+  return features, results
+
+
+def weights_to_params(weights):
+  """Weights file dict to (material, tables): six piece values and a (6, 64) table array"""
+  names = [piece_type.__name__ for piece_type in PIECE_TYPES]
+  material = np.array([weights['piece_values'][name] for name in names], dtype=np.float64)
+  tables = np.array([np.ravel(weights['tables'][name]) for name in names], dtype=np.float64)
+  return material, tables
+
+
+def params_to_weights(material, tables):
+  names = [piece_type.__name__ for piece_type in PIECE_TYPES]
+  rounded = np.rint(tables).astype(int)
+  return {
+    'piece_values': {name: int(round(value)) for name, value in zip(names, material)},
+    'tables': {name: rounded[kind].reshape(8, 8).tolist() for kind, name in enumerate(names)},
+  }
+
+
+def feature_weights(material, tables):
+  """Score of every feature index, signed from white's point of view (what BoardEvaluator adds up)"""
+  white = material[:, None] + tables
+  black = -(material[:, None] + tables[:, MIRROR])
+  return np.concatenate(([0.0], white.ravel(), black.ravel()))
+
+
+def evaluate(weights, features):
+  """Scores of the positions of a feature matrix, a chunk at a time to keep the temporaries small"""
+  return np.concatenate([weights[features[start:start + WRITE_CHUNK].astype(np.intp)].sum(axis=1)
+                         for start in range(0, len(features), WRITE_CHUNK)])
+
+
+def logistic_loss(scores, results, scale):
+  """Mean cross-entropy between win probabilities sigmoid(scale * score) and the results"""
+  targets = results / 2.0
+  logits = scale * scores
+  # log(1 + exp(x)) - target * x, written to stay finite for large scores
+  return float(np.mean(np.logaddexp(0, logits) - targets * logits))
+
+
+def fit_scale(scores, results):
+  """
+  The Texel K: the sigmoid scale that best predicts the results from the
+  starting weights, so the fit changes the weights rather than the scale.
+  Golden-section search on K in score / 400 * ln(10) * K.
+  """
+  low, high = 0.05, 5.0
+  ratio = (math.sqrt(5) - 1) / 2
+  loss = lambda k: logistic_loss(scores, results, k * math.log(10) / 400)
+  for i in range(40):
+    a = high - ratio * (high - low)
+    b = low + ratio * (high - low)
+    if loss(a) < loss(b):
+      high = b
+    else:
+      low = a
+  return (low + high) / 2
+
+
+def train(path, epochs=10, batch_size=16384, learning_rate=2.0, validation=0.05, sample=1000000, seed=0,
+          weights=None, report=print):
+  """
+  Fits the material and table values to a dataset and returns them as a
+  weights dict. The last validation share of the positions is held out
+  to report the loss on. King material is not tuned: both kings are
+  always on the board, so it cancels out.
+  """
+  features, results = open_dataset(path)
+  count = len(results)
+  held_out = int(count * validation)
+  train_count = count - held_out
+  rng = np.random.default_rng(seed)
+
+  material, tables = weights_to_params(weights or current_weights())
+  params = np.concatenate((material, tables.ravel()))
+
+  # K from a random sample (fancy indexing only reads those rows of the map)
+  picks = np.sort(rng.choice(train_count, min(sample, train_count), replace=False))
+  sample_features, sample_results = features[picks], results[picks]
+  k = fit_scale(evaluate(feature_weights(material, tables), sample_features), sample_results)
+  scale = k * math.log(10) / 400
+  report(f"{count} positions ({held_out} held out), K = {k:.3f}")
+
+  def losses():
+    weights = feature_weights(params[:6], params[6:].reshape(6, 64))
+    train_loss = logistic_loss(evaluate(weights, sample_features), sample_results, scale)
+    if not held_out:
+      return f"loss {train_loss:.5f}"
+    validation_loss = np.mean([
+      logistic_loss(evaluate(weights, features[start:start + batch_size]), results[start:start + batch_size], scale)
+      for start in range(train_count, count, batch_size)])
+    return f"loss {train_loss:.5f}, validation {validation_loss:.5f}"
+
+  report(f"Start: {losses()}")
+  # Adam moment estimates
+  first = np.zeros_like(params)
+  second = np.zeros_like(params)
+  beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+  step = 0
+  starts = np.arange(0, train_count, batch_size)
+  for epoch in range(epochs):
+    started = time.perf_counter()
+    # Batches are contiguous slices, read in random order, so the map is read sequentially within each
+    for start in rng.permutation(starts):
+      batch = features[start:min(start + batch_size, train_count)].astype(np.intp)
+      targets = results[start:start + len(batch)] / 2.0
+      material, tables = params[:6], params[6:].reshape(6, 64)
+      scores = feature_weights(material, tables)[batch].sum(axis=1)
+      # d loss / d score of each position, then summed onto the features it has
+      error = (1 / (1 + np.exp(-scale * scores)) - targets) * scale / len(batch)
+      feature_gradient = np.bincount(batch.ravel(), weights=np.repeat(error, MAX_PIECES), minlength=FEATURE_COUNT)
+      white = feature_gradient[1:385].reshape(6, 64)
+      black = feature_gradient[385:].reshape(6, 64)
+      material_gradient = white.sum(axis=1) - black.sum(axis=1)
+      material_gradient[KING] = 0
+      table_gradient = white - black[:, MIRROR]
+      gradient = np.concatenate((material_gradient, table_gradient.ravel()))
+
+      step += 1
+      first = beta1 * first + (1 - beta1) * gradient
+      second = beta2 * second + (1 - beta2) * gradient * gradient
+      params -= learning_rate * (first / (1 - beta1 ** step)) / (np.sqrt(second / (1 - beta2 ** step)) + epsilon)
+    report(f"Epoch {epoch + 1}: {losses()} ({time.perf_counter() - started:.1f}s)")
+
+  return params_to_weights(params[:6], params[6:].reshape(6, 64))
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Tune the evaluation weights on game results")
+  commands = parser.add_subparsers(dest='command', required=True)
+  convert_parser = commands.add_parser('convert', help="add PGN (.pgn) or FEN/EPD files with results to a dataset")
+  convert_parser.add_argument('inputs', nargs='+')
+  convert_parser.add_argument('--output', required=True, help="dataset directory (appended to if it exists)")
+  train_parser = commands.add_parser('train', help="fit the weights to a dataset")
+  train_parser.add_argument('dataset')
+  train_parser.add_argument('--output', default='weights.json', help="weights file to write")
+  train_parser.add_argument('--weights', help="weights file to start from (default: the built-in values)")
+  train_parser.add_argument('--epochs', type=int, default=10)
+  train_parser.add_argument('--batch-size', type=int, default=16384)
+  train_parser.add_argument('--learning-rate', type=float, default=2.0, help="Adam step size in centipawns")
+  train_parser.add_argument('--validation', type=float, default=0.05, help="share of positions held out")
+  train_parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  if args.command == 'convert':
+    started = time.perf_counter()
+    before = dataset_size(args.output)
+    total = convert(args.inputs, args.output)
+    elapsed = time.perf_counter() - started
+    print(f"Added {total - before} positions in {elapsed:.1f}s, {total} in {args.output}", file=sys.stderr)
+  else:
+    start_weights = None
+    if args.weights:
+      with open(args.weights) as f:
+        start_weights = json.load(f)
+    tuned = train(args.dataset, args.epochs, args.batch_size, args.learning_rate, args.validation, seed=args.seed,
+                  weights=start_weights)
+    with open(args.output, 'w') as f:
+      json.dump(tuned, f, indent=1)
+    print(f"Wrote {args.output}")
@@ -0,0 +1,239 @@
+"""
+UCI (Universal Chess Interface) front-end, for GUIs, cutechess-cli and
+match scripts: python uci.py [--backend bitboard]
+
+The search runs on a worker thread so stop, ponderhit and isready are
+answered while it thinks, and an info line is sent after every finished
+depth. The engine has no castling, en passant or promotion: a promotion
+in a position command (e7e8q) is played as the plain pawn move.
+"""
+import argparse
+import sys
+import threading
+
+from ai_player import AIPlayer, mate_moves
+from bitboard import BACKENDS
+from chess_engine import START_FEN
+from move import Move
+from opening_book import OpeningBook
+
+ENGINE_NAME = 'Python Chess Bot'
+ENGINE_AUTHOR = 'dbedi06'
+
+# go parameters given in milliseconds, and their get_best_move names
+TIME_PARAMETERS = {'movetime': 'movetime', 'wtime': 'wtime', 'btime': 'btime', 'winc': 'winc', 'binc': 'binc'}
+
+
+def move_to_uci(move):
+  """Coordinate notation like e2e4"""
+  return Move.pos_to_chess_notation(move.start_pos) + Move.pos_to_chess_notation(move.end_pos)
+
+
+def find_move(game, text):
+  """The legal move written as text (e2e4), or None"""
+  text = text[:4].lower()
+  for move in game.get_legal_moves(game.current_turn):
+    if move_to_uci(move) == text:
+      return move
+  return None
+
+
+def format_score(value, color):
+  """UCI score from the side to move's point of view: 'cp 35' or 'mate 3'"""
+  if color == 'black':
+    value = -value
+  moves = mate_moves(value)
+  if moves is not None:
+    return f"mate {moves}"
+  return f"cp {value}"
+
+
+class UCIEngine:
+
+  def __init__(self, backend='mailbox', output=None, book=None):
+    self.backend = backend
+    self.book = book
+    self.output = output or sys.stdout
+    self.game = BACKENDS[backend]()
+    self.hash_mb = 16
+    self.threads = 1
+    self.ai = None
+    self._send_lock = threading.Lock()
+    self._thread = None
+    self._stop_event = None
+    self._ponderhit_event = None
+    # Set when the finished search may send bestmove (held back for go infinite and go ponder)
+    self._release = None
+    self._search_color = 'white'
+
+  def send(self, line):
+    with self._send_lock:
+      self.output.write(line + '\n')
+      self.output.flush()
+
+  def run(self, lines=None):
+    """Reads commands until quit or the end of the input"""
+    for line in lines or sys.stdin:
+      if not self.handle(line):
+        break
+    self._stop_search()
+    if self.ai is not None:
+      self.ai.close()
+    if self.book is not None:
+      self.book.close()
+
+  def handle(self, line):
+    """Runs one command, returns False on quit"""
+    tokens = line.split()
+    if not tokens:
+      return True
+    command, args = tokens[0], tokens[1:]
+
+    if command == 'uci':
+      self.send(f"id name {ENGINE_NAME}")
+      self.send(f"id author {ENGINE_AUTHOR}")
+      self.send("option name Hash type spin default 16 min 1 max 4096")
+      self.send("option name Threads type spin default 1 min 1 max 64")
+      self.send("option name Ponder type check default false")
+      self.send("uciok")
+    elif command == 'isready':
+      self._player()
+      self.send("readyok")
+    elif command == 'setoption':
+      self._set_option(args)
+    elif command == 'ucinewgame':
+      self._stop_search()
+      self._player().transposition_table.clear()
+      self.game = BACKENDS[self.backend]()
+    elif command == 'position':
+      self._stop_search()
+      self._set_position(args)
+    elif command == 'go':
+      self._go(args)
+    elif command == 'stop':
+      self._stop_search()
+    elif command == 'ponderhit':
+      if self._ponderhit_event is not None:
+        self._ponderhit_event.set()
+        self._release.set()
+    elif command == 'quit':
+      return False
+    elif command == 'd':
+      self.game.display_board()
+    else:
+      self.send(f"info string unknown command: {line.strip()}")
+    return True
+
+  def _player(self):
+    """The AIPlayer, created on first use so options set before it apply"""
+    if self.ai is None:
+      self.ai = AIPlayer(depth=None, tt_size_mb=self.hash_mb, workers=self.threads,
+                         on_iteration=self._send_info, book=self.book)
+    return self.ai
+
+  def _set_option(self, args):
+    """setoption name <name> value <value>"""
+    if 'name' not in args:
+      return
+    value_index = args.index('value') if 'value' in args else len(args)
+    name = ' '.join(args[args.index('name') + 1:value_index]).lower()
+    value = ' '.join(args[value_index + 1:])
+    if name in ('hash', 'threads'):
+      self._stop_search()
+      if name == 'hash':
+        self.hash_mb = max(1, int(value))
+      else:
+        self.threads = max(1, int(value))
+      # The table size and worker count are fixed when the player is made
+      if self.ai is not None:
+        self.ai.close()
+        self.ai = None
+
+  def _set_position(self, args):
+    """position startpos|fen <fen> [moves <move> ...]"""
+    moves_index = args.index('moves') if 'moves' in args else len(args)
+    if args and args[0] == 'fen':
+      fen = ' '.join(args[1:moves_index])
+    else:
+      fen = START_FEN
+    try:
+      self.game = BACKENDS[self.backend].from_fen(fen)
+    except ValueError as error:
+      self.send(f"info string {error}")
+      return
+
+    for text in args[moves_index + 1:]:
+      move = find_move(self.game, text)
+      if move is None:
+        self.send(f"info string illegal move: {text}")
+        break
+      self.game.make_move(move)
+
+  def _go(self, args):
+    """go [depth N] [movetime ms] [wtime ms btime ms winc ms binc ms] [nodes N] [infinite] [ponder]"""
+    self._stop_search()
+    limits = {}
+    infinite = 'infinite' in args
+    ponder = 'ponder' in args
+    for i, token in enumerate(args[:-1]):
+      if token in TIME_PARAMETERS:
+        limits[TIME_PARAMETERS[token]] = int(args[i + 1]) / 1000
+      elif token == 'depth':
+        limits['depth'] = int(args[i + 1])
+      elif token == 'nodes':
+        limits['max_nodes'] = int(args[i + 1])
+    if infinite:
+      limits = {}
+
+    self._stop_event = threading.Event()
+    self._ponderhit_event = threading.Event() if ponder else None
+    self._release = threading.Event()
+    if not (infinite or ponder):
+      self._release.set()
+
+    ai = self._player()
+    self._search_color = self.game.current_turn
+    self._thread = threading.Thread(target=self._search, args=(ai, limits), daemon=True)
+    self._thread.start()
+
+  def _search(self, ai, limits):
+    """Search thread: finds the move, waits until bestmove may be sent, then sends it"""
+    move = ai.get_best_move(self.game, stop_event=self._stop_event,
+                            ponderhit_event=self._ponderhit_event, **limits)
+    self._release.wait()
+
+    if move is None:
+      self.send("bestmove 0000")
+      return
+    variation = ai.principal_variation
+    if len(variation) > 1 and move_to_uci(variation[0]) == move_to_uci(move):
+      self.send(f"bestmove {move_to_uci(move)} ponder {move_to_uci(variation[1])}")
+    else:
+      self.send(f"bestmove {move_to_uci(move)}")
+
+  def _send_info(self, stats):
+    """AIPlayer callback after each finished depth"""
+    score = format_score(stats.value, self._search_color)
+    pv = ' '.join(move_to_uci(move) for move in stats.principal_variation)
+    self.send(f"info depth {stats.depth} score {score} nodes {stats.nodes} nps {int(stats.nps)} "
+              f"time {int(stats.elapsed * 1000)} pv {pv}")
+
+  def _stop_search(self):
+    """Ends a running search; its bestmove is sent before this returns"""
+    if self._thread is None:
+      return
+    self._stop_event.set()
+    self._release.set()
+    self._thread.join()
+    self._thread = None
+    self._ponderhit_event = None
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run the engine as a UCI engine on stdin/stdout")
+  parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox',
+                      help="board representation (default: mailbox)")
+  parser.add_argument('--book', help="Polyglot .bin opening book")
+  parser.add_argument('--book-mode', choices=('weighted', 'best'), default='weighted')
+  args = parser.parse_args()
+  UCIEngine(args.backend, book=OpeningBook(args.book, args.book_mode) if args.book else None).run()
@@ -0,0 +1,21 @@
+import random
+
+from piece import piece_index
+
+# A fixed seed gives every process the same keys, so hashes can be shared
+_random = random.Random(0x5EED)
+
+# One key per piece index (see piece.piece_index) and square number (row * 8 + col)
+PIECE_KEYS = [[_random.getrandbits(64) for square in range(64)] for index in range(12)]
+BLACK_TO_MOVE = _random.getrandbits(64)
+
+
+def compute_key(board, current_turn):
+  """Computes the Zobrist key of a position from scratch"""
+  key = BLACK_TO_MOVE if current_turn == 'black' else 0
+  for row in range(8):
+    for col in range(8):
+      piece = board[row][col]
+      if piece is not None:
+        key ^= PIECE_KEYS[piece_index(piece)][row * 8 + col]
+  return key